@@ -0,0 +1,178 @@
+"""
+Admission control for the AI endpoints.
+
+Every request that will reach Groq takes a token from two buckets: its
+user's (``AI_USER_RATE`` per minute, bursts of ``AI_USER_BURST``) and a
+global one sized to the upstream quota (``AI_GLOBAL_RATE`` / ``AI_GLOBAL_BURST``).
+When a bucket is short, an async view's request reserves its token anyway and
+waits for it, as long as that wait is at most ``AI_ADMISSION_MAX_WAIT``
+seconds; reservations are served in order, so a burst queues briefly instead
+of failing. Longer waits are rejected with 429 and a ``Retry-After``. Sync
+views never wait (see ``admit``).
+
+With ``REDIS_URL`` the buckets live in Redis (one Lua script checks and takes
+from both atomically) and are shared by every process; without it each
+process keeps its own. If Redis can't be reached, requests are let through.
+"""
+import asyncio
+import logging
+import math
+import threading
+import time
+
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from rest_framework import exceptions
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'ai-admission'
+
+# KEYS: the buckets. ARGV: now, cost, max wait, then rate and burst per bucket.
+# Returns {admitted (0/1), wait in seconds (as a string; Lua numbers come back truncated)}.
+RESERVE_SCRIPT = """
+local now, cost, max_wait = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local levels, wait = {}, 0
+for i, key in ipairs(KEYS) do
+    local rate, burst = tonumber(ARGV[2 + i * 2]), tonumber(ARGV[3 + i * 2])
+    local state = redis.call('HMGET', key, 'tokens', 'stamp')
+    local tokens = tonumber(state[1]) or burst
+    local stamp = tonumber(state[2]) or now
+    levels[i] = math.min(burst, tokens + math.max(0, now - stamp) * rate)
+    wait = math.max(wait, (math.min(cost, burst) - levels[i]) / rate)
+end
+if wait > max_wait then
+    return {0, tostring(wait)}
+end
+for i, key in ipairs(KEYS) do
+    local rate, burst = tonumber(ARGV[2 + i * 2]), tonumber(ARGV[3 + i * 2])
+    redis.call('HSET', key, 'tokens', tostring(levels[i] - math.min(cost, burst)), 'stamp', tostring(now))
+    redis.call('EXPIRE', key, math.ceil(burst / rate + max_wait) + 1)
+end
+return {1, tostring(wait)}
+"""
+
+
+class Rejected(exceptions.Throttled):
+    default_detail = 'Too many AI requests right now.'
+
+    @property
+    def retry_after(self):
+        return math.ceil(self.wait)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enabled():
+    return _setting('AI_ADMISSION', True)
+
+
+class MemoryBuckets:
+    """Per-process buckets, for when there's no Redis."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = {}  # key -> (tokens, stamp)
+
+    def clear(self):
+        with self._lock:
+            self._state.clear()
+
+    def reserve(self, buckets, cost, max_wait, now):
+        """Take ``cost`` from every ``(key, rate, burst)`` bucket; return ``(admitted, wait)``."""
+        with self._lock:
+            levels, wait = [], 0.0
+            for key, rate, burst in buckets:
+                tokens, stamp = self._state.get(key, (burst, now))
+                level = min(burst, tokens + max(0.0, now - stamp) * rate)
+                levels.append(level)
+                wait = max(wait, (min(cost, burst) - level) / rate)
+            if wait > max_wait:
+                return False, wait
+            for (key, rate, burst), level in zip(buckets, levels):
+                self._state[key] = (level - min(cost, burst), now)
+            return True, wait
+
+
+class RedisBuckets:
+    def __init__(self, url):
+        self.client = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+        self.script = self.client.register_script(RESERVE_SCRIPT)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(f'{KEY_PREFIX}:*'))
+        if keys:
+            self.client.delete(*keys)
+
+    def reserve(self, buckets, cost, max_wait, now):
+        # Clock is the caller's; app servers are assumed NTP-synced
+        args = [now, cost, max_wait]
+        for _, rate, burst in buckets:
+            args += [rate, burst]
+        admitted, wait = self.script(keys=[key for key, _, _ in buckets], args=args)
+        return bool(admitted), float(wait)
+
+
+_buckets = None
+_buckets_lock = threading.Lock()
+
+
+def get_buckets():
+    global _buckets
+    with _buckets_lock:
+        if _buckets is None:
+            url = _setting('REDIS_URL', '')
+            _buckets = RedisBuckets(url) if url else MemoryBuckets()
+        return _buckets
+
+
+def _bucket_specs(user):
+    per_minute = lambda name, default: _setting(name, default) / 60.0
+    return [
+        (f'{KEY_PREFIX}:user:{user.pk}', per_minute('AI_USER_RATE', 10), _setting('AI_USER_BURST', 5)),
+        (f'{KEY_PREFIX}:global', per_minute('AI_GLOBAL_RATE', 120), _setting('AI_GLOBAL_BURST', 30)),
+    ]
+
+
+def reserve(user, cost=1, max_wait=None):
+    """
+    Reserve ``cost`` upstream calls for ``user``. Returns how long to wait
+    before making them, or raises ``Rejected`` when that would be longer than
+    ``max_wait`` (default ``AI_ADMISSION_MAX_WAIT``).
+    """
+    if not enabled() or cost <= 0:
+        return 0.0
+    if max_wait is None:
+        max_wait = _setting('AI_ADMISSION_MAX_WAIT', 5)
+    try:
+        admitted, wait = get_buckets().reserve(_bucket_specs(user), cost, max_wait, time.time())
+    except redis.RedisError:
+        logger.warning("AI admission: Redis unavailable, admitting without a limit", exc_info=True)
+        return 0.0
+    if not admitted:
+        metrics.registry.record_admission('rejected', 0.0)
+        raise Rejected(wait=wait)
+    metrics.registry.record_admission('queued' if wait > 0 else 'admitted', wait)
+    return wait
+
+
+def admit(user, cost=1):
+    """
+    ``reserve`` for sync views: admits only what can go right away.
+
+    Sync views share one thread under ASGI, so sleeping out a reservation
+    there would hold up every other sync request; they answer 429 instead.
+    """
+    reserve(user, cost, max_wait=0)
+
+
+async def aadmit(user, cost=1):
+    """``reserve`` and wait out the reservation on the event loop."""
+    wait = await sync_to_async(reserve)(user, cost)
+    if wait > 0:
+        await asyncio.sleep(wait)
@@ -3,3 +3,16 @@ from django.apps import AppConfig
 
 class ApiConfig(AppConfig):
     name = 'api'
+
+    def ready(self):
+        from django.core.signals import request_started
+
+        from . import jobs
+        from . import media, notes  # noqa: F401 -- registers background job handlers
+        from . import feed_cache  # noqa: F401 -- connects the feed invalidation signals
+        from . import metrics  # noqa: F401 -- times queries on every DB connection
+        from . import authentication  # noqa: F401 -- connects the auth cache invalidation signals
+        from . import similarity  # noqa: F401 -- keeps post vectors in step with the posts
+        from . import interests  # noqa: F401 -- keeps the interest tag index in step with profiles and posts
+        # Not started here: management commands (migrate, shell, ...) load apps too
+        request_started.connect(jobs.start_pool, dispatch_uid='api.jobs.start_pool')
@@ -0,0 +1,174 @@
+"""
+Async endpoints for the LLM-bound routes.
+
+A Groq completion takes seconds. Under the ASGI application these views
+await it on the event loop instead of holding a worker thread, so a burst of
+AI requests can't starve the rest of the API. DRF 3.16's views are sync-only,
+so ``AsyncAPIView`` runs the usual ``APIView`` request handling (authentication,
+permissions, throttles, content negotiation, parsing) in a thread, awaits the
+handler, and hands errors to the configured exception handler. Responses are
+DRF ``Response``s rendered with the negotiated renderer, like everywhere else.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import admission, jobs, media, model_router, streaming
+from .serializers import MediaUploadSerializer, UserMediaSerializer
+
+
+class AsyncAPIView(APIView):
+    """
+    ``APIView`` whose handlers (``async def post`` etc.) run on the event loop.
+    Django sees the async handlers and awaits the view instead of running it
+    in a thread.
+    """
+
+    def _initial(self, request, *args, **kwargs):
+        self.initial(request, *args, **kwargs)
+        request.data  # parse the body here too; it's cached on the request
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self._initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+        except Exception as exc:
+            response = await sync_to_async(self.handle_exception)(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+class ExamPrepView(AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+
+    async def post(self, request):
+        """
+        Routes the POST request based on the URL path.
+        Matches: /api/exam-prep/ AND /api/exam-prep/solve/
+        """
+        path = request.path.rstrip('/')  # Clean trailing slashes
+
+        if path.endswith('solve'):
+            return await self._solve_question(request)
+
+        return await self._generate_materials(request)
+
+    async def _generate_materials(self, request):
+        """Internal method to generate study materials"""
+        data = request.data
+        # Tidy whitespace so equivalent requests share a cache entry
+        clean = lambda value: ' '.join(str(value).split()) if value else value
+        subject = clean(data.get('subject'))
+        topic = clean(data.get('topic'))
+        grade = clean(data.get('gradeLevel'))
+        difficulty = clean(data.get('difficulty', 'Intermediate'))
+        rem = clean(data.get('remarks'))
+        if not all([subject, topic, grade]):
+            return Response({"error": "Missing required fields: subject, topic, and gradeLevel"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        prompt = f"""
+        Act as an expert tutor. Create a study guide for a {grade} student on {subject}: {topic}.
+        Difficulty level: {difficulty}.
+        Additional remarks: {rem if rem else 'None'}
+
+        Return ONLY a JSON object with:
+        1. keyConcepts: (list of strings)
+        2. questions: (list of objects with 'id' and 'text')
+        """
+
+        try:
+            # Classmates preparing for the same exam send identical requests;
+            # those are answered from the cache (or share one in-flight call)
+            # without being counted against the AI rate limits.
+            analysis = await model_router.cached_complete(
+                'exam_prep',
+                messages=[
+                    {"role": "system", "content": "You are a teacher who only responds in JSON format."},
+                    {"role": "user", "content": prompt}
+                ],
+                parse=model_router.json_object('keyConcepts', 'questions'),
+                admit=lambda: admission.aadmit(request.user),
+                response_format={"type": "json_object"},
+                temperature=0.7
+            )
+            return Response(analysis, status=200)
+        except admission.Rejected:
+            raise
+        except Exception as e:
+            return Response({"error": f"Groq Generation Error: {str(e)}"},
+                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    async def _solve_question(self, request):
+        """Internal method to solve a specific question"""
+        question_text = request.data.get('question')
+
+        if not question_text:
+            return Response({"error": "No question provided"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        messages = [
+            {"role": "system", "content": "You are an expert tutor. Solve the following exam question clearly, accurately, and step-by-step."},
+            {"role": "user", "content": f"Please solve this question: {question_text}"}
+        ]
+        temperature = 0.3 # Lower temperature for more factual/precise solving
+
+        # Only upstream calls count against the AI rate limits, not cache hits
+        admit = lambda: admission.aadmit(request.user)
+        # {"stream": "sse"} / {"stream": "ndjson"}: send tokens as they arrive
+        stream_format = streaming.requested_format(request)
+        if stream_format:
+            # Admitted before the stream starts, so a rejection is still a 429
+            if not await model_router.is_cached('solve', messages, temperature=temperature):
+                await admit()
+            # One-line questions go to the small model (see api/model_router.py)
+            tokens = model_router.stream('solve', messages, temperature=temperature)
+            return streaming.stream_response(tokens, stream_format)
+
+        try:
+            answer = await model_router.cached_complete('solve', messages, admit=admit, temperature=temperature)
+            return Response({"answer": answer}, status=200)
+        except admission.Rejected:
+            raise
+        except Exception as e:
+            return Response({"error": f"Groq Solver Error: {str(e)}"},
+                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class UploadMediaView(AsyncAPIView):
+    """UserProfileViewSet's ``upload_media`` action, as an async view (POST /api/userprofile/upload_media/)"""
+    permission_classes = [IsAuthenticated]
+
+    async def post(self, request):
+        """Add a portfolio item; certificates are read by the AI in the background"""
+        if not (request.data.get('fileUrl') or request.data.get('file_url')):
+            return Response({"error": "No URL provided"}, status=400)
+        serializer = MediaUploadSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+
+        await admission.aadmit(request.user, cost=media.analysis_calls([serializer.validated_data]))
+        try:
+            created, _ = await sync_to_async(media.create_media)(request.user, [serializer.validated_data])
+        except jobs.QueueFull as e:
+            return Response({"error": "AI queue is busy, try again shortly"},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            headers={'Retry-After': str(e.retry_after)})
+        return Response(UserMediaSerializer(created[0]).data, status=201)
@@ -0,0 +1,98 @@
+"""
+API authentication: JWT first, with users resolved from a short-lived cache.
+
+``CachedJWTAuthentication`` is simplejwt's ``JWTAuthentication`` without the
+``User`` query on every request. A resolved user's id, username and flags
+(``CACHED_FIELDS``, never the password hash) are kept in the ``auth`` cache
+for ``AUTH_USER_CACHE_TTL`` seconds and dropped as soon as the user is saved
+or deleted, their groups or permissions change, or one of their tokens is
+blacklisted (e.g. on logout). Like the feed cache, the entry is dropped when
+the change happens and again when its transaction commits. Writes that skip
+model signals (``QuerySet.update``) are picked up when the entry expires.
+
+Basic auth hashes the password (PBKDF2) on every request, so it isn't in
+the default authentication classes; views that must accept it add
+``BasicAuthentication`` themselves (``/api/metrics/`` does, for scrapers).
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+CACHE_ALIAS = 'auth'
+# What authentication and permission checks read; the rest loads on access
+CACHED_FIELDS = ('id', 'username', 'is_active', 'is_staff', 'is_superuser')
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def forget_user(user_id):
+    """Drop the cached user now and again once the current transaction commits."""
+    cache, key = caches[CACHE_ALIAS], user_cache_key(user_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        user_id = validated_token.get(jwt_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)  # raises InvalidToken
+        cache, key = caches[CACHE_ALIAS], user_cache_key(user_id)
+        cached = cache.get(key)
+        if cached is None:
+            user = super().get_user(validated_token)
+            cached = {'fields': {name: getattr(user, name) for name in CACHED_FIELDS},
+                      # What revocable tokens carry, not the hash itself
+                      'password_md5': get_md5_hash_password(user.password)}
+            cache.set(key, cached, getattr(settings, 'AUTH_USER_CACHE_TTL', 60))
+            return user
+        # The checks super() makes, on the cached copy
+        fields = [f.attname for f in User._meta.concrete_fields if f.attname in cached['fields']]
+        user = User.from_db('default', fields, [cached['fields'][name] for name in fields])
+        if jwt_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if jwt_settings.CHECK_REVOKE_TOKEN and \
+                validated_token.get(jwt_settings.REVOKE_TOKEN_CLAIM) != cached['password_md5']:
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
+
+
+@receiver([post_save, post_delete], sender=User)
+def _user_changed(sender, instance, update_fields=None, **kwargs):
+    # Logins only touch last_login
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        forget_user(instance.pk)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def _user_access_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        forget_user(instance.pk)
+    elif action == 'pre_clear':
+        # group.user_set.clear(): the members are about to be unlinked
+        field = 'groups' if sender is User.groups.through else 'user_permissions'
+        for user_id in User.objects.filter(**{field: instance}).values_list('pk', flat=True):
+            forget_user(user_id)
+    else:
+        for user_id in pk_set:
+            forget_user(user_id)
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def _token_blacklisted(sender, instance, **kwargs):
+    if instance.token.user_id is not None:
+        forget_user(instance.token.user_id)
@@ -0,0 +1,147 @@
+"""
+Real-time study session events over WebSockets.
+
+Clients connect to ``/ws/sessions/<id>/?token=<jwt access token>`` and are
+sent a JSON message for every ``join``, ``leave``, ``end_session`` and
+``note_ready`` (with the finished note), instead of polling
+``/api/sessions/<id>/`` and ``/api/sessions/<id>/notes/``.
+
+Only the session's creator and participants may subscribe. A participant's
+sockets are closed when they leave, and every socket when the session ends.
+Each process caps the sockets it holds, per session
+(``SESSION_WS_MAX_CONNECTIONS``) and in total (``WS_MAX_CONNECTIONS``).
+
+Pushes are best-effort: if the channel layer is down, the change they
+announce has still happened, so the failure is logged and the request goes on.
+"""
+import logging
+import threading
+from collections import Counter
+
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+
+from .models import StudySession
+
+logger = logging.getLogger(__name__)
+
+# Close codes (4000-4999 are free for applications)
+UNAUTHORIZED = 4401
+FORBIDDEN = 4403
+TOO_MANY_CONNECTIONS = 4429
+SESSION_ENDED = 4410
+
+
+def group_name(session_id):
+    return f'session_{session_id}'
+
+
+def _send_on_commit(session_id, message):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+
+    def send():
+        try:
+            async_to_sync(channel_layer.group_send)(group_name(session_id), message)
+        except Exception:
+            logger.warning("Couldn't push %s to session %s", message['type'], session_id, exc_info=True)
+    transaction.on_commit(send)
+
+
+def broadcast_session_event(session_id, event, **data):
+    """
+    Push ``{"type": event, "session": session_id, **data}`` to the session's
+    subscribers once the current transaction commits (immediately outside one),
+    so clients never hear about a change they can't read back yet.
+    """
+    _send_on_commit(session_id, {'type': 'session.event', 'payload': {'type': event, 'session': session_id, **data}})
+
+
+def revoke_session_access(session_id, user_id):
+    """Close ``user_id``'s sockets on the session (they left it) once the current transaction commits."""
+    _send_on_commit(session_id, {'type': 'session.revoke', 'user': user_id})
+
+
+class _ConnectionSlots:
+    """Per-process count of open sockets, overall and per session."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total = 0
+        self.per_session = Counter()
+
+    def acquire(self, session_id):
+        with self._lock:
+            if self.total >= getattr(settings, 'WS_MAX_CONNECTIONS', 1000) or \
+                    self.per_session[session_id] >= getattr(settings, 'SESSION_WS_MAX_CONNECTIONS', 10):
+                return False
+            self.total += 1
+            self.per_session[session_id] += 1
+            return True
+
+    def release(self, session_id):
+        with self._lock:
+            self.total -= 1
+            self.per_session[session_id] -= 1
+            if self.per_session[session_id] <= 0:
+                del self.per_session[session_id]
+
+
+connection_slots = _ConnectionSlots()
+
+
+class SessionConsumer(AsyncJsonWebsocketConsumer):
+    session_id = None
+    user_id = None
+    holds_slot = False
+
+    async def connect(self):
+        self.session_id = int(self.scope['url_route']['kwargs']['session_id'])
+        user = self.scope.get('user')
+        # Accept first so the client sees why it was turned away
+        await self.accept()
+        if user is None or not user.is_authenticated:
+            return await self.close(code=UNAUTHORIZED)
+        if not await self.is_member(user):
+            return await self.close(code=FORBIDDEN)
+        if not connection_slots.acquire(self.session_id):
+            return await self.close(code=TOO_MANY_CONNECTIONS)
+        self.holds_slot = True
+        self.user_id = user.id
+        await self.channel_layer.group_add(group_name(self.session_id), self.channel_name)
+
+    async def disconnect(self, code):
+        await self.unsubscribe()
+
+    async def unsubscribe(self):
+        if self.holds_slot:
+            self.holds_slot = False
+            connection_slots.release(self.session_id)
+            await self.channel_layer.group_discard(group_name(self.session_id), self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        # Server push only; answer keep-alives
+        if isinstance(content, dict) and content.get('type') == 'ping':
+            await self.send_json({'type': 'pong'})
+
+    async def session_event(self, event):
+        await self.send_json(event['payload'])
+        if event['payload']['type'] == 'end_session':
+            await self.unsubscribe()
+            await self.close(code=SESSION_ENDED)
+
+    async def session_revoke(self, event):
+        # Membership is only checked on connect; someone who left mustn't keep listening
+        if event['user'] == self.user_id:
+            await self.unsubscribe()
+            await self.close(code=FORBIDDEN)
+
+    @database_sync_to_async
+    def is_member(self, user):
+        sessions = StudySession.objects.filter(id=self.session_id)
+        return sessions.filter(creator=user).exists() or sessions.filter(participants=user).exists()
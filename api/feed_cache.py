@@ -0,0 +1,160 @@
+"""
+Response cache for the study-post feed (``StudyPostViewSet`` list / detail).
+
+Rendered responses (JSON or MessagePack) are stored under the format, the full
+URL and a feed version number.
+Any change to a post, a session or a user bumps the version, which orphans
+every cached page at once (they expire via ``FEED_CACHE_TTL``) instead of
+working out which pages a change touches.
+
+The version is bumped when the change happens and again when its transaction
+commits. The first bump stops old pages being served. The second covers a
+request that read the old rows just before the commit and cached them under
+the new version.
+
+Writes that skip model signals (``bulk_create``, ``QuerySet.update``) must
+call ``feed_cache.bump()`` themselves.
+
+Every response carries a strong ETag (a hash of the body), so a client that
+sends ``If-None-Match`` gets a 304 straight from the cache.
+"""
+import hashlib
+import threading
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseNotModified
+from rest_framework.response import Response
+
+from .models import StudyPost, StudySession
+
+VERSION_KEY = 'studyposts:version'
+
+
+class FeedCache:
+    def __init__(self, alias='feed'):
+        self.alias = alias
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.not_modified = 0
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.not_modified
+        return {
+            'version': self.version(),
+            'hits': self.hits,
+            'misses': self.misses,
+            'not_modified': self.not_modified,
+            'hit_rate': round((self.hits + self.not_modified) / lookups, 4) if lookups else 0.0,
+        }
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def version(self):
+        version = self.cache.get(VERSION_KEY)
+        if version is None:
+            self.cache.add(VERSION_KEY, 1, None)
+            version = self.cache.get(VERSION_KEY, 1)
+        return version
+
+    def _incr(self):
+        try:
+            self.cache.incr(VERSION_KEY)
+        except ValueError:
+            # Not set yet (or evicted): any new value orphans the old pages
+            self.cache.add(VERSION_KEY, 2, None)
+
+    def bump(self):
+        self._incr()
+        transaction.on_commit(self._incr)
+
+    def key(self, request):
+        url = f'{request.accepted_renderer.format}:{request.build_absolute_uri()}'
+        return f'studyposts:v{self.version()}:{hashlib.sha256(url.encode()).hexdigest()}'
+
+    def lookup(self, request):
+        """The cached response for this request (or a 304), else None."""
+        if request.accepted_renderer.format not in ('json', 'msgpack'):
+            return None
+        request._feed_cache_key = self.key(request)
+        entry = self.cache.get(request._feed_cache_key)
+        if entry is None:
+            self._count('misses')
+            return None
+        if self._matches(request, entry['etag']):
+            self._count('not_modified')
+            return self._not_modified(entry)
+        self._count('hits')
+        response = HttpResponse(entry['body'], content_type=entry['content_type'])
+        response['ETag'] = entry['etag']
+        if entry.get('vary'):
+            response['Vary'] = entry['vary']
+        response['X-Cache'] = 'HIT'
+        return response
+
+    def store(self, request, response):
+        """Render and cache a fresh 200; answer a matching If-None-Match with 304."""
+        key = getattr(request, '_feed_cache_key', None)
+        if key is None or not isinstance(response, Response) or response.status_code != 200:
+            return response
+        response.render()
+        entry = {
+            'body': response.content,
+            'content_type': response['Content-Type'],
+            'vary': response.get('Vary'),
+            'etag': '"%s"' % hashlib.sha256(response.content).hexdigest()[:32],
+        }
+        self.cache.set(key, entry, getattr(settings, 'FEED_CACHE_TTL', 300))
+        if self._matches(request, entry['etag']):
+            return self._not_modified(entry)
+        response['ETag'] = entry['etag']
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def _matches(self, request, etag):
+        header = request.META.get('HTTP_IF_NONE_MATCH', '')
+        return etag in [tag.strip() for tag in header.split(',')] or header.strip() == '*'
+
+    def _not_modified(self, entry):
+        response = HttpResponseNotModified()
+        response['ETag'] = entry['etag']
+        return response
+
+
+feed_cache = FeedCache()
+
+
+class FeedCacheMixin:
+    """Serve ``list`` / ``retrieve`` through ``feed_cache``."""
+
+    def list(self, request, *args, **kwargs):
+        return feed_cache.lookup(request) or super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return feed_cache.lookup(request) or super().retrieve(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        return feed_cache.store(request, response)
+
+
+@receiver([post_save, post_delete], sender=StudyPost)
+@receiver([post_save, post_delete], sender=StudySession)
+def _feed_changed(sender, **kwargs):
+    feed_cache.bump()
+
+
+@receiver([post_save, post_delete], sender=User)
+def _author_changed(sender, update_fields=None, **kwargs):
+    # Posts embed their author; logins only touch last_login
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        feed_cache.bump()
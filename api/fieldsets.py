@@ -0,0 +1,100 @@
+"""
+Sparse fieldsets and expandable relations for the API's serializers.
+
+``?fields=id,post.title`` limits a response to those fields (a dot reaches into
+a nested object). List views render relations in their compact form, the
+serializer named in the parent's ``Meta.compact`` (usually just id and a
+name), unless the client asks for the full one with ``?expand=post`` (or
+``post.user`` further down). Detail views render everything in full.
+
+Viewsets using ``SelectableFieldsViewMixin`` read the same ``Selection`` to
+leave unrequested relations out of their querysets, so they aren't loaded.
+Only reads are affected; writes always validate and return every field.
+"""
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.serializers import ListSerializer
+
+
+def _parse(value):
+    """``'id,post.title,post.id'`` -> ``{'id': {}, 'post': {'title': {}, 'id': {}}}``"""
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for part in path.strip().split('.'):
+            if part:
+                node = node.setdefault(part, {})
+    return tree
+
+
+class Selection:
+    """The fields (all, if ``fields`` is None) and expanded relations of one serializer level."""
+
+    def __init__(self, fields=None, expand=None, compact=False):
+        self.fields = fields
+        self.expand = expand or {}
+        self.compact = compact
+
+    @classmethod
+    def from_request(cls, request, compact=False):
+        params = request.query_params
+        return cls(_parse(params.get('fields', '')) or None, _parse(params.get('expand', '')), compact)
+
+    def includes(self, name):
+        return self.fields is None or name in self.fields
+
+    def expanded(self, name):
+        return not self.compact or name in self.expand
+
+    def nested(self, name):
+        fields = self.fields.get(name) if self.fields is not None else None
+        return Selection(fields or None, self.expand.get(name), self.compact)
+
+
+FULL = Selection()
+
+
+class SelectableFieldsMixin:
+    """
+    Serializer side: the top-level serializer takes ``context['selection']``,
+    nested ones get their part of it from their parent.
+    """
+    selection = None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selection = self.selection or self._context_selection()
+        if selection is None:
+            return fields
+        compact = getattr(getattr(self, 'Meta', None), 'compact', {})
+        selected = {}
+        for name, field in fields.items():
+            if not selection.includes(name):
+                continue
+            if name in compact and not selection.expanded(name):
+                field = compact[name](many=isinstance(field, ListSerializer), read_only=True)
+            nested = field.child if isinstance(field, ListSerializer) else field
+            if isinstance(nested, SelectableFieldsMixin):
+                nested.selection = selection.nested(name)
+            selected[name] = field
+        return selected
+
+    def _context_selection(self):
+        top = self.parent if isinstance(self.parent, ListSerializer) else self
+        if top.parent is not None:
+            return None
+        return self.context.get('selection')
+
+
+class SelectableFieldsViewMixin:
+    """Viewset side: passes the request's ``Selection`` to the serializer; ``list`` gets compact relations."""
+    compact_actions = ('list',)
+
+    def get_selection(self):
+        if self.request is None or self.request.method not in SAFE_METHODS:
+            return FULL
+        return Selection.from_request(self.request, compact=self.action in self.compact_actions)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['selection'] = self.get_selection()
+        return context
@@ -0,0 +1,194 @@
+"""
+Study-partner matching on ``UserProfile.study_interests``.
+
+The profile keeps interests as a free-form JSON list. Each one is normalized
+(lowercase, single spaces) into an ``InterestTag`` and indexed both ways:
+``UserInterest`` says who has a tag, ``StudyPostTag`` tags a post with its
+subject and topic. Signals keep both in step with profile and post saves;
+``manage.py index_interests`` builds them for existing data.
+
+A match aggregates the postings of the requester's own tags through the
+(tag, user) / (tag, post) indexes: whoever shares the most tags comes first.
+Only those few tags' postings are read. No profile's JSON is decoded, and
+there's no scan of the profile table.
+
+Popular tags still have long postings lists, so each user's top
+``MAX_MATCHES`` are cached (``matches`` cache alias) for
+``INTEREST_MATCH_CACHE_TTL`` seconds. The entry is dropped when that user's
+own interests change. Other users' changes show up when it expires. Posts
+are re-read when the response is built, so a deactivated post is never
+returned.
+
+Writes that skip model signals (``bulk_create``, ``QuerySet.update``) must
+call ``index_profiles`` / ``index_posts`` themselves.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import InterestTag, StudyPost, StudyPostTag, UserInterest, UserProfile
+
+MAX_TAGS = 20  # per profile
+MAX_MATCHES = 50  # cached per user; the most an endpoint returns
+CACHE_ALIAS = 'matches'
+MAX_LENGTH = InterestTag._meta.get_field('name').max_length
+
+
+def normalize(values):
+    """Distinct, normalized tag names of ``values`` (a list; anything else has none), in order."""
+    if not isinstance(values, list):
+        return []
+    names = {}
+    for value in values:
+        name = ' '.join(str(value).lower().split())[:MAX_LENGTH]
+        if name:
+            names[name] = None
+    return list(names)[:MAX_TAGS]
+
+
+def post_tag_names(post):
+    return normalize([post.subject, post.topic])
+
+
+def tag_ids(names):
+    """``{name: id}`` for ``names``, creating the tags that don't exist yet."""
+    names = set(names)
+    if not names:
+        return {}
+    ids = dict(InterestTag.objects.filter(name__in=names).values_list('name', 'id'))
+    missing = names - ids.keys()
+    if missing:
+        InterestTag.objects.bulk_create([InterestTag(name=name) for name in missing], ignore_conflicts=True)
+        ids.update(InterestTag.objects.filter(name__in=missing).values_list('name', 'id'))
+    return ids
+
+
+def _index(link_model, owner_field, owners):
+    """Replace the links of ``owners`` (``{owner id: tag names}``)."""
+    ids = tag_ids(name for names in owners.values() for name in names)
+    link_model.objects.filter(**{f'{owner_field}__in': list(owners)}).delete()
+    link_model.objects.bulk_create([
+        link_model(**{owner_field: owner_id, 'tag_id': ids[name]})
+        for owner_id, names in owners.items() for name in names
+    ], ignore_conflicts=True)
+
+
+def _sync(link_model, owner_field, owner_id, names):
+    """Update one owner's links, touching only the tags that changed."""
+    wanted = set(tag_ids(names).values())
+    links = link_model.objects.filter(**{owner_field: owner_id})
+    current = set(links.values_list('tag_id', flat=True))
+    if current - wanted:
+        links.filter(tag_id__in=current - wanted).delete()
+    if wanted - current:
+        link_model.objects.bulk_create(
+            [link_model(**{owner_field: owner_id, 'tag_id': tag_id}) for tag_id in wanted - current],
+            ignore_conflicts=True)
+
+
+def index_profiles(profiles, batch_size=2000):
+    """(Re)build the interest links of ``profiles``; returns how many."""
+    total, batch = 0, {}
+    for user_id, interests in profiles.values_list('user_id', 'study_interests').iterator(chunk_size=batch_size):
+        batch[user_id] = normalize(interests)
+        if len(batch) == batch_size:
+            _index(UserInterest, 'user_id', batch)
+            total, batch = total + len(batch), {}
+    _index(UserInterest, 'user_id', batch)
+    return total + len(batch)
+
+
+def index_posts(posts, batch_size=2000):
+    """(Re)build the tag links of ``posts``; returns how many."""
+    total, batch = 0, {}
+    for post in posts.only('id', 'subject', 'topic').iterator(chunk_size=batch_size):
+        batch[post.pk] = post_tag_names(post)
+        if len(batch) == batch_size:
+            _index(StudyPostTag, 'post_id', batch)
+            total, batch = total + len(batch), {}
+    _index(StudyPostTag, 'post_id', batch)
+    return total + len(batch)
+
+
+def _own_tags(user):
+    return UserInterest.objects.filter(user=user).values('tag_id')
+
+
+def _cached(kind, user, compute):
+    cache, key = caches[CACHE_ALIAS], f'matches:{kind}:{user.pk}'
+    matches = cache.get(key)
+    if matches is None:
+        matches = compute(user, MAX_MATCHES)
+        cache.set(key, matches, getattr(settings, 'INTEREST_MATCH_CACHE_TTL', 300))
+    return matches
+
+
+def forget_matches(user_id):
+    """Drop the user's cached matches now and again once the current transaction commits."""
+    cache = caches[CACHE_ALIAS]
+    keys = [f'matches:{kind}:{user_id}' for kind in ('users', 'posts')]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def matching_users(user, limit=10):
+    """``[{'id', 'username', 'score', 'shared'}]``: active users sharing the most interests with ``user``."""
+    return _cached('users', user, find_matching_users)[:limit]
+
+
+def matching_posts(user, limit=10):
+    """``[(post_id, score, shared tag names)]``: active posts (not ``user``'s) tagged with the most of their interests."""
+    return _cached('posts', user, find_matching_posts)[:limit]
+
+
+def find_matching_users(user, limit):
+    """``matching_users`` without the cache."""
+    # Counted on the (tag, user) index alone; users are only joined for the top few
+    ranked = list(
+        UserInterest.objects.filter(tag_id__in=_own_tags(user)).exclude(user=user)
+        .values('user_id').annotate(score=Count('tag_id')).order_by('-score', 'user_id')[:limit * 2]
+    )
+    names = dict(User.objects.filter(id__in=[m['user_id'] for m in ranked], is_active=True)
+                 .values_list('id', 'username'))
+    matches = [m for m in ranked if m['user_id'] in names][:limit]
+    shared = _shared(UserInterest, 'user_id', user, [m['user_id'] for m in matches])
+    return [{'id': m['user_id'], 'username': names[m['user_id']], 'score': m['score'],
+             'shared': shared.get(m['user_id'], [])} for m in matches]
+
+
+def find_matching_posts(user, limit):
+    """``matching_posts`` without the cache."""
+    matches = list(
+        StudyPostTag.objects.filter(tag_id__in=_own_tags(user), post__is_active=True).exclude(post__user=user)
+        .values('post_id').annotate(score=Count('tag_id'))
+        .order_by('-score', '-post_id')[:limit]
+    )
+    shared = _shared(StudyPostTag, 'post_id', user, [m['post_id'] for m in matches])
+    return [(m['post_id'], m['score'], shared.get(m['post_id'], [])) for m in matches]
+
+
+def _shared(link_model, owner_field, user, owner_ids):
+    shared = {}
+    if owner_ids:
+        rows = (link_model.objects.filter(**{f'{owner_field}__in': owner_ids}, tag_id__in=_own_tags(user))
+                .values_list(owner_field, 'tag__name').order_by('tag__name'))
+        for owner_id, name in rows:
+            shared.setdefault(owner_id, []).append(name)
+    return shared
+
+
+@receiver(post_save, sender=UserProfile)
+def _profile_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'study_interests' in update_fields:
+        _sync(UserInterest, 'user_id', instance.user_id, normalize(instance.study_interests))
+        forget_matches(instance.user_id)
+
+
+@receiver(post_save, sender=StudyPost)
+def _post_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {'subject', 'topic'} & set(update_fields):
+        _sync(StudyPostTag, 'post_id', instance.pk, post_tag_names(instance))
@@ -0,0 +1,223 @@
+"""
+Durable background jobs for the AI features.
+
+Jobs are rows in ``AIJob``. A fixed-size pool of worker threads claims them
+one at a time, runs the handler registered for the job's ``kind`` and records
+the outcome. The pool runs inside the web process (``AI_JOB_IN_PROCESS``) or
+on its own via ``manage.py run_ai_worker``.
+
+- Backpressure: ``enqueue`` raises ``QueueFull`` once ``AI_JOB_MAX_PENDING``
+  jobs are waiting.
+- De-duplication: a new job for a session that already has one queued
+  replaces that job's payload instead of adding a second job.
+- Retries: failures are retried with exponential backoff, up to
+  ``max_attempts``. A failed job whose session got a newer queued job in the
+  meantime is marked ``superseded`` (pointing at that job) instead.
+- Restarts: a job left ``running`` longer than ``AI_JOB_LEASE_SECONDS`` (its
+  worker died) is claimed again. The in-process pool starts with the first
+  request a process serves, so jobs left over from before a restart run
+  without waiting for a new one to be queued.
+"""
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, models, transaction
+from django.utils import timezone
+
+from .models import AIJob
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}
+
+
+class QueueFull(Exception):
+    """Too many jobs are waiting; the caller should retry later."""
+    retry_after = 30
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def register(kind):
+    """Decorator registering ``fn(job) -> result`` as the handler for ``kind``."""
+    def decorator(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return decorator
+
+
+def pending_count():
+    return AIJob.objects.filter(status__in=[AIJob.QUEUED, AIJob.RUNNING]).count()
+
+
+def enqueue(kind, payload, session=None, user=None):
+    """Queue a job (or refresh the one already queued for ``session``) and return it."""
+    if session is not None:
+        job = _replace_queued(kind, session, payload)
+        if job:
+            return job
+
+    if pending_count() >= _setting('AI_JOB_MAX_PENDING', 200):
+        raise QueueFull()
+
+    try:
+        with transaction.atomic():
+            job = AIJob.objects.create(
+                kind=kind, session=session, user=user, payload=payload,
+                max_attempts=_setting('AI_JOB_MAX_ATTEMPTS', 3),
+            )
+    except IntegrityError:
+        # Lost a race with another request for the same session
+        job = _replace_queued(kind, session, payload)
+        if job is None:
+            raise
+
+    transaction.on_commit(_wake_pool)
+    return job
+
+
+def _replace_queued(kind, session, payload):
+    queued = AIJob.objects.filter(kind=kind, session=session, status=AIJob.QUEUED)
+    if queued.update(payload=payload, updated_at=timezone.now()):
+        return queued.first()
+    return None
+
+
+def claim_next():
+    """Atomically take the next runnable job, or return None."""
+    now = timezone.now()
+    stale = now - timedelta(seconds=_setting('AI_JOB_LEASE_SECONDS', 300))
+    runnable = models.Q(status=AIJob.QUEUED, run_after__lte=now) | \
+        models.Q(status=AIJob.RUNNING, locked_at__lt=stale)
+
+    for job in AIJob.objects.filter(runnable).order_by('run_after', 'id')[:5]:
+        # Conditional UPDATE: only one worker can move the row out of the
+        # state it was read in, on any database.
+        claimed = AIJob.objects.filter(
+            pk=job.pk, status=job.status, locked_at=job.locked_at,
+        ).update(status=AIJob.RUNNING, locked_at=now, attempts=models.F('attempts') + 1, updated_at=now)
+        if claimed:
+            job.refresh_from_db()
+            return job
+    return None
+
+
+def run_job(job):
+    """Run a claimed job's handler and record success, retry or failure."""
+    handler = HANDLERS.get(job.kind)
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for job kind '{job.kind}'")
+        job.result = handler(job)
+        job.status = AIJob.DONE
+        job.last_error = ''
+    except Exception as e:
+        job.last_error = f"{type(e).__name__}: {e}"
+        if handler is not None and job.attempts < job.max_attempts:
+            delay = _setting('AI_JOB_RETRY_BACKOFF', 10) * 2 ** (job.attempts - 1)
+            job.status = AIJob.QUEUED
+            job.run_after = timezone.now() + timedelta(seconds=delay)
+            logger.warning("AI job %s failed (attempt %s), retrying in %ss: %s",
+                           job.id, job.attempts, delay, job.last_error)
+        else:
+            job.status = AIJob.FAILED
+            logger.error("AI job %s failed permanently: %s", job.id, job.last_error)
+    job.locked_at = None
+    fields = ['status', 'result', 'last_error', 'run_after', 'locked_at', 'updated_at']
+    try:
+        with transaction.atomic():
+            job.save(update_fields=fields)
+    except IntegrityError:
+        # A newer job for the session was queued while this one ran; it
+        # covers this one's work, so hand over to it instead of retrying.
+        newer = AIJob.objects.filter(kind=job.kind, session_id=job.session_id, status=AIJob.QUEUED).first()
+        job.status = AIJob.SUPERSEDED
+        job.result = {'superseded_by': newer.id if newer else None}
+        job.save(update_fields=fields)
+        logger.info("AI job %s superseded by job %s", job.id, job.result['superseded_by'])
+    return job
+
+
+def run_pending(limit=None):
+    """Run runnable jobs in the calling thread until none are left (or ``limit``)."""
+    ran = 0
+    while limit is None or ran < limit:
+        job = claim_next()
+        if job is None:
+            break
+        run_job(job)
+        ran += 1
+    return ran
+
+
+class WorkerPool:
+    """A fixed number of threads draining the job table."""
+
+    def __init__(self, size, poll_interval=2.0):
+        self.size = size
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.size):
+            thread = threading.Thread(target=self._work, name=f'ai-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def wake(self):
+        self._wakeup.set()
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _work(self):
+        while not self._stopping.is_set():
+            close_old_connections()
+            try:
+                job = claim_next()
+                if job is not None:
+                    run_job(job)
+                    continue
+            except Exception:
+                logger.exception("AI worker loop error")
+            finally:
+                close_old_connections()
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """The in-process pool, started on first use (None when running out of process)."""
+    global _pool
+    if not _setting('AI_JOB_IN_PROCESS', True):
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool(_setting('AI_JOB_WORKERS', 2))
+            _pool.start()
+    return _pool
+
+
+def start_pool(**kwargs):
+    """``request_started`` receiver: makes sure the in-process pool is running."""
+    if _pool is None:
+        get_pool()
+
+
+def _wake_pool():
+    pool = get_pool()
+    if pool is not None:
+        pool.wake()
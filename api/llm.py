@@ -0,0 +1,269 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+import weakref
+
+import httpx
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from groq import AsyncGroq, Groq
+
+from . import metrics
+
+# Shared Groq client for the views and the background workers
+client = Groq(api_key=settings.GROQ_API_KEY)
+
+# Async clients hold an httpx connection pool bound to the event loop that
+# created it, so keep one per loop (under ASGI that's a single shared client).
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    loop = asyncio.get_running_loop()
+    async_client = _async_clients.get(loop)
+    if async_client is None:
+        async_client = _async_clients[loop] = AsyncGroq(
+            api_key=settings.GROQ_API_KEY,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.GROQ_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.GROQ_MAX_CONNECTIONS,
+                ),
+                timeout=httpx.Timeout(60.0, connect=5.0),
+            ),
+        )
+    return async_client
+
+
+async def close_async_client():
+    """Close this loop's client (for short-lived loops, e.g. in worker threads)."""
+    async_client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if async_client is not None:
+        await async_client.close()
+
+
+def _normalize(text):
+    # Whitespace differences shouldn't produce a different answer. Case can
+    # ("Co" is cobalt, "CO" carbon monoxide; code is case-sensitive), so it's kept.
+    return ' '.join(str(text).split())
+
+
+def cache_key(model, messages, **params):
+    """Content address of a chat completion request."""
+    body = json.dumps({
+        'model': model,
+        'messages': [[m['role'], _normalize(m['content'])] for m in messages],
+        'params': params,
+    }, sort_keys=True, separators=(',', ':'))
+    return 'completion:' + hashlib.sha256(body.encode()).hexdigest()
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class LLMCache:
+    """
+    Read-through cache for LLM responses with in-flight de-duplication.
+
+    Concurrent misses for the same key in this process wait on the first
+    caller's upstream request. Across processes, a short lock held in the
+    shared cache makes the others poll for the result instead of calling
+    upstream too. Hit / miss / coalesced counters are per process.
+    """
+    lock_timeout = 60  # seconds; longer than any single completion
+    poll_interval = 0.1
+
+    def __init__(self, alias='llm'):
+        self.alias = alias
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._ainflight = {}
+        self.hits = self.misses = self.coalesced = 0
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'hit_rate': round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get_or_call(self, key, fn, timeout=DEFAULT_TIMEOUT):
+        """
+        Return the cached value for ``key`` or compute it once with ``fn()``.
+
+        ``timeout`` defaults to the cache alias's own (``LLM_CACHE_TTL``).
+        """
+        value = self.cache.get(key)
+        if value is not None:
+            self._count('hits')
+            return value
+
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            self._count('coalesced')
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = self._call_once(key, fn, timeout)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def _call_once(self, key, fn, timeout):
+        lock_key = f'{key}:lock'
+        deadline = time.monotonic() + self.lock_timeout
+        while not self.cache.add(lock_key, 1, self.lock_timeout):
+            # Another process is computing it
+            time.sleep(self.poll_interval)
+            value = self.cache.get(key)
+            if value is not None:
+                self._count('coalesced')
+                return value
+            if time.monotonic() > deadline:
+                break
+        try:
+            self._count('misses')
+            value = fn()
+            self.cache.set(key, value, timeout)
+            return value
+        finally:
+            self.cache.delete(lock_key)
+
+    async def aget_or_call(self, key, fn, timeout=DEFAULT_TIMEOUT):
+        """Async ``get_or_call``: ``fn`` is a coroutine function."""
+        value = await self.cache.aget(key)
+        if value is not None:
+            self._count('hits')
+            return value
+
+        flight_key = (asyncio.get_running_loop(), key)
+        flight = self._ainflight.get(flight_key)
+        if flight is not None:
+            value = await asyncio.shield(flight)
+            self._count('coalesced')
+            return value
+
+        flight = self._ainflight[flight_key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await self._acall_once(key, fn, timeout)
+            flight.set_result(value)
+            return value
+        except BaseException as e:
+            flight.set_exception(e)
+            flight.exception()  # waiters re-raise it; don't warn if there are none
+            raise
+        finally:
+            self._ainflight.pop(flight_key, None)
+
+    async def _acall_once(self, key, fn, timeout):
+        lock_key = f'{key}:lock'
+        deadline = time.monotonic() + self.lock_timeout
+        while not await self.cache.aadd(lock_key, 1, self.lock_timeout):
+            await asyncio.sleep(self.poll_interval)
+            value = await self.cache.aget(key)
+            if value is not None:
+                self._count('coalesced')
+                return value
+            if time.monotonic() > deadline:
+                break
+        try:
+            self._count('misses')
+            value = await fn()
+            await self.cache.aset(key, value, timeout)
+            return value
+        finally:
+            await self.cache.adelete(lock_key)
+
+
+response_cache = LLMCache()
+
+
+def cached_completion(model, messages, parse=None, **params):
+    """
+    ``client.chat.completions.create`` through ``response_cache``.
+
+    Returns the message content, run through ``parse`` (e.g. ``json.loads``)
+    when given. Only successfully parsed responses are cached.
+    """
+    def call():
+        with metrics.llm_call():
+            completion = client.chat.completions.create(model=model, messages=messages, **params)
+        content = completion.choices[0].message.content
+        return parse(content) if parse else content
+
+    return response_cache.get_or_call(cache_key(model, messages, **params), call)
+
+
+async def acached_completion(model, messages, parse=None, **params):
+    """Async ``cached_completion`` using the pooled async client."""
+    async def call():
+        with metrics.llm_call():
+            completion = await get_async_client().chat.completions.create(model=model, messages=messages, **params)
+        content = completion.choices[0].message.content
+        return parse(content) if parse else content
+
+    return await response_cache.aget_or_call(cache_key(model, messages, **params), call)
+
+
+async def stream_completion(model, messages, on_complete=None, **params):
+    """
+    Yield the completion's content as it is generated.
+
+    Shares ``response_cache`` with ``cached_completion``: a cached answer is
+    yielded in one piece, and a fully streamed answer is cached afterwards.
+    ``on_complete(seconds, usage)`` is called once an upstream stream ends.
+    """
+    key = cache_key(model, messages, **params)
+    cache = response_cache.cache
+    cached = await cache.aget(key)
+    if cached is not None:
+        response_cache._count('hits')
+        yield cached
+        return
+
+    response_cache._count('misses')
+    parts, usage, started = [], None, time.perf_counter()
+    with metrics.llm_call():  # until the stream opens; tokens arrive after the response has started
+        stream = await get_async_client().chat.completions.create(
+            model=model, messages=messages, stream=True, **params
+        )
+    async for chunk in stream:
+        token = chunk.choices[0].delta.content if chunk.choices else None
+        if token:
+            parts.append(token)
+            yield token
+        # Groq reports usage on the last chunk
+        usage = getattr(getattr(chunk, 'x_groq', None), 'usage', None) or usage
+    await cache.aset(key, ''.join(parts))
+    if on_complete is not None:
+        on_complete(time.perf_counter() - started, usage)
@@ -0,0 +1,447 @@
+import asyncio
+import json
+import math
+import random
+import statistics
+import time
+import warnings
+from collections import Counter
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, resolve
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api import interests, similarity, urls as api_urls
+from api.feed_cache import feed_cache
+from api.models import ConversationNote, StudyPost, StudySession, UserMedia, UserProfile
+
+from .bench_search import WORDS
+
+PASSWORD = 'bench-password-1'
+
+# One answer that satisfies every JSON prompt the API sends (exam prep,
+# notes, certificate batches); plain-text prompts get SOLUTION.
+STUB_JSON = json.dumps({
+    'keyConcepts': ['limits', 'derivatives'],
+    'questions': [{'id': 1, 'text': 'Differentiate x^2'}],
+    'key_concepts': ['limit'], 'definitions': [{'term': 'limit', 'definition': '...'}],
+    'study_tips': ['practice'], 'resources': [], 'summary': 'A short summary.',
+    'certificates': [{'index': i, 'title': 'Certificate', 'issuer': 'Issuer', 'skills': ['skill']} for i in range(10)],
+})
+SOLUTION = "Step 1: write down what is known. Step 2: apply the rule. Answer: 42."
+
+
+class StubGroq:
+    """Answers like Groq (sync and async, streaming or not) after ``latency`` seconds."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        self.aio = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=self.acreate)))
+        self.aio.close = self.aclose
+
+    def _content(self, kwargs):
+        return STUB_JSON if 'response_format' in kwargs else SOLUTION
+
+    def create(self, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        return _completion(self._content(kwargs))
+
+    async def acreate(self, stream=False, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        content = self._content(kwargs)
+        if not stream:
+            return _completion(content)
+
+        async def chunks():
+            for word in content.split(' '):
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + ' '))])
+        return chunks()
+
+    async def aclose(self):
+        pass
+
+
+def _completion(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)]
+
+
+def route_names(patterns=None):
+    names = set()
+    for pattern in api_urls.urlpatterns if patterns is None else patterns:
+        if isinstance(pattern, URLPattern):
+            if pattern.name:
+                names.add(pattern.name)
+        else:
+            names |= route_names(pattern.url_patterns)
+    return names
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed synthetic data, drive every /api/ route through the test client with a stubbed "
+        "Groq client and report p50/p95/p99 latency, query count and response size per endpoint "
+        "(everything is rolled back afterwards). Compare against a saved run with --baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--posts', type=int, default=2000)
+        parser.add_argument('--sessions', type=int, default=500)
+        parser.add_argument('--participants', type=int, default=3, help="Per session (max %d)." % StudySession.MAX_PARTICIPANTS)
+        parser.add_argument('--member-sessions', type=int,
+                            help="Sessions the bench user takes part in (default: about 1 in 5).")
+        parser.add_argument('--notes', type=int, default=2000)
+        parser.add_argument('--media', type=int, default=1000)
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--llm-latency', type=float, default=0.0, help="Seconds the Groq stub takes per call.")
+        parser.add_argument('--warm-cache', action='store_true',
+                            help="Keep the feed / LLM response caches between requests (default: every request misses).")
+        parser.add_argument('--endpoint', action='append', default=[],
+                            help="Only run endpoints whose name contains this (repeatable).")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--format', choices=['table', 'json'], default='table')
+        parser.add_argument('--output', help="Also write the JSON report to this file (use it as a baseline later).")
+        parser.add_argument('--baseline', help="JSON report of an earlier run to compare against.")
+        parser.add_argument('--max-regression', type=float, default=0.25,
+                            help="Allowed relative growth of p95 latency and response size (default 0.25).")
+        parser.add_argument('--min-delta-ms', type=float, default=2.0,
+                            help="p95 growth below this many ms is treated as noise.")
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.groq = StubGroq(options['llm_latency'])
+        overrides = override_settings(
+            ALLOWED_HOSTS=['testserver'], AI_JOB_IN_PROCESS=False, AI_JOB_MAX_PENDING=10 ** 9,
+            AI_ADMISSION=False,  # measuring the endpoints, not the rate limits
+        )
+        try:
+            with overrides, transaction.atomic(), warnings.catch_warnings(), \
+                    mock.patch('api.llm.client', self.groq), \
+                    mock.patch('api.llm.get_async_client', return_value=self.groq.aio):
+                warnings.simplefilter('ignore')
+                self.seed()
+                report = self.run()
+                raise _Rollback
+        except _Rollback:
+            caches['auth'].clear()  # users cached by the run are rolled back
+            caches[interests.CACHE_ALIAS].clear()
+            similarity.index.clear()
+
+        rendered = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(rendered + '\n')
+        if options['format'] == 'json':
+            self.stdout.write(rendered)
+        else:
+            self.print_table(report)
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                regressions = self.compare(json.load(f), report)
+            if regressions:
+                raise CommandError(f"{len(regressions)} regression(s) against {options['baseline']}")
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['baseline']}"))
+
+    # Seeding
+
+    def seed(self):
+        o, rng = self.options, self.rng
+        if o['sessions'] > o['posts']:
+            raise CommandError("--sessions can't exceed --posts (one active session per post)")
+        if o['users'] < 1 or o['posts'] < 1:
+            raise CommandError("Seed at least one user and one post")
+        started = time.perf_counter()
+        rounds = o['warmup'] + o['iterations']
+
+        password = make_password(PASSWORD)  # hashed once, shared by all seeded users
+        users = User.objects.bulk_create([
+            User(username=f'bench_user_{i}', email=f'bench{i}@example.com', password=password)
+            for i in range(o['users'] + 2)
+        ])
+        self.admin, self.user, users = users[0], users[1], users[2:]
+        User.objects.filter(id=self.admin.id).update(is_staff=True)
+        UserProfile.objects.bulk_create([UserProfile(user=user, bio='Bench', study_interests=rng.sample(WORDS, 3))
+                                         for user in [self.admin, self.user] + users])
+
+        def post(author):
+            return StudyPost(user=author, subject=rng.choice(WORDS),
+                             title=' '.join(rng.choices(WORDS, k=4)), topic=' '.join(rng.choices(WORDS, k=2)),
+                             description=' '.join(rng.choices(WORDS, k=30)))
+        posts = StudyPost.objects.bulk_create([post(rng.choice(users)) for _ in range(o['posts'])])
+        # Posts (and sessions) of the bench user that end_session can close one per round
+        own_posts = StudyPost.objects.bulk_create([post(self.user) for _ in range(rounds)])
+
+        sessions = StudySession.objects.bulk_create(
+            [StudySession(post=p, creator=p.user, is_active=True, firestore_chat_id=f'bench-{p.id}')
+             for p in posts[:o['sessions']] + own_posts]
+        )
+        through = StudySession.participants.through
+        members = []
+        for n, session in enumerate(sessions):
+            joined = {session.creator_id} | {u.id for u in rng.sample(users, min(len(users), o['participants']))}
+            if o['member_sessions'] is None:
+                member = session.post.user_id != self.user.id and rng.random() < 0.2
+            else:
+                member = n < o['member_sessions']
+            if member:
+                joined.add(self.user.id)
+            # Creator and bench user first, so the cap never drops them
+            keep = {session.creator_id, self.user.id}
+            joined = sorted(joined, key=lambda uid: (uid not in keep, uid))[:StudySession.MAX_PARTICIPANTS]
+            members += [through(studysession_id=session.id, user_id=uid) for uid in joined]
+        through.objects.bulk_create(members)
+
+        ConversationNote.objects.bulk_create([
+            ConversationNote(session=rng.choice(sessions), content=' '.join(rng.choices(WORDS, k=60)),
+                             key_concepts=rng.sample(WORDS, 5), message_count_analyzed=rng.randint(1, 200))
+            for _ in range(o['notes'])
+        ])
+        UserMedia.objects.bulk_create([
+            UserMedia(user=rng.choice(users + [self.user]), file_url=f'https://cdn.example.com/{i}.png',
+                      category=rng.choice(['note', 'certificate']), title=f'Media {i}',
+                      is_public=rng.random() < 0.7)
+            for i in range(o['media'])
+        ])
+        # bulk_create / update() don't send the signals these caches listen to
+        feed_cache.bump()
+        caches['auth'].clear()
+        similarity.index_posts(StudyPost.objects.all())
+        interests.index_profiles(UserProfile.objects.all())
+        interests.index_posts(StudyPost.objects.all())
+        similarity.index.clear()  # reloaded from the seeded vectors on first use
+
+        self.usernames = [u.username for u in users]
+        # Posts without a session: joining opens one
+        self.joinable = [p.id for p in posts[o['sessions']:]] or [p.id for p in posts]
+        self.own_sessions = [s.id for s in sessions[-rounds:]]
+        self.member_sessions = list(StudySession.objects.filter(participants=self.user).values_list('id', flat=True))
+        self.note_ids = list(ConversationNote.objects.filter(session_id__in=self.member_sessions)
+                             .values_list('id', flat=True)[:100]) or [0]
+        self.post_ids = [p.id for p in posts]
+        if o['format'] == 'table':
+            self.stdout.write(
+                f"Seeded {len(users) + 2} users, {len(posts) + rounds} posts, {len(sessions)} sessions, "
+                f"{len(members)} participants, {o['notes']} notes, {o['media']} media "
+                f"in {time.perf_counter() - started:.1f}s"
+            )
+
+    # Endpoints
+
+    def endpoints(self):
+        """(name, method, path, body or None, client); callables get (round, state)."""
+        user, admin = self.client_for(self.user), self.client_for(self.admin)
+        anonymous = Client()
+        rng = self.rng
+        messages = [{'userName': 'bench', 'text': ' '.join(rng.choices(WORDS, k=12))} for _ in range(40)]
+
+        def item(i):
+            return {'fileUrl': f'https://cdn.example.com/up-{i}.png', 'category': 'certificate',
+                    'aiAnalysisText': ' '.join(rng.choices(WORDS, k=8))}
+
+        def pick(values):
+            return lambda i, state: values[i % len(values)]
+
+        member_session = pick(self.member_sessions or self.own_sessions)
+        # Appending needs a session session-end won't close
+        open_session = pick([s for s in self.member_sessions if s not in self.own_sessions] or self.member_sessions)
+        return [
+            ('api-root', 'get', '/api/', None, user),
+            ('ping', 'get', '/api/ping/', None, anonymous),
+            ('metrics', 'get', '/api/metrics/', None, admin),
+            ('register', 'post', '/api/auth/register/',
+             lambda i, state: {'username': f'bench_new_{i}', 'password': PASSWORD, 'email': f'new{i}@example.com'},
+             anonymous),
+            ('login', 'post', '/api/auth/login/', {'username': self.user.username, 'password': PASSWORD}, anonymous),
+            # Refresh tokens are single-use (rotated and blacklisted)
+            ('refresh', 'post', '/api/auth/refresh/',
+             lambda i, state: {'refresh': str(RefreshToken.for_user(self.user))}, anonymous),
+
+            ('feed', 'get', '/api/study-posts/', None, anonymous),
+            ('feed-cursor', 'get', '/api/study-posts/?pagination=cursor', None, user),
+            ('feed-fields', 'get', '/api/study-posts/?fields=id,title,topic,subject', None, user),
+            ('feed-search', 'get', lambda i, state: f'/api/study-posts/?search={WORDS[i % len(WORDS)]}', None, user),
+            ('feed-fulltext', 'get',
+             lambda i, state: f'/api/study-posts/?search={WORDS[i % len(WORDS)][:5]}&search_mode=fulltext', None, user),
+            ('post-detail', 'get', lambda i, state: f'/api/study-posts/{pick(self.post_ids)(i, state)}/', None, user),
+            ('post-create', 'post', '/api/study-posts/',
+             {'title': 'Bench post', 'topic': 'Limits', 'description': 'Revision', 'subject': 'Maths'}, user),
+            ('post-similar', 'get', lambda i, state: f'/api/study-posts/{pick(self.post_ids)(i, state)}/similar/',
+             None, user),
+            ('posts-recommended', 'get', '/api/study-posts/recommended/', None, user),
+            ('post-join', 'post', lambda i, state: f'/api/study-posts/{pick(self.joinable)(i, state)}/join/', None, user),
+            ('feed-cache-stats', 'get', '/api/study-posts/cache-stats/', None, admin),
+
+            ('sessions', 'get', '/api/sessions/', None, user),
+            ('sessions-expanded', 'get', '/api/sessions/?expand=post,creator,participants', None, user),
+            ('session-detail', 'get', lambda i, state: f'/api/sessions/{member_session(i, state)}/', None, user),
+            ('session-messages', 'get', lambda i, state: f'/api/sessions/{member_session(i, state)}/messages/',
+             None, user),
+            ('session-messages-append', 'post', lambda i, state: f'/api/sessions/{open_session(i, state)}/messages/',
+             {'messages': messages[:5]}, user),
+            ('session-export', 'get', lambda i, state: f'/api/sessions/{member_session(i, state)}/export/', None, user),
+            ('session-leave', 'post', lambda i, state: f"/api/sessions/{state.get('joined', 0)}/leave/", None, user),
+            ('session-end', 'post', lambda i, state: f'/api/sessions/{pick(self.own_sessions)(i, state)}/end_session/',
+             None, user),
+            ('session-generate-notes', 'post',
+             lambda i, state: f'/api/sessions/{member_session(i, state)}/generate_notes/', {'messages': messages}, user),
+            ('session-notes', 'get', lambda i, state: f'/api/sessions/{member_session(i, state)}/notes/', None, user),
+            ('notes', 'get', '/api/notes/', None, user),
+            ('note-detail', 'get', lambda i, state: f'/api/notes/{pick(self.note_ids)(i, state)}/', None, user),
+            ('jobs', 'get', '/api/jobs/', None, user),
+            ('job-detail', 'get', lambda i, state: f"/api/jobs/{state.get('job', 0)}/", None, user),
+
+            ('profiles', 'get', '/api/userprofile/', None, user),
+            ('profile-detail', 'get', lambda i, state: f'/api/userprofile/{pick(self.usernames)(i, state)}/', None, user),
+            ('profile-me', 'get', '/api/userprofile/me/', None, user),
+            ('profile-matches', 'get', '/api/userprofile/matches/', None, user),
+            ('profile-matches-posts', 'get', '/api/userprofile/matches/?type=posts', None, user),
+            ('profile-me-update', 'post', '/api/userprofile/me/', {'bio': 'Revising for finals'}, user),
+            ('upload-media', 'post', '/api/userprofile/upload_media/', lambda i, state: item(i), user),
+            ('upload-media-bulk', 'post', '/api/userprofile/upload_media/bulk/',
+             lambda i, state: {'items': [item(i * 10 + n) for n in range(10)]}, user),
+
+            ('exam-prep', 'post', '/api/exam-prep/',
+             {'subject': 'Maths', 'topic': 'Limits', 'gradeLevel': 'Grade 12', 'difficulty': 'Hard'}, user),
+            ('exam-solve', 'post', '/api/exam-prep/solve/', {'question': 'Differentiate x^2'}, user),
+            ('exam-solve-stream', 'post', '/api/exam-prep/solve/', {'question': 'Differentiate x^2', 'stream': 'sse'}, user),
+            ('exam-cache-stats', 'get', '/api/exam-prep/cache-stats/', None, admin),
+        ]
+
+    def client_for(self, user):
+        token = RefreshToken.for_user(user).access_token
+        return Client(headers={'Authorization': f'Bearer {token}'})
+
+    # Running
+
+    def run(self):
+        o = self.options
+        endpoints = [e for e in self.endpoints()
+                     if not o['endpoint'] or any(part in e[0] for part in o['endpoint'])]
+        samples = {name: {'ms': [], 'queries': [], 'bytes': [], 'status': Counter()} for name, *_ in endpoints}
+        covered = set()
+
+        for i in range(o['warmup'] + o['iterations']):
+            state = {}
+            for name, method, path, body, client in endpoints:
+                path = path(i, state) if callable(path) else path
+                body = body(i, state) if callable(body) else body
+                if not o['warm_cache']:
+                    caches['feed'].clear()
+                    caches['llm'].clear()
+                elapsed, queries, response, size = self.request(client, method, path, body)
+                covered.add(resolve(path.split('?')[0]).url_name)
+                self.remember(name, response, state)
+                if i >= o['warmup']:
+                    sample = samples[name]
+                    sample['ms'].append(elapsed)
+                    sample['queries'].append(queries)
+                    sample['bytes'].append(size)
+                    sample['status'][str(response.status_code)] += 1
+
+        results = {}
+        for name, sample in samples.items():
+            ms = sorted(sample['ms'])
+            results[name] = {
+                'p50_ms': round(percentile(ms, 50), 3),
+                'p95_ms': round(percentile(ms, 95), 3),
+                'p99_ms': round(percentile(ms, 99), 3),
+                'mean_ms': round(statistics.fmean(ms), 3) if ms else 0.0,
+                'queries': statistics.median(sample['queries']) if ms else 0,
+                'max_queries': max(sample['queries'], default=0),
+                'bytes': statistics.median(sample['bytes']) if ms else 0,
+                'status': dict(sample['status']),
+            }
+        return {
+            'meta': {
+                'created_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'volumes': {k: o[k] for k in ('users', 'posts', 'sessions', 'participants', 'notes', 'media')},
+                'iterations': o['iterations'],
+                'warm_cache': o['warm_cache'],
+                'llm_latency': o['llm_latency'],
+                'llm_calls': self.groq.calls,
+                'uncovered_routes': sorted(route_names() - covered) if not o['endpoint'] else [],
+            },
+            'endpoints': results,
+        }
+
+    def request(self, client, method, path, body):
+        kwargs = {}
+        if body is not None:
+            kwargs = {'data': json.dumps(body), 'content_type': 'application/json'}
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = getattr(client, method)(path, **kwargs)
+            # Streams are only done once fully read
+            content = b''.join(response) if response.streaming else response.content
+            elapsed = (time.perf_counter() - started) * 1000
+        return elapsed, len(queries), response, len(content)
+
+    def remember(self, name, response, state):
+        """Keep ids later endpoints in the same round refer to."""
+        if response.status_code >= 400 or response.streaming:
+            return
+        if name == 'post-join':
+            state['joined'] = response.json()['id']
+        elif name == 'session-generate-notes':
+            state['job'] = response.json()['job_id']
+
+    # Reporting
+
+    def print_table(self, report):
+        header = f"{'endpoint':<24}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'bytes':>9}  status"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for name, r in report['endpoints'].items():
+            status = ' '.join(f'{code}x{count}' for code, count in sorted(r['status'].items()))
+            self.stdout.write(f"{name:<24}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}"
+                              f"{r['queries']:>9g}{r['bytes']:>9g}  {status}")
+        uncovered = report['meta']['uncovered_routes']
+        if uncovered:
+            self.stdout.write(self.style.WARNING(f"Routes not exercised: {', '.join(uncovered)}"))
+
+    def compare(self, baseline, report):
+        """Print and return the endpoints that got slower, chattier or bigger than ``baseline``."""
+        o = self.options
+        limit = 1 + o['max_regression']
+        regressions = []
+        for name, now in report['endpoints'].items():
+            before = baseline.get('endpoints', {}).get(name)
+            if before is None:
+                continue
+            if now['p95_ms'] > before['p95_ms'] * limit and now['p95_ms'] - before['p95_ms'] > o['min_delta_ms']:
+                regressions.append(f"{name}: p95 {before['p95_ms']:.2f}ms -> {now['p95_ms']:.2f}ms")
+            if now['queries'] > before['queries']:
+                regressions.append(f"{name}: queries {before['queries']:g} -> {now['queries']:g}")
+            if now['bytes'] > before['bytes'] * limit:
+                regressions.append(f"{name}: response {before['bytes']:g} -> {now['bytes']:g} bytes")
+        for line in regressions:
+            self.stderr.write(self.style.ERROR(f"REGRESSION {line}"))
+        return regressions
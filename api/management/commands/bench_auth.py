@@ -0,0 +1,79 @@
+import base64
+import statistics
+import time
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import BasicAuthentication, SessionAuthentication
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.authentication import CACHE_ALIAS, CachedJWTAuthentication
+
+PASSWORD = 'bench-auth-password'
+
+# The authentication classes before and after the JWT-first change
+BEFORE = (SessionAuthentication, BasicAuthentication, JWTAuthentication)
+AFTER = (CachedJWTAuthentication, SessionAuthentication)
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Time the authentication of one request (per scheme, old vs new authentication classes)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000)
+        parser.add_argument('--basic-iterations', type=int, default=20,
+                            help="Basic auth hashes the password every time, so it gets fewer rounds.")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                user = User.objects.create_user('bench_auth_user', password=PASSWORD)
+                bearer = f'Bearer {AccessToken.for_user(user)}'
+                basic = 'Basic ' + base64.b64encode(f'{user.username}:{PASSWORD}'.encode()).decode()
+                n, n_basic = options['iterations'], options['basic_iterations']
+                cases = [
+                    ('before  Basic', BEFORE, basic, n_basic),
+                    ('before  JWT', BEFORE, bearer, n),
+                    ('after   JWT (cached)', AFTER, bearer, n),
+                    ('opt-in  Basic', AFTER + (BasicAuthentication,), basic, n_basic),
+                ]
+                self.stdout.write(f"{'':22}{'mean us':>10}{'p50 us':>10}{'p95 us':>10}{'queries':>9}")
+                for label, classes, header, rounds in cases:
+                    self._report(label, classes, header, rounds)
+                raise _Rollback
+        except _Rollback:
+            caches[CACHE_ALIAS].clear()
+
+    def _authenticate(self, factory, classes, header):
+        http_request = factory.get('/api/', HTTP_AUTHORIZATION=header)
+        http_request.user = AnonymousUser()  # what AuthenticationMiddleware leaves without a session
+        request = Request(http_request, authenticators=[auth() for auth in classes])
+        assert request.user.is_authenticated
+        return request.user
+
+    def _report(self, label, classes, header, rounds):
+        factory = RequestFactory()
+        caches[CACHE_ALIAS].clear()
+        self._authenticate(factory, classes, header)  # warm up (and fill the user cache)
+        timings = []
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(rounds):
+                started = time.perf_counter()
+                self._authenticate(factory, classes, header)
+                timings.append((time.perf_counter() - started) * 1e6)
+        timings.sort()
+        p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+        self.stdout.write(
+            f"{label:22}{statistics.mean(timings):>10.0f}{statistics.median(timings):>10.0f}{p95:>10.0f}"
+            f"{len(queries.captured_queries) / rounds:>9.1f}"
+        )
@@ -0,0 +1,94 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api import interests
+from api.models import StudyPost, UserProfile
+
+from .bench_search import build_vocabulary
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Time interest matching (users and posts) on a seeded synthetic user base (rolled back afterwards)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--posts', type=int, default=20_000)
+        parser.add_argument('--tags', type=int, default=2_000, help="Distinct interests (Zipf-distributed).")
+        parser.add_argument('--interests', type=int, default=5, help="Interests per profile.")
+        parser.add_argument('--queries', type=int, default=100)
+        parser.add_argument('--seed', type=int, default=11)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        try:
+            with transaction.atomic():
+                users = self._seed(rng, options)
+                requesters = rng.sample(users, min(options['queries'], len(users)))
+                self.stdout.write(f"{'':16}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}")
+                # What matching took without the index: decode every profile's JSON
+                self._report('users (scan)', self._scan, requesters[:5])
+                self._report('users', lambda user: interests.find_matching_users(user, 10), requesters)
+                self._report('posts', lambda user: interests.find_matching_posts(user, 10), requesters)
+                caches[interests.CACHE_ALIAS].clear()
+                for user in requesters:
+                    interests.matching_users(user)
+                self._report('users (cached)', lambda user: interests.matching_users(user), requesters)
+                raise _Rollback
+        except _Rollback:
+            caches[interests.CACHE_ALIAS].clear()
+
+    def _seed(self, rng, o):
+        started = time.perf_counter()
+        words, weights = build_vocabulary(rng, size=o['tags'])
+        # A few two-word interests too, like "organic chemistry"
+        tags = [w if n % 4 else f'{w} {words[(n * 7) % len(words)]}' for n, w in enumerate(words)]
+
+        def pick(k):
+            return list(dict.fromkeys(rng.choices(tags, cum_weights=weights, k=k)))
+
+        users = User.objects.bulk_create(
+            [User(username=f'bench_interest_{i}') for i in range(o['users'])], batch_size=5000)
+        UserProfile.objects.bulk_create(
+            [UserProfile(user=user, study_interests=pick(o['interests'])) for user in users], batch_size=5000)
+        posts = StudyPost.objects.bulk_create([
+            StudyPost(user=rng.choice(users), title='Bench', description='Bench',
+                      subject=rng.choices(tags, cum_weights=weights)[0], topic=rng.choices(tags, cum_weights=weights)[0])
+            for _ in range(o['posts'])
+        ], batch_size=5000)
+        seeded = time.perf_counter()
+        interests.index_profiles(UserProfile.objects.filter(user__in=users))
+        interests.index_posts(StudyPost.objects.filter(pk__in=[post.pk for post in posts]))
+        self.stdout.write(
+            f"Seeded {o['users']} users x {o['interests']} interests and {o['posts']} posts "
+            f"in {seeded - started:.1f}s, indexed in {time.perf_counter() - seeded:.1f}s"
+        )
+        return users
+
+    def _scan(self, user):
+        mine = set(interests.normalize(UserProfile.objects.get(user=user).study_interests))
+        scores = []
+        for user_id, values in UserProfile.objects.exclude(user=user).values_list('user_id', 'study_interests'):
+            score = len(mine.intersection(interests.normalize(values)))
+            if score:
+                scores.append((-score, user_id))
+        return sorted(scores)[:10]
+
+    def _report(self, label, fn, requesters):
+        timings = []
+        for user in requesters:
+            started = time.perf_counter()
+            fn(user)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+        self.stdout.write(f"{label:16}{statistics.median(timings):>9.2f}{p95:>9.2f}{timings[-1]:>9.2f}")
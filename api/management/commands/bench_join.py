@@ -0,0 +1,80 @@
+import threading
+import time
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from api import interests
+from api.models import StudyPost, StudyPostVector, StudySession
+
+PREFIX = 'bench_join_'
+
+
+class Command(BaseCommand):
+    help = ("Time concurrent StudyPost joins from many threads, each on its own DB connection. "
+            "The rows are committed (the threads must see them) and deleted afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--posts', type=int, default=20, help="Every thread joins every post.")
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith=PREFIX).exists():
+            raise CommandError(f"Users named {PREFIX}* exist; delete them (an interrupted run?) first.")
+        threads = options['threads']
+        owner = User.objects.create_user(f'{PREFIX}owner')
+        users = [User.objects.create_user(f'{PREFIX}{i}') for i in range(threads)]
+        posts = [
+            StudyPost.objects.create(user=owner, title=f'Bench join {i}', topic='t', description='d', subject='s')
+            for i in range(options['posts'])
+        ]
+        try:
+            with override_settings(ALLOWED_HOSTS=['testserver'], AI_JOB_IN_PROCESS=False):
+                statuses, errors, elapsed = self._run(users, [post.id for post in posts])
+            broken = [post.id for post in posts if StudySession.objects.filter(post=post, is_active=True).count() != 1
+                      or StudySession.objects.get(post=post, is_active=True).participants.count()
+                      > StudySession.MAX_PARTICIPANTS]
+        finally:
+            post_ids = [post.id for post in posts]
+            User.objects.filter(username__startswith=PREFIX).delete()
+            StudyPostVector.objects.filter(post_id__in=post_ids).delete()  # tombstones of the deleted posts
+            caches['auth'].clear()
+            caches[interests.CACHE_ALIAS].clear()
+
+        self.stdout.write(
+            f"{len(statuses)} joins over {threads} threads in {elapsed:.2f}s: "
+            f"{len(statuses) / elapsed:.0f} joins/s ({', '.join(f'{n} x {s}' for s, n in sorted(Counter(statuses).items()))})"
+        )
+        if errors:
+            self.stdout.write(self.style.ERROR(f"{len(errors)} thread(s) failed: {errors[0]!r}"))
+        if broken:
+            self.stdout.write(self.style.ERROR(f"Posts without exactly one session within the cap: {broken}"))
+
+    def _run(self, users, post_ids):
+        barrier = threading.Barrier(len(users))
+        statuses, errors = [], []
+
+        def worker(user):
+            client = APIClient()
+            client.force_authenticate(user)
+            barrier.wait()
+            try:
+                for post_id in post_ids:
+                    statuses.append(client.post(f'/api/study-posts/{post_id}/join/').status_code)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                close_old_connections()
+
+        workers = [threading.Thread(target=worker, args=(user,)) for user in users]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return statuses, errors, time.perf_counter() - started
@@ -0,0 +1,96 @@
+import gzip
+import io
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from api.models import ConversationNote, StudyPost, StudySession
+from api.renderers import MessagePackParser, MessagePackRenderer, ORJSONParser, ORJSONRenderer
+from api.serializers import ConversationNoteSerializer, StudySessionSerializer
+
+FORMATS = [
+    ('drf json', JSONRenderer, JSONParser),
+    ('orjson', ORJSONRenderer, ORJSONParser),
+    ('msgpack', MessagePackRenderer, MessagePackParser),
+]
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Compare render/parse time and payload size of the API's renderers on representative responses."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--page-size', type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                payloads = self.payloads(options['page_size'])
+                self.stdout.write(f"{'':24}{'render us':>11}{'parse us':>10}{'MB/s':>8}{'bytes':>9}{'gzip':>8}")
+                for name, data in payloads:
+                    for label, renderer, parser in FORMATS:
+                        self._report(f'{name} {label}', data, renderer(), parser(), options['iterations'])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def payloads(self, size):
+        """A page of sessions (nested post/creator/participants) and a page of notes, as the views return them."""
+        users = User.objects.bulk_create([
+            User(username=f'bench_render_{i}', email=f'render{i}@example.com', first_name='Ada', last_name='Lovelace')
+            for i in range(size + StudySession.MAX_PARTICIPANTS)
+        ])
+        posts = StudyPost.objects.bulk_create([
+            StudyPost(user=users[i], title=f'Revision group {i}: limits and continuity', topic='Limits',
+                      subject='Mathematics', description='Working through past papers together. ' * 8)
+            for i in range(size)
+        ])
+        sessions = StudySession.objects.bulk_create([
+            StudySession(post=post, creator=post.user, firestore_chat_id=f'bench-render-{post.id}')
+            for post in posts
+        ])
+        StudySession.participants.through.objects.bulk_create([
+            StudySession.participants.through(studysession=session, user=users[i + n])
+            for i, session in enumerate(sessions) for n in range(StudySession.MAX_PARTICIPANTS)
+        ])
+        concepts = ['limit', 'continuity', 'squeeze theorem', "l'Hôpital's rule", 'epsilon-delta definition']
+        notes = ConversationNote.objects.bulk_create([
+            ConversationNote(session=session, content='The group reviewed one-sided limits. ' * 20,
+                             key_concepts=concepts, study_tips=['Sketch the graph first'] * 3,
+                             definitions=[{'term': c, 'definition': f'What {c} means, in one line.'} for c in concepts],
+                             resources_mentioned=['Stewart, chapter 2'], message_count_analyzed=120)
+            for session in sessions
+        ])
+
+        session_page = (StudySession.objects.filter(pk__in=[s.pk for s in sessions])
+                        .select_related('post__user', 'creator').prefetch_related('participants'))
+        note_page = ConversationNote.objects.filter(pk__in=[n.pk for n in notes]).select_related('session__post')
+        return [
+            ('sessions', StudySessionSerializer(session_page, many=True).data),
+            ('notes', ConversationNoteSerializer(note_page, many=True).data),
+        ]
+
+    def _report(self, label, data, renderer, parser, rounds):
+        body = renderer.render(data)
+        render, parse = [], []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            renderer.render(data)
+            render.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            parser.parse(io.BytesIO(body))
+            parse.append(time.perf_counter() - started)
+        mean_render = statistics.mean(render)
+        self.stdout.write(
+            f"{label:24}{mean_render * 1e6:>11.0f}{statistics.mean(parse) * 1e6:>10.0f}"
+            f"{len(body) / mean_render / 1e6:>8.0f}{len(body):>9}{len(gzip.compress(body)):>8}"
+        )
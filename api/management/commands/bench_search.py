@@ -0,0 +1,101 @@
+import itertools
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import models as django_models, transaction
+
+from api.models import StudyPost
+from api.search import fulltext_search
+
+WORDS = (
+    "algebra calculus derivative integral matrix vector probability statistics "
+    "physics momentum energy quantum thermodynamics chemistry molecule reaction "
+    "biology cell genetics evolution history revolution empire economics market "
+    "inflation literature poetry novel grammar essay programming python recursion "
+    "algorithm database network geometry triangle theorem proof exam revision"
+).split()
+
+
+SYLLABLES = "ba co de fi gu ha jo ki lu ma ne po ra si tu ve xo ze".split()
+
+
+def build_vocabulary(rng, size=5000):
+    """Real subject words plus synthetic ones, sampled with Zipf-like weights."""
+    words = list(WORDS)
+    while len(words) < size:
+        words.append(''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    rng.shuffle(words)
+    return words, list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Compare the icontains StudyPost search against the full-text index on seeded data (rolled back afterwards)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100_000)
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        try:
+            with transaction.atomic():
+                words, weights = build_vocabulary(rng)
+                self._seed(rng, options['posts'], words, weights)
+                terms = rng.choices(words, cum_weights=weights, k=options['queries'])
+                base = StudyPost.objects.filter(is_active=True)
+
+                def icontains(term):
+                    return list(base.filter(
+                        django_models.Q(title__icontains=term) |
+                        django_models.Q(topic__icontains=term) |
+                        django_models.Q(description__icontains=term)
+                    ).order_by('-created_at').values_list('id', flat=True)[:20])
+
+                def fulltext(term):
+                    # prefix match on the first 5 letters, like a search-as-you-type box
+                    return list(fulltext_search(base, term[:5]).values_list('id', flat=True)[:20])
+
+                for label, fn in (('icontains', icontains), ('fulltext', fulltext)):
+                    self._report(label, fn, terms)
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _seed(self, rng, count, words, weights):
+        user, _ = User.objects.get_or_create(username='bench_search_user')
+        started = time.perf_counter()
+        batch = []
+        for _ in range(count):
+            batch.append(StudyPost(
+                user=user,
+                title=' '.join(rng.choices(words, cum_weights=weights, k=4)),
+                topic=' '.join(rng.choices(words, cum_weights=weights, k=2)),
+                description=' '.join(rng.choices(words, cum_weights=weights, k=40)),
+                subject=rng.choice(WORDS),
+            ))
+            if len(batch) == 5000:
+                StudyPost.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            StudyPost.objects.bulk_create(batch)
+        self.stdout.write(f"Seeded {count} posts in {time.perf_counter() - started:.1f}s")
+
+    def _report(self, label, fn, terms):
+        timings = []
+        for term in terms:
+            started = time.perf_counter()
+            fn(term)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        self.stdout.write(
+            f"{label:>10}: median {statistics.median(timings):.2f}ms  p95 {p95:.2f}ms  max {timings[-1]:.2f}ms"
+        )
@@ -0,0 +1,61 @@
+import random
+import statistics
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+
+from api.similarity import PostIndex, interests_matrix, post_vector
+
+from .bench_search import build_vocabulary
+
+
+class Command(BaseCommand):
+    help = "Time similar / recommended post queries and index updates on a synthetic in-memory index."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100_000)
+        parser.add_argument('--owners', type=int, default=5_000)
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--dimensions', type=int, default=None, help="Defaults to SIMILAR_POSTS_DIMENSIONS.")
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        words, weights = build_vocabulary(rng)
+
+        def text(k):
+            return ' '.join(rng.choices(words, cum_weights=weights, k=k))
+
+        def post():
+            return SimpleNamespace(title=text(5), topic=text(2), subject=text(1), description=text(30))
+
+        started = time.perf_counter()
+        index = PostIndex(options['dimensions'])
+        posts = [post() for _ in range(options['posts'])]
+        vectors = [post_vector(p, index.dims) for p in posts]
+        for post_id, vector in enumerate(vectors, 1):
+            index.upsert(post_id, rng.randrange(options['owners']), vector)
+        self.stdout.write(
+            f"Indexed {len(index)} posts x {index.dims} dims ({index.matrix.nbytes / 2 ** 20:.0f} MiB allocated) "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+
+        n, limit = options['queries'], options['limit']
+        self._report('similar', n, lambda i: index.search(vectors[i], limit, exclude_posts=[i + 1]))
+        interests = [interests_matrix(rng.sample(words[:200], 5), index.dims) for _ in range(n)]
+        self._report('recommended (5 interests)', n, lambda i: index.search(
+            interests[i], limit, exclude_owner=i))
+        self._report('upsert', n, lambda i: index.upsert(options['posts'] + i + 1, 0, vectors[i]))
+        self._report('remove', n, lambda i: index.remove(i + 1))
+
+    def _report(self, label, rounds, operation):
+        timings = []
+        for i in range(rounds):
+            started = time.perf_counter()
+            operation(i)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+        self.stdout.write(f"{label:28}p50 {statistics.median(timings):8.3f} ms   p95 {p95:8.3f} ms")
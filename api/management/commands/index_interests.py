@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.interests import index_posts, index_profiles
+from api.models import StudyPost, UserProfile
+
+
+class Command(BaseCommand):
+    help = "(Re)build the interest tag index behind /api/userprofile/matches/ from profiles and posts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        profiles = index_profiles(UserProfile.objects.all(), batch_size=options['batch_size'])
+        posts = index_posts(StudyPost.objects.all(), batch_size=options['batch_size'])
+        self.stdout.write(f"Indexed {profiles} profile(s) and {posts} post(s) in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.models import StudyPost
+from api.similarity import index_posts, purge_tombstones
+
+
+class Command(BaseCommand):
+    help = "(Re)compute the text vectors behind similar / recommended posts (after deploying, or changing SIMILAR_POSTS_DIMENSIONS)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--missing', action='store_true', help="Only posts that have no vector yet.")
+
+    def handle(self, *args, **options):
+        posts = StudyPost.objects.all()
+        if options['missing']:
+            posts = posts.filter(text_vector__isnull=True)
+        started = time.perf_counter()
+        total = index_posts(posts, batch_size=options['batch_size'])
+        self.stdout.write(f"Indexed {total} post(s) in {time.perf_counter() - started:.1f}s")
+        self.stdout.write(f"Purged {purge_tombstones()} deleted post(s)' vectors")
@@ -0,0 +1,33 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.jobs import WorkerPool, run_pending
+
+
+class Command(BaseCommand):
+    help = "Run the background AI job workers outside the web process (set AI_JOB_IN_PROCESS=false on the web side)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.AI_JOB_WORKERS)
+        parser.add_argument('--poll-interval', type=float, default=2.0)
+        parser.add_argument('--once', action='store_true', help="Drain runnable jobs in this thread and exit.")
+
+    def handle(self, *args, **options):
+        if options['once']:
+            ran = run_pending()
+            self.stdout.write(f"Ran {ran} job(s)")
+            return
+
+        pool = WorkerPool(options['workers'], poll_interval=options['poll_interval'])
+        stop = threading.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: stop.set())
+
+        pool.start()
+        self.stdout.write(f"AI worker pool running with {options['workers']} thread(s)")
+        stop.wait()
+        self.stdout.write("Shutting down, waiting for running jobs...")
+        pool.stop()
@@ -0,0 +1,137 @@
+"""
+Portfolio media uploads, with certificate text read by the AI off-request.
+
+``create_media`` inserts every item with one ``bulk_create`` and queues a
+``certificates`` job (api/jobs.py) per ``CERTIFICATE_BATCH_SIZE`` certificates
+that came with text. Each job sends its whole batch in one prompt. Rows show
+their progress in ``analysis_status``: pending until the job fills in title,
+issuer and skills (done), or gives up after its last retry (failed).
+"""
+import asyncio
+import logging
+import math
+
+from django.conf import settings
+from django.db import transaction
+
+from . import jobs, llm, model_router
+from .jobs import register
+from .models import UserMedia
+
+logger = logging.getLogger(__name__)
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _needs_analysis(item):
+    return item['category'] == 'certificate' and bool((item.get('analysis_text') or '').strip())
+
+
+def analysis_calls(items):
+    """How many AI calls ``create_media(user, items)`` will queue."""
+    certificates = sum(1 for item in items if _needs_analysis(item))
+    return math.ceil(certificates / _setting('CERTIFICATE_BATCH_SIZE', 8))
+
+
+def create_media(user, items):
+    """
+    Create ``user``'s media from validated upload items and queue the analysis
+    of their certificates. Returns ``(media, jobs)``; raises ``jobs.QueueFull``
+    (and creates nothing) when the AI queue is full.
+    """
+    rows, texts = [], []
+    for item in items:
+        text = (item.get('analysis_text') or '').strip()
+        pending = _needs_analysis(item)
+        rows.append(UserMedia(
+            user=user, file_url=item['file_url'], category=item['category'],
+            is_public=item.get('is_public', True),
+            title=item.get('title') or ("Processing..." if pending else "New Note"),
+            analysis_status=UserMedia.ANALYSIS_PENDING if pending else UserMedia.ANALYSIS_NONE,
+        ))
+        texts.append(text if pending else None)
+
+    size = _setting('CERTIFICATE_BATCH_SIZE', 8)
+    with transaction.atomic():
+        media = UserMedia.objects.bulk_create(rows)
+        certificates = [{'id': row.id, 'text': text} for row, text in zip(media, texts) if text]
+        queued = [
+            jobs.enqueue('certificates', {'items': certificates[i:i + size]}, user=user)
+            for i in range(0, len(certificates), size)
+        ]
+    return media, queued
+
+
+def batch_prompt(texts):
+    listing = "\n".join(f"[{i}] {text}" for i, text in enumerate(texts))
+    return f"""Analyze each of these certificates (the text read from each one):
+        {listing}
+
+        Return exactly a JSON object with: certificates (list with one object per
+        certificate, each with 'index' (the number in brackets), 'title', 'issuer'
+        and 'skills' (list))
+        """
+
+
+async def _complete_json(prompt):
+    try:
+        # Extraction: the small model, unless the batch is long or its JSON is off
+        return await model_router.complete(
+            'certificates',
+            messages=[
+                {"role": "system", "content": "You are a helpful assistant that outputs only JSON."},
+                {"role": "user", "content": prompt}
+            ],
+            parse=model_router.json_object('certificates'),
+            response_format={"type": "json_object"}
+        )
+    finally:
+        # This loop only lives for one job; release its connections
+        await llm.close_async_client()
+
+
+@register('certificates')
+def analyze_certificates_job(job):
+    items = job.payload.get('items', [])
+    media = UserMedia.objects.in_bulk([item['id'] for item in items])
+    items = [item for item in items if item['id'] in media]  # deleted meanwhile
+    if not items:
+        return {'analyzed': 0, 'failed': 0}
+
+    try:
+        analysis = asyncio.run(_complete_json(batch_prompt([item['text'] for item in items])))
+        results = {
+            int(entry['index']): entry
+            for entry in analysis.get('certificates', [])
+            if isinstance(entry, dict) and str(entry.get('index', '')).isdigit()
+        }
+    except Exception:
+        if job.attempts >= job.max_attempts:
+            _mark_failed([media[item['id']] for item in items])
+        raise  # retried with backoff by the job runner
+
+    done, failed = [], []
+    for i, item in enumerate(items):
+        row, entry = media[item['id']], results.get(i)
+        if entry is None:
+            failed.append(row)
+            continue
+        row.title = entry.get('title') or "Verified Certificate"
+        row.issuer = entry.get('issuer') or "Verified Issuer"
+        row.skills = entry.get('skills') or []
+        row.analysis_status = UserMedia.ANALYSIS_DONE
+        done.append(row)
+    UserMedia.objects.bulk_update(done, ['title', 'issuer', 'skills', 'analysis_status'])
+    _mark_failed(failed)
+    if failed:
+        logger.warning("Certificate job %s: no analysis returned for media %s",
+                       job.id, [row.id for row in failed])
+    return {'analyzed': len(done), 'failed': len(failed)}
+
+
+def _mark_failed(rows):
+    for row in rows:
+        row.title = "Certificate (AI Error)"
+        row.analysis_status = UserMedia.ANALYSIS_FAILED
+    UserMedia.objects.bulk_update(rows, ['title', 'analysis_status'])
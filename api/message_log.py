@@ -0,0 +1,107 @@
+"""
+Server-side copy of each study session's chat, append-only.
+
+Clients send new messages to ``POST /api/sessions/<id>/messages/`` as they
+are sent in Firestore. Notes, incremental analysis and the transcript export
+read them from here, so nobody has to re-upload the whole conversation.
+
+Messages are stored in ``SessionMessageChunk`` rows of up to
+``MESSAGE_LOG_CHUNK_MESSAGES`` messages each, as zstd-compressed JSON. An
+append tops up the last chunk before starting new ones, so the log stays a
+few large, well-compressed rows rather than one row per append. Appends to a
+session are serialized on its row lock.
+
+A message's index is its position in the log. Clients can send the index
+they expect their first message to get (``start``): messages the log already
+has are skipped, which makes retries safe, and a gap raises ``Gap``.
+"""
+import json
+
+import zstandard
+from django.conf import settings
+from django.db import models, transaction
+
+from .models import SessionMessageChunk, StudySession
+
+ZSTD_LEVEL = 3
+
+
+class Gap(Exception):
+    """``start`` is past the end of the log; the client missed appending some messages."""
+
+    def __init__(self, count):
+        super().__init__(f'The log has {count} messages')
+        self.count = count
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def encode(messages):
+    raw = json.dumps(messages, ensure_ascii=False, separators=(',', ':')).encode()
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw), len(raw)
+
+
+def decode(data):
+    return json.loads(zstandard.ZstdDecompressor().decompress(bytes(data)))
+
+
+def _tail(session_id):
+    return SessionMessageChunk.objects.filter(session_id=session_id).order_by('-first_index').first()
+
+
+def count(session_id):
+    """Number of messages in the session's log."""
+    last = (SessionMessageChunk.objects.filter(session_id=session_id).order_by('-first_index')
+            .values_list('first_index', 'message_count').first())
+    return sum(last) if last else 0
+
+
+def append(session, messages, start=None):
+    """
+    Add ``messages`` to the end of ``session``'s log and return its new length.
+    With ``start``, messages before the current end are assumed stored already.
+    """
+    size = _setting('MESSAGE_LOG_CHUNK_MESSAGES', 200)
+    with transaction.atomic():
+        # One appender per session at a time
+        StudySession.objects.select_for_update().filter(pk=session.pk).values_list('pk').first()
+        tail = _tail(session.pk)
+        total = tail.first_index + tail.message_count if tail else 0
+        if start is not None:
+            if start > total:
+                raise Gap(total)
+            messages = messages[total - start:]
+        if not messages:
+            return total
+
+        if tail is not None and tail.message_count < size:
+            room = size - tail.message_count
+            tail.data, tail.raw_size = encode(decode(tail.data) + messages[:room])
+            tail.message_count += len(messages[:room])
+            tail.save(update_fields=['data', 'raw_size', 'message_count', 'updated_at'])
+            messages = messages[room:]
+
+        chunks = []
+        first = tail.first_index + tail.message_count if tail is not None else 0
+        for i in range(0, len(messages), size):
+            batch = messages[i:i + size]
+            data, raw_size = encode(batch)
+            chunks.append(SessionMessageChunk(session_id=session.pk, first_index=first + i,
+                                              message_count=len(batch), data=data, raw_size=raw_size))
+        SessionMessageChunk.objects.bulk_create(chunks)
+        return first + len(messages)
+
+
+def read(session_id, start=0, limit=None):
+    """Messages ``start`` .. ``start + limit`` (to the end without ``limit``) of the log."""
+    chunks = (SessionMessageChunk.objects.filter(session_id=session_id)
+              .alias(end=models.F('first_index') + models.F('message_count'))
+              .filter(end__gt=start).order_by('first_index'))
+    if limit is not None:
+        chunks = chunks.filter(first_index__lt=start + limit)
+    messages = []
+    for chunk in chunks.only('first_index', 'data'):
+        messages += decode(chunk.data)[max(0, start - chunk.first_index):]
+    return messages if limit is None else messages[:limit]
@@ -0,0 +1,281 @@
+"""
+Per-request timings and Prometheus metrics.
+
+``RequestMetricsMiddleware`` gives every request a ``Timings`` record (in a
+context variable, so it follows the request into ``sync_to_async`` threads).
+The rest of the code adds to it:
+
+- database queries, through an execute wrapper on every connection;
+- Groq calls, through ``llm_call()`` (api/llm.py), and per task and model
+  tier through ``Registry.record_llm`` (api/model_router.py);
+- serialization, through ``TimedRepresentationMixin`` on the serializers.
+
+The totals go out as a ``Server-Timing`` header and into per-route
+histograms, exposed in the Prometheus text format at ``/api/metrics/``.
+Metrics are kept per process; scrape every worker, or run one per host.
+Recording a request costs a few ``perf_counter()`` calls and a lock.
+"""
+import contextvars
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from rest_framework.authentication import BasicAuthentication
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = contextvars.ContextVar('request_timings', default=None)
+
+
+class Timings:
+    __slots__ = ('db_count', 'db_seconds', 'llm_count', 'llm_seconds', 'serialize_seconds', 'serialize_depth')
+
+    def __init__(self):
+        self.db_count = self.llm_count = self.serialize_depth = 0
+        self.db_seconds = self.llm_seconds = self.serialize_seconds = 0.0
+
+
+def current():
+    """The running request's Timings, or None outside a request."""
+    return _current.get()
+
+
+# Database
+
+def _time_query(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.db_seconds += time.perf_counter() - started
+        timings.db_count += 1
+
+
+def install_query_timer(sender=None, connection=None, **kwargs):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+connection_created.connect(install_query_timer, dispatch_uid='api.metrics.query_timer')
+
+
+# LLM
+
+@contextmanager
+def llm_call():
+    """Wrap an upstream Groq request (sync or awaited inside)."""
+    timings = _current.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings.llm_seconds += time.perf_counter() - started
+            timings.llm_count += 1
+
+
+# Serialization
+
+class TimedRepresentationMixin:
+    """Times ``to_representation`` of the outermost serializer only (nested ones are part of it)."""
+
+    def to_representation(self, instance):
+        timings = _current.get()
+        if timings is None or timings.serialize_depth:
+            return super().to_representation(instance)
+        timings.serialize_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            timings.serialize_seconds += time.perf_counter() - started
+            timings.serialize_depth -= 1
+
+
+# Aggregation
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=BUCKETS):
+        self.name, self.help_text, self.buckets = name, help_text, buckets
+        self.series = {}  # labels -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def exposition(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for labels, series in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_labels(labels, le=bound)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(labels)} {series[-1]:.6f}')
+            lines.append(f'{self.name}_count{_labels(labels)} {cumulative}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name, self.help_text = name, help_text
+        self.series = {}
+
+    def inc(self, labels, amount=1):
+        self.series[labels] = self.series.get(labels, 0) + amount
+
+    def exposition(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        lines += [f'{self.name}{_labels(labels)} {value}' for labels, value in sorted(self.series.items())]
+        return lines
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + [(key, value) for key, value in extra.items()]
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for _, value in pairs)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + '}'
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = Counter('http_requests_total', 'Requests by route, method and status.')
+        self.duration = Histogram('http_request_duration_seconds', 'Time to the response headers.')
+        self.db = Histogram('http_request_db_seconds', 'Database time per request.')
+        self.db_queries = Counter('http_request_db_queries_total', 'Database queries.')
+        self.llm = Histogram('http_request_llm_seconds', 'Time waiting on Groq per request.')
+        self.llm_calls = Counter('http_request_llm_calls_total', 'Groq calls.')
+        self.serialize = Histogram('http_request_serialize_seconds', 'Serializer time per request.')
+        self.llm_requests = Counter('llm_requests_total', 'Groq calls by task, model tier and outcome.')
+        self.llm_duration = Histogram('llm_request_duration_seconds', 'Groq call latency by task and model tier.')
+        self.llm_tokens = Counter('llm_tokens_total', 'Groq tokens by task, model tier and kind.')
+        self.admissions = Counter('ai_admission_total', 'AI requests admitted at once, after queueing, or rejected.')
+        self.admission_wait = Histogram('ai_admission_wait_seconds', 'Time AI requests queued for admission.')
+
+    def record(self, route, method, status, seconds, timings):
+        labels = (('route', route), ('method', method))
+        with self._lock:
+            self.requests.inc(labels + (('status', str(status)),))
+            self.duration.observe(labels, seconds)
+            self.db.observe(labels, timings.db_seconds)
+            self.db_queries.inc(labels, timings.db_count)
+            self.llm.observe(labels, timings.llm_seconds)
+            self.llm_calls.inc(labels, timings.llm_count)
+            self.serialize.observe(labels, timings.serialize_seconds)
+
+    def record_llm(self, task, tier, outcome, seconds, prompt_tokens=0, completion_tokens=0):
+        """One upstream call, routed by api/model_router.py."""
+        labels = (('task', task), ('tier', tier))
+        with self._lock:
+            self.llm_requests.inc(labels + (('outcome', outcome),))
+            self.llm_duration.observe(labels, seconds)
+            self.llm_tokens.inc(labels + (('kind', 'prompt'),), prompt_tokens)
+            self.llm_tokens.inc(labels + (('kind', 'completion'),), completion_tokens)
+
+    def record_admission(self, outcome, wait):
+        """One AI request through api/admission.py."""
+        with self._lock:
+            self.admissions.inc((('outcome', outcome),))
+            if outcome != 'rejected':
+                self.admission_wait.observe((), wait)
+
+    def exposition(self):
+        with self._lock:
+            metrics = [self.requests, self.duration, self.db, self.db_queries,
+                       self.llm, self.llm_calls, self.serialize,
+                       self.llm_requests, self.llm_duration, self.llm_tokens,
+                       self.admissions, self.admission_wait]
+            return '\n'.join(line for metric in metrics for line in metric.exposition()) + '\n'
+
+
+registry = Registry()
+
+
+# Middleware
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    return (match.url_name or match.route) if match else 'unmatched'
+
+
+class RequestMetricsMiddleware:
+    """Put first in MIDDLEWARE so the timings cover the whole stack. Works under WSGI and ASGI."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.header = getattr(settings, 'METRICS_SERVER_TIMING', True)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings, started = Timings(), time.perf_counter()
+        token = _current.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timings, started)
+
+    async def __acall__(self, request):
+        timings, started = Timings(), time.perf_counter()
+        token = _current.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timings, started)
+
+    def finish(self, request, response, timings, started):
+        seconds = time.perf_counter() - started
+        registry.record(_route(request), request.method, response.status_code, seconds, timings)
+        if self.header:
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={timings.db_seconds * 1000:.1f};desc="{timings.db_count} queries"',
+                f'llm;dur={timings.llm_seconds * 1000:.1f};desc="{timings.llm_count} calls"',
+                f'ser;dur={timings.serialize_seconds * 1000:.1f}',
+                f'total;dur={seconds * 1000:.1f}',
+            ])
+        return response
+
+
+def _is_staff(request):
+    # Basic auth opted in, for scrapers configured with a staff user's credentials
+    authenticators = [auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES] + [BasicAuthentication()]
+    drf_request = Request(request, authenticators=authenticators)
+    try:
+        return drf_request.user.is_staff
+    except APIException:
+        return False
+
+
+def metrics_view(request):
+    """Prometheus text exposition (GET /api/metrics/) for ``Bearer <METRICS_TOKEN>`` scrapers and staff (JWT, session or Basic)."""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    scraper = bool(token) and hmac.compare_digest(
+        request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode())
+    if not scraper and not _is_staff(request):
+        return HttpResponse('Forbidden\n', status=403, content_type='text/plain')
+    return HttpResponse(registry.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
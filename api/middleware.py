@@ -0,0 +1,75 @@
+from urllib.parse import parse_qs
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .authentication import CachedJWTAuthentication
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise that can run in async mode.
+
+    Stock WhiteNoiseMiddleware is sync-only, and one sync-only middleware makes
+    Django run the whole chain (async views included) through the single
+    thread-sensitive executor under ASGI, serialising every request. Static
+    lookups are an in-memory dict hit, so doing them on the event loop is fine.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Authenticate WebSocket connections with the API's JWT access tokens.
+
+    Browsers can't set headers on a WebSocket handshake, so the token comes in
+    the query string (``?token=<access>``); an ``Authorization: Bearer``
+    header works too. Without a token ``scope['user']`` is left as set by the
+    session-based AuthMiddleware around this one.
+    """
+
+    async def __call__(self, scope, receive, send):
+        token = self.get_token(scope)
+        if token:
+            scope = dict(scope, user=await self.get_user(token))
+        return await super().__call__(scope, receive, send)
+
+    def get_token(self, scope):
+        token = parse_qs(scope.get('query_string', b'').decode()).get('token')
+        if token:
+            return token[0]
+        header = dict(scope.get('headers', [])).get(b'authorization', b'').decode()
+        scheme, _, value = header.partition(' ')
+        return value if scheme.lower() == 'bearer' else None
+
+    @database_sync_to_async
+    def get_user(self, raw_token):
+        auth = CachedJWTAuthentication()
+        try:
+            return auth.get_user(auth.get_validated_token(raw_token))
+        except (InvalidToken, AuthenticationFailed):
+            return AnonymousUser()
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-16 09:00
+
+from django.db import migrations
+
+from api.search import create_search_schema, drop_search_schema
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_alter_usermedia_category_alter_usermedia_file_url_and_more'),
+    ]
+
+    operations = [
+        # Postgres: generated tsvector column + GIN index
+        # SQLite: FTS5 external-content table + sync triggers
+        migrations.RunPython(create_search_schema, drop_search_schema),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0.1 on 2026-10-16 10:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_studypost_fulltext_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='conversationnote',
+            index=models.Index(fields=['-created_at', '-id'], name='note_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studypost',
+            index=models.Index(fields=['-created_at', '-id'], name='studypost_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studysession',
+            index=models.Index(fields=['-started_at', '-id'], name='session_started_id_idx'),
+        ),
+    ]
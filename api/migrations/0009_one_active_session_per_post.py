@@ -0,0 +1,34 @@
+# Generated by Django 6.0.1 on 2026-10-16 13:05
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def end_duplicate_active_sessions(apps, schema_editor):
+    """Racing joins could leave several active sessions per post; keep the newest."""
+    StudySession = apps.get_model('api', 'StudySession')
+    seen = set()
+    duplicates = []
+    active = StudySession.objects.filter(is_active=True).order_by('post_id', '-started_at', '-id')
+    for session_id, post_id in active.values_list('id', 'post_id'):
+        if post_id in seen:
+            duplicates.append(session_id)
+        seen.add(post_id)
+    StudySession.objects.filter(id__in=duplicates).update(is_active=False, ended_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_aijob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(end_duplicate_active_sessions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='studysession',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('post',), name='session_one_active_per_post'),
+        ),
+    ]
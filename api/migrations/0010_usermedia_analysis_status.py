@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-16 13:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_one_active_session_per_post'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usermedia',
+            name='analysis_status',
+            field=models.CharField(choices=[('none', 'Not analyzed'), ('pending', 'Pending'), ('done', 'Done'), ('failed', 'Failed')], default='none', max_length=10),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 6.0.1 on 2026-10-16 14:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_usermedia_analysis_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # New indexes first, so no lookup is left unindexed in between
+    operations = [
+        migrations.AddIndex(
+            model_name='conversationnote',
+            index=models.Index(fields=['session', 'created_at', 'id'], name='note_session_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studypost',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created_at', '-id'], name='studypost_active_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usermedia',
+            index=models.Index(fields=['user', 'is_public', '-created_at'], name='media_user_public_created_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='studypost',
+            name='studypost_created_id_idx',
+        ),
+        migrations.AlterField(
+            model_name='conversationnote',
+            name='session',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='ai_notes', to='api.studysession'),
+        ),
+        migrations.AlterField(
+            model_name='usermedia',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='portfolio_media', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
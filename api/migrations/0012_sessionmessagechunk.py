@@ -0,0 +1,31 @@
+# Generated by Django 6.0.1 on 2026-10-16 16:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionMessageChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_index', models.PositiveIntegerField()),
+                ('message_count', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('raw_size', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('session', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='message_chunks', to='api.studysession')),
+            ],
+            options={
+                'ordering': ['session', 'first_index'],
+                'constraints': [models.UniqueConstraint(fields=('session', 'first_index'), name='message_chunk_session_index_uniq')],
+            },
+        ),
+    ]
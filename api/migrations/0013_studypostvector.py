@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-17 09:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_sessionmessagechunk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudyPostVector',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='text_vector', serialize=False, to='api.studypost')),
+                ('vector', models.BinaryField()),
+                ('is_active', models.BooleanField(default=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+        ),
+    ]
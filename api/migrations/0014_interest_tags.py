@@ -0,0 +1,47 @@
+# Generated by Django 6.0.1 on 2026-10-17 11:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_studypostvector'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InterestTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StudyPostTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('post', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='tag_links', to='api.studypost')),
+                ('tag', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='post_links', to='api.interesttag')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tag', 'post'], name='studyposttag_tag_post_idx')],
+                'constraints': [models.UniqueConstraint(fields=('post', 'tag'), name='studyposttag_post_tag_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='UserInterest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='user_links', to='api.interesttag')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='interest_links', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['tag', 'user'], name='userinterest_tag_user_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'tag'), name='userinterest_user_tag_uniq')],
+            },
+        ),
+    ]
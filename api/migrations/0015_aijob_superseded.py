@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-17 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_interest_tags'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='aijob',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed'), ('superseded', 'Superseded')], default='queued', max_length=10),
+        ),
+    ]
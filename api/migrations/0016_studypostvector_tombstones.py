@@ -0,0 +1,19 @@
+# Generated by Django 6.0.1 on 2026-10-17 14:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_aijob_superseded'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='studypostvector',
+            name='post',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='text_vector', serialize=False, to='api.studypost'),
+        ),
+    ]
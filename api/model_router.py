@@ -0,0 +1,148 @@
+"""
+Which Groq model answers which AI request.
+
+Each task has a default tier and an input size (characters of user content)
+up to which that tier is trusted. Small, well-defined jobs - pulling title,
+issuer and skills out of certificate text, solving a one-line question,
+merging summaries - go to the small, fast model; long inputs and open-ended
+generation (study guides) go to the large one. When a small model's answer
+fails validation (bad JSON, missing keys) the request is retried once on the
+large model.
+
+Every upstream call is recorded per task and tier (outcome, latency, prompt
+and completion tokens) in the metrics registry, so the savings show up at
+``/api/metrics/`` as ``llm_requests_total``, ``llm_request_duration_seconds``
+and ``llm_tokens_total``. Set ``LLM_ROUTING=false`` to send everything to
+the large model (e.g. to compare).
+"""
+import json
+import time
+
+from django.conf import settings
+
+from . import llm, metrics
+
+# Tiers; settings.LLM_MODELS names the model behind each
+SMALL, LARGE = 'small', 'large'
+
+# task -> (tier, longest input in characters that tier gets; past it, LARGE)
+ROUTES = {
+    'certificates': (SMALL, 8000),
+    'solve': (SMALL, 600),
+    'notes': (SMALL, 3000),
+    'notes_merge': (SMALL, 8000),
+    'exam_prep': (LARGE, 0),
+}
+
+
+class InvalidOutput(ValueError):
+    pass
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def model_for(tier):
+    return settings.LLM_MODELS[tier]
+
+
+def input_size(messages):
+    return sum(len(str(m['content'])) for m in messages if m['role'] == 'user')
+
+
+def choose(task, messages):
+    """The tier for ``task`` given its ``messages``."""
+    if not _setting('LLM_ROUTING', True):
+        return LARGE
+    tier, max_chars = {**ROUTES, **_setting('LLM_ROUTES', {})}.get(task, (LARGE, 0))
+    if tier != LARGE and input_size(messages) > max_chars:
+        return LARGE
+    return tier
+
+
+def json_object(*required):
+    """A ``parse`` for JSON object answers that must have the ``required`` keys."""
+    def parse(content):
+        try:
+            value = json.loads(content)
+        except (TypeError, ValueError) as e:
+            raise InvalidOutput(f'not JSON: {e}') from e
+        if not isinstance(value, dict):
+            raise InvalidOutput('not a JSON object')
+        missing = [key for key in required if key not in value]
+        if missing:
+            raise InvalidOutput(f'missing {", ".join(missing)}')
+        return value
+    return parse
+
+
+def _usage(usage):
+    if usage is None:
+        return 0, 0
+    return getattr(usage, 'prompt_tokens', 0) or 0, getattr(usage, 'completion_tokens', 0) or 0
+
+
+def record(task, tier, outcome, seconds, usage=None):
+    metrics.registry.record_llm(task, tier, outcome, seconds, *_usage(usage))
+
+
+async def complete(task, messages, parse=None, **params):
+    """
+    Uncached completion of ``task``, routed and validated. Returns the content
+    run through ``parse``; a small model's unparseable answer is retried on the
+    large model, the large model's raises ``InvalidOutput``.
+    """
+    tier = choose(task, messages)
+    while True:
+        started = time.perf_counter()
+        try:
+            with metrics.llm_call():
+                completion = await llm.get_async_client().chat.completions.create(
+                    model=model_for(tier), messages=messages, **params)
+        except Exception:
+            record(task, tier, 'error', time.perf_counter() - started)
+            raise
+        seconds, usage = time.perf_counter() - started, getattr(completion, 'usage', None)
+        content = completion.choices[0].message.content
+        try:
+            value = parse(content) if parse else content
+        except (InvalidOutput, ValueError, TypeError, KeyError):
+            record(task, tier, 'invalid', seconds, usage)
+            if tier == LARGE:
+                raise
+            tier = LARGE
+            continue
+        record(task, tier, 'ok', seconds, usage)
+        return value
+
+
+def _cache_key(task, messages, **params):
+    return llm.cache_key(model_for(choose(task, messages)), messages, **params)
+
+
+async def cached_complete(task, messages, parse=None, admit=None, **params):
+    """
+    ``complete`` through ``llm.response_cache`` (keyed by the model first chosen).
+    ``admit()`` (a coroutine function, e.g. admission control) is awaited only
+    when the answer isn't cached and an upstream call is about to be made.
+    """
+    async def call():
+        if admit is not None:
+            await admit()
+        return await complete(task, messages, parse, **params)
+    return await llm.response_cache.aget_or_call(_cache_key(task, messages, **params), call)
+
+
+async def is_cached(task, messages, **params):
+    """Whether ``cached_complete`` / ``stream`` would answer from the cache right now."""
+    return await llm.response_cache.cache.aget(_cache_key(task, messages, **params)) is not None
+
+
+def stream(task, messages, **params):
+    """``llm.stream_completion`` on the routed model. Shares the cache with ``cached_complete``."""
+    tier = choose(task, messages)
+
+    def streamed(seconds, usage):
+        record(task, tier, 'ok', seconds, usage)
+    return llm.stream_completion(model_for(tier), messages, on_complete=streamed, **params)
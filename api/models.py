@@ -1,4 +1,6 @@
-from django.db import models
+import uuid
+
+from django.db import IntegrityError, connection, models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 
@@ -13,11 +15,29 @@ class StudyPost(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # The feed only ever lists active posts; keyset pagination seeks
+            # on (created_at, id). Partial, so ended posts don't bloat it.
+            models.Index(fields=['-created_at', '-id'], name='studypost_active_feed_idx',
+                         condition=models.Q(is_active=True)),
+        ]
 
     def __str__(self):
         return f"{self.title} by {self.user.username}"
 
+class StudyPostVector(models.Model):
+    """A post's text vector for similar-post search (api/similarity.py), saved with the post."""
+    # Not cascaded: a deleted post's row stays behind, inactive, so other
+    # processes' index syncs see the delete (similarity.purge_tombstones).
+    post = models.OneToOneField(StudyPost, on_delete=models.DO_NOTHING, db_constraint=False, primary_key=True,
+                                related_name='text_vector')
+    vector = models.BinaryField()  # float32 x SIMILAR_POSTS_DIMENSIONS
+    is_active = models.BooleanField(default=True)  # the post's, so index syncs see deactivations
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
 class StudySession(models.Model):
+    MAX_PARTICIPANTS = 5
+
     post = models.ForeignKey(StudyPost, on_delete=models.CASCADE, related_name='sessions')
     creator = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_sessions')
     participants = models.ManyToManyField(User, related_name='joined_sessions', blank=True)
@@ -30,6 +50,17 @@ class StudySession(models.Model):
 
     class Meta:
         ordering = ['-started_at']
+        indexes = [
+            models.Index(fields=['-started_at', '-id'], name='session_started_id_idx'),
+        ]
+        constraints = [
+            # A post has at most one live session, even under concurrent joins.
+            # Its index also serves every (post, is_active=True) lookup.
+            models.UniqueConstraint(
+                fields=['post'], condition=models.Q(is_active=True),
+                name='session_one_active_per_post',
+            ),
+        ]
 
     def __str__(self):
         return f"Session {self.id} - {self.post.title}" # Fixed reference
@@ -39,8 +70,62 @@ class StudySession(models.Model):
         self.ended_at = timezone.now()
         self.save()
 
+    @classmethod
+    def ids_for_member(cls, user):
+        """
+        Ids of the sessions ``user`` created or takes part in, as a UNION
+        subquery. Each half is one index lookup, and unlike a JOIN through
+        participants it can't repeat a session, so there's nothing to DISTINCT.
+        """
+        created = cls.objects.filter(creator=user).order_by().values('pk')
+        joined = cls.participants.through.objects.filter(user=user).order_by().values('studysession_id')
+        return created.union(joined)
+
+    @classmethod
+    def lock_active_for_post(cls, post):
+        """
+        Return the post's active session, creating it if needed, with its row
+        locked until the surrounding transaction ends (call inside atomic()).
+        """
+        session = cls.objects.select_for_update().filter(post=post, is_active=True).first()
+        if session:
+            return session
+        try:
+            with transaction.atomic():
+                session = cls.objects.create(
+                    post=post, creator=post.user, is_active=True,
+                    firestore_chat_id=f"session_{uuid.uuid4().hex}", ai_notes_enabled=True
+                )
+                session.add_participant(post.user)
+                return session
+        except IntegrityError:
+            # Another request created it first; use theirs
+            return cls.objects.select_for_update().get(post=post, is_active=True)
+
+    def add_participant(self, user):
+        """
+        Add ``user`` unless they're already in or the session is full, as one
+        conditional INSERT. Returns True if a row was inserted.
+        """
+        through = StudySession.participants.through
+        table = through._meta.db_table
+        session_col = through._meta.get_field('studysession').column
+        user_col = through._meta.get_field('user').column
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} ({session_col}, {user_col})
+                SELECT %s, %s
+                WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE {session_col} = %s AND {user_col} = %s)
+                  AND (SELECT COUNT(*) FROM {table} WHERE {session_col} = %s) < %s
+                """,
+                [self.id, user.id, self.id, user.id, self.id, self.MAX_PARTICIPANTS],
+            )
+            return cursor.rowcount == 1
+
 class ConversationNote(models.Model):
-    session = models.ForeignKey(StudySession, on_delete=models.CASCADE, related_name='ai_notes')
+    # Indexed by note_session_created_idx (session first) instead of on its own
+    session = models.ForeignKey(StudySession, on_delete=models.CASCADE, related_name='ai_notes', db_index=False)
     content = models.TextField()
     key_concepts = models.JSONField(default=list)
     definitions = models.JSONField(default=list)
@@ -52,6 +137,31 @@ class ConversationNote(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='note_created_id_idx'),
+            # A session's notes, oldest or latest first
+            models.Index(fields=['session', 'created_at', 'id'], name='note_session_created_idx'),
+        ]
+
+class SessionMessageChunk(models.Model):
+    """
+    A batch of a session's chat messages (``first_index`` onwards), kept as
+    zstd-compressed JSON. Written and read through api/message_log.py.
+    """
+    # Indexed by the (session, first_index) constraint
+    session = models.ForeignKey(StudySession, on_delete=models.CASCADE, related_name='message_chunks', db_index=False)
+    first_index = models.PositiveIntegerField()
+    message_count = models.PositiveIntegerField()
+    data = models.BinaryField()
+    raw_size = models.PositiveIntegerField()  # uncompressed bytes
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['session', 'first_index']
+        constraints = [
+            models.UniqueConstraint(fields=['session', 'first_index'], name='message_chunk_session_index_uniq'),
+        ]
 
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
@@ -63,8 +173,43 @@ class UserProfile(models.Model):
     def __str__(self):
         return f"Profile of {self.user.username}"
 
+class InterestTag(models.Model):
+    """A normalized study interest (api/interests.py), shared by profiles and posts."""
+    name = models.CharField(max_length=100, unique=True)
+
+    def __str__(self):
+        return self.name
+
+class UserInterest(models.Model):
+    """Inverted index of ``UserProfile.study_interests``: one row per (user, tag)."""
+    # Indexed by the (user, tag) constraint
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='interest_links', db_index=False)
+    tag = models.ForeignKey(InterestTag, on_delete=models.CASCADE, related_name='user_links', db_index=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'tag'], name='userinterest_user_tag_uniq'),
+        ]
+        indexes = [
+            # Who else has this tag
+            models.Index(fields=['tag', 'user'], name='userinterest_tag_user_idx'),
+        ]
+
+class StudyPostTag(models.Model):
+    """A post's subject and topic as interest tags, for matching posts to interests."""
+    post = models.ForeignKey(StudyPost, on_delete=models.CASCADE, related_name='tag_links', db_index=False)
+    tag = models.ForeignKey(InterestTag, on_delete=models.CASCADE, related_name='post_links', db_index=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'tag'], name='studyposttag_post_tag_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['tag', 'post'], name='studyposttag_tag_post_idx'),
+        ]
+
 class UserMedia(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='portfolio_media') # <--- MUST MATCH SERIALIZER
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='portfolio_media', db_index=False) # <--- MUST MATCH SERIALIZER; indexed by media_user_public_created_idx
     file_url = models.URLField()
     category = models.CharField(max_length=20) # 'note' or 'certificate'
     title = models.CharField(max_length=255, blank=True, null=True)
@@ -72,5 +217,60 @@ class UserMedia(models.Model):
     skills = models.JSONField(default=list, blank=True, null=True)
     is_public = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    # Certificate analysis runs in the background (api/media.py)
+    ANALYSIS_NONE = 'none'
+    ANALYSIS_PENDING = 'pending'
+    ANALYSIS_DONE = 'done'
+    ANALYSIS_FAILED = 'failed'
+    ANALYSIS_CHOICES = [(ANALYSIS_NONE, 'Not analyzed'), (ANALYSIS_PENDING, 'Pending'),
+                        (ANALYSIS_DONE, 'Done'), (ANALYSIS_FAILED, 'Failed')]
+    analysis_status = models.CharField(max_length=10, choices=ANALYSIS_CHOICES, default=ANALYSIS_NONE)
+
     class Meta:
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+        indexes = [
+            # Portfolios: a user's media (or only the public part), newest first
+            models.Index(fields=['user', 'is_public', '-created_at'], name='media_user_public_created_idx'),
+        ]
+
+class AIJob(models.Model):
+    """A unit of background AI work (see api/jobs.py), persisted so restarts don't lose it."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    SUPERSEDED = 'superseded'  # a newer job for the same session does the work
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed'),
+                      (SUPERSEDED, 'Superseded')]
+
+    kind = models.CharField(max_length=30)
+    session = models.ForeignKey(StudySession, on_delete=models.CASCADE, related_name='ai_jobs', null=True, blank=True)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='ai_jobs', null=True, blank=True)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    result = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            # Workers poll for the next runnable job
+            models.Index(fields=['status', 'run_after'], name='aijob_status_run_after_idx'),
+        ]
+        constraints = [
+            # At most one queued job of each kind per session (de-duplication)
+            models.UniqueConstraint(
+                fields=['kind', 'session'], condition=models.Q(status='queued'),
+                name='aijob_one_queued_per_session',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} job {self.id} ({self.status})"
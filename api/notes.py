@@ -0,0 +1,183 @@
+"""
+AI study notes for a session, generated incrementally.
+
+Each note records how many messages it has covered (``message_count_analyzed``).
+The next run only sends messages past that point, plus the previous note's
+summary as a rolling context, so per-call prompt size stays roughly constant
+however long the session gets. A large backlog of new messages is split into
+chunks that are analyzed in parallel and merged into one note.
+"""
+import asyncio
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import llm, message_log, model_router
+from .consumers import broadcast_session_event
+from .jobs import register
+from .models import StudySession, ConversationNote
+from .serializers import ConversationNoteSerializer
+
+SYSTEM_PROMPT = "You are a helpful assistant that outputs only valid JSON."
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def format_message(msg):
+    return f"{msg.get('userName', 'User')}: {msg.get('text', '')}"
+
+
+def split_transcript(messages, max_chars):
+    """Group messages into transcript chunks of at most ~``max_chars`` characters."""
+    chunks, lines, size = [], [], 0
+    for msg in messages:
+        line = format_message(msg)
+        # A single oversized message is cut into pieces of its own
+        pieces = [line[i:i + max_chars] for i in range(0, len(line), max_chars)] or ['']
+        for piece in pieces:
+            if lines and size + len(piece) > max_chars:
+                chunks.append("\n".join(lines))
+                lines, size = [], 0
+            lines.append(piece)
+            size += len(piece) + 1
+    if lines:
+        chunks.append("\n".join(lines))
+    return chunks
+
+
+async def _complete_json(task, prompt, max_tokens):
+    # Short increments go to the small model, full chunks to the large one
+    return await model_router.complete(
+        task,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        parse=model_router.json_object('summary'),
+        response_format={"type": "json_object"},
+        temperature=0.5,
+        max_tokens=max_tokens,
+    )
+
+
+async def analyze_chunk(transcript, previous_summary=''):
+    context = f"""
+        Summary of the conversation so far:
+        {previous_summary}
+        """ if previous_summary else ""
+
+    prompt = f"""Analyze this study conversation and extract key learning points.
+        {context}
+        New messages:
+        {transcript}
+
+        Return exactly a JSON object with:
+        1. key_concepts (list)
+        2. definitions (list of {{'term': '...', 'definition': '...'}})
+        3. study_tips (list)
+        4. resources (list)
+        5. summary (string, at most 200 words, covering the whole conversation so far)
+        """
+    return await _complete_json('notes', prompt, max_tokens=2048)
+
+
+async def merge_summaries(summaries):
+    parts = "\n\n".join(f"Part {i + 1}:\n{summary}" for i, summary in enumerate(summaries))
+    prompt = f"""These are summaries of consecutive parts of one study conversation.
+        Combine them into a single summary of at most 200 words.
+
+        {parts}
+
+        Return exactly a JSON object with: summary (string)
+        """
+    return (await _complete_json('notes_merge', prompt, max_tokens=512))['summary']
+
+
+async def _analyze_chunks(chunks, previous_summary):
+    """Analyze chunks concurrently (bounded) and return (analyses, summary)."""
+    limit = asyncio.Semaphore(_setting('NOTES_PARALLEL_CHUNKS', 4))
+
+    async def analyze(chunk):
+        async with limit:
+            return await analyze_chunk(chunk, previous_summary)
+
+    try:
+        analyses = await asyncio.gather(*(analyze(chunk) for chunk in chunks))
+        if len(analyses) == 1:
+            return analyses, analyses[0].get('summary', 'No summary provided')
+        return analyses, await merge_summaries([a.get('summary', '') for a in analyses])
+    finally:
+        # This loop only lives for one job; release its connections
+        await llm.close_async_client()
+
+
+def _merge_lists(*lists):
+    """Concatenate, dropping repeats (case-insensitive; definitions by term)."""
+    merged, seen = [], set()
+    for items in lists:
+        for item in items or []:
+            if isinstance(item, dict):
+                key = str(item.get('term', item)).casefold()
+            else:
+                key = str(item).casefold()
+            if key not in seen:
+                seen.add(key)
+                merged.append(item)
+    return merged
+
+
+def analyze_conversation(session_id, messages=None):
+    """
+    Create a note covering the session's message log (api/message_log.py),
+    analysing only what its latest note hasn't seen. ``messages``, a full
+    transcript from an older client, is synced into the log first. Returns
+    the latest note.
+    """
+    session = StudySession.objects.get(id=session_id)
+    if messages:
+        message_log.append(session, messages, start=0)
+    total = message_log.count(session.id)
+    last = session.ai_notes.order_by('-created_at', '-id').first()
+
+    start = 0
+    if last and last.message_count_analyzed <= total:
+        start = last.message_count_analyzed
+    new_messages = message_log.read(session.id, start)
+    if not new_messages:
+        return last
+    previous = last if start else None
+    previous_summary = previous.content if previous else ''
+
+    chunks = split_transcript(new_messages, _setting('NOTES_CHUNK_CHARS', 12000))
+    # Runs in a worker thread, so it gets its own short-lived event loop
+    analyses, summary = asyncio.run(_analyze_chunks(chunks, previous_summary))
+
+    def carried(field, note_field):
+        return _merge_lists(getattr(previous, note_field) if previous else [],
+                            *(a.get(field, []) for a in analyses))
+
+    note = ConversationNote.objects.create(
+        session=session,
+        content=summary,
+        key_concepts=carried('key_concepts', 'key_concepts'),
+        definitions=carried('definitions', 'definitions'),
+        study_tips=carried('study_tips', 'study_tips'),
+        resources_mentioned=carried('resources', 'resources_mentioned'),
+        message_count_analyzed=start + len(new_messages)
+    )
+
+    session.last_ai_analysis = timezone.now()
+    session.save(update_fields=['last_ai_analysis'])
+    return note
+
+
+@register('notes')
+def generate_notes_job(job):
+    note = analyze_conversation(job.session_id, job.payload.get('messages'))
+    if note:
+        # Subscribers get the note itself instead of polling /notes/
+        broadcast_session_event(job.session_id, 'note_ready', job=job.id,
+                                note=dict(ConversationNoteSerializer(note).data))
+    return {'note_id': note.id if note else None}
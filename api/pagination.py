@@ -0,0 +1,99 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(PageNumberPagination):
+    """
+    Page numbers by default (unchanged API), keyset pagination on request.
+
+    Clients opt in with ``?pagination=cursor`` and then follow ``next``, which
+    carries an opaque ``?cursor=`` encoding the last row's ``(timestamp, id)``.
+    Each page is a seek on the ``(timestamp DESC, id DESC)`` index: no
+    ``COUNT(*)`` and no ``OFFSET``, so page 500 costs the same as page 1.
+    """
+    timestamp_field = 'created_at'
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def use_keyset(self, request, queryset):
+        if self.cursor_query_param not in request.query_params and \
+                request.query_params.get(self.mode_query_param) != 'cursor':
+            return False
+        # Only when the view's ordering is the one the cursor encodes
+        # (e.g. ranked full-text search keeps page numbers).
+        field = self.timestamp_field
+        return tuple(queryset.query.order_by) in ((f'-{field}',), (f'-{field}', '-id'))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.use_keyset(request, queryset)
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        field = self.timestamp_field
+        queryset = queryset.order_by(f'-{field}', '-id')
+
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded:
+            timestamp, pk = self.decode_cursor(encoded)
+            # "<=" on the timestamp alone bounds the index range; the OR only
+            # breaks ties between rows sharing that timestamp.
+            queryset = queryset.filter(**{f'{field}__lte': timestamp}).filter(
+                Q(**{f'{field}__lt': timestamp}) | Q(id__lt=pk)
+            )
+
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.page = rows[:page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        url = remove_query_param(self.request.build_absolute_uri(), self.mode_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(last))
+
+    def encode_cursor(self, obj):
+        position = [getattr(obj, self.timestamp_field).isoformat(), obj.pk]
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip('=')
+
+    def decode_cursor(self, encoded):
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            timestamp, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            timestamp = parse_datetime(timestamp)
+            pk = int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if timestamp is None:
+            raise NotFound(self.invalid_cursor_message)
+        return timestamp, pk
+
+
+class CreatedAtKeysetPagination(KeysetPagination):
+    timestamp_field = 'created_at'
+
+
+class StartedAtKeysetPagination(KeysetPagination):
+    timestamp_field = 'started_at'
@@ -0,0 +1,111 @@
+"""
+Faster renderers and parsers for DRF.
+
+``ORJSONRenderer`` / ``ORJSONParser`` replace DRF's JSON classes. They
+produce the same JSON (compact, UTF-8, U+2028/2029 escaped) through orjson,
+which matters on the big nested responses (sessions with their post, creator
+and participants; notes with their lists).
+
+Clients that send ``Accept: application/msgpack`` (or ``?format=msgpack``)
+get MessagePack instead, and can send it as the request body too. JSON stays
+the default for everyone else.
+
+``python manage.py bench_renderers`` compares them on representative responses.
+"""
+import datetime
+import decimal
+import uuid
+
+import msgpack
+import orjson
+from django.utils.cache import patch_vary_headers
+from django.utils.encoding import force_str
+from django.utils.functional import Promise
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+def encode_default(obj):
+    """What DRF's JSONEncoder handles beyond plain JSON types (datetimes etc. for msgpack)."""
+    if isinstance(obj, Promise):
+        return force_str(obj)
+    if isinstance(obj, datetime.datetime):
+        representation = obj.isoformat()
+        return representation[:-6] + 'Z' if representation.endswith('+00:00') else representation
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, datetime.timedelta):
+        return str(obj.total_seconds())
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, bytes):
+        return obj.decode()
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()  # numpy arrays / scalars
+    if hasattr(obj, '__getitem__'):
+        try:
+            return dict(obj)
+        except (TypeError, ValueError):
+            pass
+    if hasattr(obj, '__iter__'):
+        return list(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not serializable')
+
+
+def _vary_on_accept(renderer_context):
+    response = (renderer_context or {}).get('response')
+    if response is not None:
+        patch_vary_headers(response, ['Accept'])
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        _vary_on_accept(renderer_context)
+        option = orjson.OPT_NON_STR_KEYS
+        # orjson only indents by 2; any requested indent gets that
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            option |= orjson.OPT_INDENT_2
+        ret = orjson.dumps(data, default=encode_default, option=option)
+        # Valid JSON but not valid JavaScript; DRF escapes them too
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class ORJSONParser(JSONParser):
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        _vary_on_accept(renderer_context)
+        return msgpack.packb(data, default=encode_default, use_bin_type=True)
+
+
+class MessagePackParser(BaseParser):
+    media_type = 'application/msgpack'
+    renderer_class = MessagePackRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.UnpackException) as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
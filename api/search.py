@@ -0,0 +1,178 @@
+"""
+Full-text search over StudyPost.title / topic / description.
+
+PostgreSQL keeps a generated ``search_vector`` tsvector column on
+``api_studypost`` backed by a GIN index; SQLite (used for tests and local dev)
+keeps an external-content FTS5 table ``api_studypost_fts`` in sync with
+triggers. Both are created by migration 0006 and neither is declared on the
+model, so the ORM never reads or writes them directly.
+
+Note: SQLite drops triggers when Django rebuilds a table, so a migration that
+remakes ``api_studypost`` on SQLite must run ``drop_search_schema`` /
+``create_search_schema`` around it.
+"""
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'api_studypost_fts'
+
+# Title matches beat topic matches beat description matches.
+PG_WEIGHTS = ('A', 'B', 'C')
+SQLITE_WEIGHTS = (10.0, 5.0, 1.0)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    """Split raw user input into plain word tokens (drops all operators)."""
+    return _TOKEN_RE.findall(query or '')[:16]
+
+
+def _pg_tsquery(tokens):
+    # 'word:*' gives prefix matching, '&' requires every word
+    return ' & '.join(f"{token}:*" for token in tokens)
+
+
+def _sqlite_match(tokens):
+    # Quoted tokens can't be parsed as FTS5 operators; '*' is a prefix query
+    return ' '.join('"{}"*'.format(token.replace('"', '""')) for token in tokens)
+
+
+def substring_search(queryset, query):
+    """The plain ``?search=`` filter: posts whose title, topic or description contain ``query``."""
+    return queryset.filter(
+        Q(title__icontains=query) |
+        Q(topic__icontains=query) |
+        Q(description__icontains=query)
+    )
+
+
+def fulltext_search(queryset, query):
+    """
+    Filter ``queryset`` (of StudyPost) to posts matching ``query`` and
+    annotate each with ``search_rank`` (higher is more relevant).
+
+    The queryset is returned ordered by rank, newest first on ties. Databases
+    without a full-text index fall back to ``substring_search`` (every match
+    ranked the same, so newest first).
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return queryset.none()
+
+    table = queryset.model._meta.db_table
+    if connection.vendor == 'postgresql':
+        tsquery = _pg_tsquery(tokens)
+        matches = RawSQL(
+            f"{table}.search_vector @@ to_tsquery('english', %s)",
+            (tsquery,), output_field=BooleanField(),
+        )
+        rank = RawSQL(
+            f"ts_rank({table}.search_vector, to_tsquery('english', %s))",
+            (tsquery,), output_field=FloatField(),
+        )
+    elif connection.vendor == 'sqlite':
+        # Join the FTS5 table on rowid so MATCH and bm25() run once per query,
+        # not once per candidate row. bm25() is "lower is better", so flip it
+        # to sort the same way as ts_rank.
+        weights = ', '.join(str(w) for w in SQLITE_WEIGHTS)
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f"{FTS_TABLE}.rowid = {table}.id", f"{FTS_TABLE} MATCH %s"],
+            params=[_sqlite_match(tokens)],
+            select={'search_rank': f"-bm25({FTS_TABLE}, {weights})"},
+        ).order_by('-search_rank', '-created_at')
+    else:
+        return (
+            substring_search(queryset, query)
+            .annotate(search_rank=Value(0.0, output_field=FloatField()))
+            .order_by('-search_rank', '-created_at')
+        )
+
+    return (
+        queryset.filter(matches)
+        .annotate(search_rank=rank)
+        .order_by('-search_rank', '-created_at')
+    )
+
+
+# --- Schema (used by migration 0006) ---
+
+PG_FORWARD = [
+    f"""
+    ALTER TABLE api_studypost ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), '{PG_WEIGHTS[0]}') ||
+        setweight(to_tsvector('english', coalesce(topic, '')), '{PG_WEIGHTS[1]}') ||
+        setweight(to_tsvector('english', coalesce(description, '')), '{PG_WEIGHTS[2]}')
+    ) STORED
+    """,
+    "CREATE INDEX api_studypost_search_gin ON api_studypost USING GIN (search_vector)",
+]
+
+PG_REVERSE = [
+    "DROP INDEX IF EXISTS api_studypost_search_gin",
+    "ALTER TABLE api_studypost DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_FORWARD = [
+    f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        title, topic, description,
+        content='api_studypost', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON api_studypost BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, topic, description)
+        VALUES (new.id, new.title, new.topic, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON api_studypost BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, topic, description)
+        VALUES ('delete', old.id, old.title, old.topic, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF title, topic, description ON api_studypost BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, topic, description)
+        VALUES ('delete', old.id, old.title, old.topic, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, title, topic, description)
+        VALUES (new.id, new.title, new.topic, new.description);
+    END
+    """,
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSE = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def _run(schema_editor, statements):
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def create_search_schema(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _run(schema_editor, PG_FORWARD)
+    elif vendor == 'sqlite':
+        _run(schema_editor, SQLITE_FORWARD)
+
+
+def drop_search_schema(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _run(schema_editor, PG_REVERSE)
+    elif vendor == 'sqlite':
+        _run(schema_editor, SQLITE_REVERSE)
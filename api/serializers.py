@@ -1,13 +1,32 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import StudyPost, StudySession, ConversationNote, UserProfile, UserMedia
+from .models import StudyPost, StudySession, ConversationNote, UserProfile, UserMedia, AIJob
+from .fieldsets import SelectableFieldsMixin
+from .metrics import TimedRepresentationMixin
 
-class UserSerializer(serializers.ModelSerializer):
+class ModelSerializer(TimedRepresentationMixin, SelectableFieldsMixin, serializers.ModelSerializer):
+    """
+    Serializing time shows up in the request metrics (api/metrics.py); fields
+    follow ``?fields=`` / ``?expand=`` (api/fieldsets.py).
+    """
+
+class UserSerializer(ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'first_name', 'last_name']
 
-class RegisterSerializer(serializers.ModelSerializer):
+# Compact forms of relations in list views (``Meta.compact``)
+class UserSummarySerializer(ModelSerializer):
+    class Meta:
+        model = User
+        fields = ['id', 'username']
+
+class StudyPostSummarySerializer(ModelSerializer):
+    class Meta:
+        model = StudyPost
+        fields = ['id', 'title', 'topic', 'subject']
+
+class RegisterSerializer(ModelSerializer):
     password = serializers.CharField(write_only=True, min_length=8)
     class Meta:
         model = User
@@ -18,12 +37,43 @@ class RegisterSerializer(serializers.ModelSerializer):
         UserProfile.objects.create(user=user)
         return user
 
-class UserMediaSerializer(serializers.ModelSerializer):
+class UserMediaSerializer(ModelSerializer):
     class Meta:
         model = UserMedia
         fields = '__all__'
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class MediaUploadSerializer(serializers.Serializer):
+    """One item of a media upload; also accepts the frontend's camelCase keys."""
+    aliases = {'fileUrl': 'file_url', 'aiAnalysisText': 'analysis_text'}
+
+    file_url = serializers.URLField()
+    category = serializers.CharField(max_length=20)
+    title = serializers.CharField(max_length=255, required=False, allow_blank=True)
+    is_public = serializers.BooleanField(default=True)
+    analysis_text = serializers.CharField(max_length=5000, required=False, allow_blank=True)
+
+    def to_internal_value(self, data):
+        if isinstance(data, dict):
+            data = {self.aliases.get(key, key): value for key, value in data.items()}
+        return super().to_internal_value(data)
+
+class SessionMessageSerializer(serializers.Serializer):
+    """One chat message, as the frontend has it in Firestore."""
+    userName = serializers.CharField(max_length=150, default='User')
+    # Image-only messages have no text
+    text = serializers.CharField(max_length=10000, allow_blank=True, trim_whitespace=False, default='')
+    userId = serializers.CharField(max_length=128, required=False)
+    timestamp = serializers.JSONField(required=False)  # whatever the client sent (ISO string, epoch ms, ...)
+
+    def to_internal_value(self, data):
+        return dict(super().to_internal_value(data))
+
+class MessageAppendSerializer(serializers.Serializer):
+    messages = SessionMessageSerializer(many=True, allow_empty=False, max_length=500)
+    # Log index the first message should get; already-stored messages are skipped
+    start = serializers.IntegerField(min_value=0, required=False)
+
+class UserProfileSerializer(ModelSerializer):
     user = UserSerializer(read_only=True)
     # 1. Change to SerializerMethodField
     portfolio_media = serializers.SerializerMethodField()
@@ -31,10 +81,16 @@ class UserProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserProfile
         fields = ['id', 'user', 'bio', 'profile_picture', 'study_interests', 'created_at', 'portfolio_media']
+        compact = {'user': UserSummarySerializer}
 
     # 2. Add the privacy filter logic
     def get_portfolio_media(self, obj):
         request = self.context.get('request')
+        # UserProfileViewSet prefetches the media this requester may see
+        prefetched = getattr(obj.user, 'visible_media', None)
+        if prefetched is not None:
+            return UserMediaSerializer(prefetched, many=True).data
+
         # Start with all media for this profile's user
         queryset = UserMedia.objects.filter(user=obj.user)
 
@@ -45,29 +101,48 @@ class UserProfileSerializer(serializers.ModelSerializer):
             queryset = queryset.filter(is_public=True)
             
         return UserMediaSerializer(queryset, many=True).data
-class StudyPostSerializer(serializers.ModelSerializer):
+class StudyPostSerializer(ModelSerializer):
     user = UserSerializer(read_only=True)
     active_sessions_count = serializers.SerializerMethodField()
     class Meta:
         model = StudyPost
         fields = '__all__'
+        compact = {'user': UserSummarySerializer}
 
     def get_active_sessions_count(self, obj):
+        # StudyPostViewSet annotates this in the same query as the posts;
+        # fall back to a COUNT when the post wasn't loaded through it.
+        annotated = getattr(obj, 'active_sessions_total', None)
+        if annotated is not None:
+            return annotated
         return obj.sessions.filter(is_active=True).count()
 
-class StudySessionSerializer(serializers.ModelSerializer):
+class StudySessionSerializer(ModelSerializer):
     post = StudyPostSerializer(read_only=True)
     creator = UserSerializer(read_only=True)
     participants = UserSerializer(many=True, read_only=True)
     class Meta:
         model = StudySession
         fields = '__all__'
+        compact = {'post': StudyPostSummarySerializer, 'creator': UserSummarySerializer,
+                   'participants': UserSummarySerializer}
 
-class ConversationNoteSerializer(serializers.ModelSerializer):
+class ConversationNoteSerializer(ModelSerializer):
     session_info = serializers.SerializerMethodField()
     class Meta:
         model = ConversationNote
         fields = '__all__'
 
     def get_session_info(self, obj):
-        return {'id': obj.session.id, 'topic': obj.session.post.topic}
\ No newline at end of file
+        # The note viewsets annotate the topic; elsewhere it's looked up
+        topic = getattr(obj, 'session_topic', None)
+        if topic is None:
+            topic = obj.session.post.topic
+        return {'id': obj.session_id, 'topic': topic}
+
+class AIJobSerializer(ModelSerializer):
+    class Meta:
+        model = AIJob
+        # payload (the transcript) stays server-side
+        fields = ['id', 'kind', 'session', 'status', 'attempts', 'max_attempts',
+                  'run_after', 'last_error', 'result', 'created_at', 'updated_at']
@@ -0,0 +1,277 @@
+"""
+"Similar posts" and "recommended for me", from an in-memory vector index.
+
+Every post gets a text vector when it's saved: the words of its title,
+topic, subject and description, feature-hashed into
+``SIMILAR_POSTS_DIMENSIONS`` signed buckets (no vocabulary to fit, no
+external service) and L2-normalized. Vectors are stored in
+``StudyPostVector`` rows; ``manage.py index_posts`` (re)computes them for
+existing posts.
+
+Each process keeps the active posts' vectors in one float32 matrix. A query
+scores every post at once (one matrix product, cosine similarity since all
+rows are unit length); several query vectors, e.g. one per study interest,
+are scored in the same product. The matrix follows the table incrementally:
+this process applies its own writes when they commit, and every
+``SIMILAR_POSTS_SYNC_INTERVAL`` seconds picks up rows other processes
+changed (by ``updated_at``). Deleting a post leaves its row behind as an
+inactive tombstone so that the syncs see it; ``manage.py index_posts``
+purges old ones. Results are always re-read from the database, so a post
+deleted elsewhere can't be returned even before the next sync.
+
+Writes that skip model signals (``bulk_create``, ``QuerySet.update``) must
+call ``index_posts`` themselves.
+"""
+import re
+import threading
+import time
+import zlib
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import StudyPost, StudyPostVector
+
+# Title and topic say the most about what a post is for
+FIELD_WEIGHTS = {'title': 2.0, 'topic': 2.0, 'subject': 1.5, 'description': 1.0}
+TEXT_FIELDS = tuple(FIELD_WEIGHTS)
+STOP_WORDS = frozenset(
+    'a an and are as at be by for from has have how i in is it its of on or our so that the this to was we '
+    'what when which who will with you your'.split()
+)
+# Rows committed slightly out of updated_at order are still picked up
+SYNC_OVERLAP = timedelta(seconds=30)
+# Long enough for every process to have synced past a delete
+TOMBSTONE_TTL = timedelta(days=1)
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def dimensions():
+    return _setting('SIMILAR_POSTS_DIMENSIONS', 256)
+
+
+def _words(text):
+    return [w for w in _WORD_RE.findall((text or '').lower()) if len(w) > 1 and w not in STOP_WORDS]
+
+
+def vectorize(weighted_texts, dims=None):
+    """Unit-length hashed bag of words of ``[(text, weight), ...]`` (all zeros if there are no words)."""
+    dims = dims or dimensions()
+    buckets, values = [], []
+    for text, weight in weighted_texts:
+        for word in _words(text):
+            h = zlib.crc32(word.encode())
+            buckets.append(h % dims)
+            # The sign bit keeps colliding words from adding up
+            values.append(weight if h & 0x80000000 else -weight)
+    vector = np.zeros(dims, dtype=np.float32)
+    if buckets:
+        np.add.at(vector, buckets, values)
+        # Sublinear term frequency: a repeated word doesn't dominate
+        vector = np.sign(vector) * np.log1p(np.abs(vector))
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+    return vector.astype(np.float32, copy=False)
+
+
+def post_vector(post, dims=None):
+    return vectorize([(getattr(post, field), weight) for field, weight in FIELD_WEIGHTS.items()], dims)
+
+
+def interests_matrix(interests, dims=None):
+    """One query vector per study interest (strings; anything else is str()'d)."""
+    vectors = [vectorize([(str(interest), 1.0)], dims) for interest in interests or []]
+    vectors = [v for v in vectors if v.any()]
+    return np.vstack(vectors) if vectors else np.zeros((0, dims or dimensions()), dtype=np.float32)
+
+
+class PostIndex:
+    """The active posts' vectors as rows of one matrix, with their post and author ids."""
+
+    def __init__(self, dims=None):
+        self.dims = dims or dimensions()
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self.matrix = np.zeros((1024, self.dims), dtype=np.float32)
+            self.post_ids = np.zeros(1024, dtype=np.int64)
+            self.owner_ids = np.zeros(1024, dtype=np.int64)
+            self.size = 0
+            self.rows = {}  # post id -> row
+            self.watermark = None
+            self.synced_at = 0.0
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self):
+        capacity = len(self.post_ids) * 2
+        self.matrix = np.resize(self.matrix, (capacity, self.dims))
+        self.post_ids = np.resize(self.post_ids, capacity)
+        self.owner_ids = np.resize(self.owner_ids, capacity)
+
+    def upsert(self, post_id, owner_id, vector):
+        with self._lock:
+            row = self.rows.get(post_id)
+            if row is None:
+                if self.size == len(self.post_ids):
+                    self._grow()
+                row = self.rows[post_id] = self.size
+                self.size += 1
+            self.matrix[row] = vector
+            self.post_ids[row] = post_id
+            self.owner_ids[row] = owner_id
+
+    def remove(self, post_id):
+        with self._lock:
+            row = self.rows.pop(post_id, None)
+            if row is None:
+                return
+            # Move the last row into the gap
+            last = self.size - 1
+            if row != last:
+                self.matrix[row] = self.matrix[last]
+                self.post_ids[row] = self.post_ids[last]
+                self.owner_ids[row] = self.owner_ids[last]
+                self.rows[int(self.post_ids[row])] = row
+            self.size = last
+
+    def apply(self, post_id, owner_id, is_active, data):
+        vector = np.frombuffer(bytes(data), dtype=np.float32) if data is not None else None
+        if is_active and vector is not None and vector.shape == (self.dims,) and vector.any():
+            self.upsert(post_id, owner_id, vector)
+        else:
+            self.remove(post_id)
+
+    def sync(self, force=False):
+        """Apply vector rows changed since the last sync (all of them the first time)."""
+        interval = _setting('SIMILAR_POSTS_SYNC_INTERVAL', 5)
+        if not force and time.monotonic() - self.synced_at < interval:
+            return
+        rows = StudyPostVector.objects.all()
+        if self.watermark is None:
+            rows = rows.filter(is_active=True)
+        else:
+            rows = rows.filter(updated_at__gt=self.watermark - SYNC_OVERLAP)
+        watermark = self.watermark
+        for post_id, owner_id, is_active, data, updated_at in rows.values_list(
+                'post_id', 'post__user_id', 'is_active', 'vector', 'updated_at').iterator(chunk_size=2000):
+            self.apply(post_id, owner_id, is_active, data)
+            if watermark is None or updated_at > watermark:
+                watermark = updated_at
+        if self.watermark is not None:
+            # Deleted posts' tombstones have no post to join to the owner
+            for post_id, updated_at in rows.filter(is_active=False).values_list('post_id', 'updated_at'):
+                self.remove(post_id)
+                watermark = max(watermark, updated_at)
+        self.watermark = watermark
+        self.synced_at = time.monotonic()
+
+    def search(self, queries, limit=10, exclude_posts=(), exclude_owner=None):
+        """
+        ``[(post_id, score), ...]``, best first, for the ``queries`` vectors
+        (one or a batch; a post's score is its best match among them).
+        """
+        queries = np.atleast_2d(queries)
+        with self._lock:
+            size = self.size
+            if not size or not len(queries):
+                return []
+            scores = self.matrix[:size] @ queries.T
+            scores = scores.max(axis=1) if scores.shape[1] > 1 else scores[:, 0]
+            if exclude_owner is not None:
+                scores[self.owner_ids[:size] == exclude_owner] = -1
+            for post_id in exclude_posts:
+                row = self.rows.get(post_id)
+                if row is not None:
+                    scores[row] = -1
+            post_ids = self.post_ids[:size]
+            limit = min(limit, size)
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            top = top[np.argsort(-scores[top], kind='stable')]
+            return [(int(post_ids[row]), float(scores[row])) for row in top if scores[row] > 0]
+
+
+index = PostIndex()
+
+
+def _index():
+    index.sync()
+    return index
+
+
+def similar_to(post, limit=10):
+    return _index().search(post_vector(post), limit, exclude_posts=[post.pk])
+
+
+def recommended_for(user, interests, limit=10):
+    return _index().search(interests_matrix(interests), limit, exclude_owner=user.pk)
+
+
+def _save_vector(post):
+    vector = post_vector(post)
+    StudyPostVector.objects.update_or_create(
+        post=post, defaults={'vector': vector.tobytes(), 'is_active': post.is_active})
+    return vector
+
+
+def index_posts(posts, batch_size=1000):
+    """(Re)compute and store the vectors of ``posts``; returns how many."""
+    total, batch = 0, []
+    posts = posts.only('id', 'user_id', 'is_active', *TEXT_FIELDS).order_by('pk')
+    for post in posts.iterator(chunk_size=batch_size):
+        batch.append(post)
+        if len(batch) == batch_size:
+            total += _store_batch(batch)
+            batch = []
+    return total + _store_batch(batch)
+
+
+def _store_batch(posts):
+    rows = [StudyPostVector(post=post, vector=post_vector(post).tobytes(), is_active=post.is_active)
+            for post in posts]
+    StudyPostVector.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=['post'], update_fields=['vector', 'is_active', 'updated_at'])
+
+    def apply():
+        for post, row in zip(posts, rows):
+            index.apply(post.pk, post.user_id, post.is_active, row.vector)
+    transaction.on_commit(apply)
+    return len(rows)
+
+
+@receiver(post_save, sender=StudyPost)
+def _post_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not set(update_fields) & {'is_active', *TEXT_FIELDS}:
+        return
+    vector = _save_vector(instance)
+    data = vector.tobytes()
+    transaction.on_commit(lambda: index.apply(instance.pk, instance.user_id, instance.is_active, data))
+
+
+def purge_tombstones(older_than=TOMBSTONE_TTL):
+    """Delete the vector rows of posts deleted more than ``older_than`` ago; returns how many."""
+    tombstones = StudyPostVector.objects.filter(is_active=False, updated_at__lt=timezone.now() - older_than).exclude(
+        Exists(StudyPost.objects.filter(pk=OuterRef('pk'))))
+    return tombstones.delete()[0]
+
+
+@receiver(post_delete, sender=StudyPost)
+def _post_deleted(sender, instance, **kwargs):
+    post_id = instance.pk
+    StudyPostVector.objects.filter(post_id=post_id).update(is_active=False, vector=b'', updated_at=timezone.now())
+    transaction.on_commit(lambda: index.remove(post_id))
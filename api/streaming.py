@@ -0,0 +1,49 @@
+"""Framing for token streams: server-sent events or newline-delimited JSON."""
+import json
+
+from django.http import StreamingHttpResponse
+
+CONTENT_TYPES = {
+    'sse': 'text/event-stream',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def requested_format(request):
+    """'sse' / 'ndjson' when the client asked for a stream (``stream`` in body or query), else None."""
+    value = request.query_params.get('stream') or request.data.get('stream')
+    if value in (None, '', False, 'false', '0'):
+        return None
+    value = str(value).lower()
+    return value if value in CONTENT_TYPES else 'sse'
+
+
+def _frame(fmt, event, data):
+    if fmt == 'sse':
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return json.dumps({'event': event, **data}) + "\n"
+
+
+async def _framed(tokens, fmt):
+    length = 0
+    try:
+        async for token in tokens:
+            length += len(token)
+            yield _frame(fmt, 'token', {'token': token})
+    except Exception as e:
+        yield _frame(fmt, 'error', {'error': f"Groq Solver Error: {str(e)}"})
+        return
+    yield _frame(fmt, 'done', {'length': length})
+
+
+def stream_response(tokens, fmt):
+    """
+    Wrap an async iterator of text tokens in a streaming response.
+
+    Served by the ASGI application the iterator runs on the event loop, so a
+    slow upstream doesn't tie up a worker thread.
+    """
+    response = StreamingHttpResponse(_framed(tokens, fmt), content_type=CONTENT_TYPES[fmt])
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # don't let a proxy buffer the stream
+    return response
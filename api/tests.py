@@ -1,3 +1,1823 @@
-from django.test import TestCase
+import asyncio
+import base64
+import json
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+import unittest
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import msgpack
+import numpy as np
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, close_old_connections, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from backend.asgi import application
+
+from . import admission, authentication, consumers, interests, jobs, llm, media, message_log, metrics, model_router, notes, renderers, similarity
+from .feed_cache import feed_cache
+from .models import StudyPost, StudySession, ConversationNote, UserProfile, UserMedia, AIJob, SessionMessageChunk, StudyPostVector, StudyPostTag, UserInterest
+from .search import fulltext_search
+
+
+def fake_completion(content, usage=None):
+    """Shape of a (non-streaming) Groq chat completion."""
+    if not isinstance(content, str):
+        content = json.dumps(content)
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+
+def make_session(user, title='Calculus', **kwargs):
+    post = StudyPost.objects.create(user=user, title=title, topic='Limits', description='d', subject='Maths')
+    session = StudySession.objects.create(
+        post=post, creator=user, firestore_chat_id=f'chat-{post.id}', **kwargs)
+    session.participants.add(user)
+    return session
+
+
+class FakeAsyncGroq:
+    """Stands in for AsyncGroq: streams ``tokens`` or returns ``content`` (or ``content(request)``)."""
+
+    def __init__(self, tokens=(), content='', delay=0.0, error=None):
+        self.tokens, self.content, self.delay, self.error = list(tokens), content, delay, error
+        self.calls = 0
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def close(self):
+        pass
+
+    async def create(self, stream=False, **kwargs):
+        self.calls += 1
+        self.requests.append(kwargs)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        if not stream:
+            content = self.content(kwargs) if callable(self.content) else self.content
+            return fake_completion(content, SimpleNamespace(prompt_tokens=100, completion_tokens=20))
+
+        async def chunks():
+            for token in self.tokens:
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+        return chunks()
+
+
+def patch_async_groq(test, **kwargs):
+    """Route every async Groq call in ``test`` to a FakeAsyncGroq and return it."""
+    groq = FakeAsyncGroq(**kwargs)
+    patcher = mock.patch('api.llm.get_async_client', return_value=groq)
+    patcher.start()
+    test.addCleanup(patcher.stop)
+    return groq
+
+
+def llm_cache_ttls():
+    """Seconds left on every entry in the (locmem) ``llm`` cache; None for one that never expires."""
+    cache = caches['llm']
+    return [None if expires is None else expires - time.time() for expires in cache._expire_info.values()]
+
+
+def read_stream(response):
+    async def collect():
+        return b''.join([chunk async for chunk in response.streaming_content])
+    return async_to_sync(collect)().decode()
+
+
+class QueryBudgetMixin:
+    """
+    Fails the test when an endpoint runs more SQL queries than it is allowed.
+
+    Declare budgets as ``query_budgets = {'name': (method, url, budget)}``
+    (urls may use ``{attr}`` placeholders filled from the test case) and call
+    ``assertQueryBudgets()``, or check a single request with
+    ``assertWithinQueryBudget()``.
+    """
+    query_budgets = {}
+
+    def assertWithinQueryBudget(self, budget, method, url, client=None, **kwargs):
+        client = client or self.client
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(client, method)(url, **kwargs)
+        if len(queries) > budget:
+            executed = '\n'.join(f"  {q['sql']}" for q in queries.captured_queries)
+            self.fail(f"{method.upper()} {url} ran {len(queries)} queries (budget {budget}):\n{executed}")
+        return response
+
+    def assertQueryBudgets(self, client=None):
+        for name, (method, url, budget) in self.query_budgets.items():
+            with self.subTest(endpoint=name):
+                response = self.assertWithinQueryBudget(
+                    budget, method, re.sub(r'{(\w+)}', lambda m: str(getattr(self, m.group(1))), url), client=client)
+                self.assertLess(response.status_code, 400)
+
+
+class StudyPostQueryBudgetTests(QueryBudgetMixin, TestCase):
+    # COUNT for the paginator + one query for posts, authors and session counts
+    query_budgets = {
+        'list': ('get', '/api/study-posts/', 2),
+        'search': ('get', '/api/study-posts/?search=topic', 2),
+        'fulltext': ('get', '/api/study-posts/?search=topic&search_mode=fulltext', 2),
+        'detail': ('get', '/api/study-posts/{post_id}/', 1),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(25):
+            author = User.objects.create_user(f'author{i}')
+            post = StudyPost.objects.create(
+                user=author, title=f'Post {i}', topic='topic', description='d', subject='Maths')
+            for active in (True, False, False):
+                StudySession.objects.create(
+                    post=post, creator=author, is_active=active,
+                    firestore_chat_id=f'chat-{i}-{StudySession.objects.count()}')
+        cls.post_id = post.id
+
+    def setUp(self):
+        caches['feed'].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.get(username='author0'))
+
+    def test_endpoints_stay_within_budget(self):
+        self.assertQueryBudgets()
+
+    def test_active_session_count_comes_from_annotation(self):
+        response = self.client.get('/api/study-posts/')
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertEqual({post['active_sessions_count'] for post in response.data['results']}, {1})
+        self.assertEqual(response.data['results'][0]['user']['username'], 'author24')
+
+
+class SessionMembershipQueryTests(QueryBudgetMixin, TestCase):
+    """Sessions / notes of a member of many sessions: no DISTINCT, queries independent of page size."""
+    query_budgets = {
+        # COUNT + sessions (joined to compact post and creator) + participants
+        'sessions': ('get', '/api/sessions/', 3),
+        # ... or posts with authors and counts in their own query
+        'sessions-expanded': ('get', '/api/sessions/?expand=post,participants', 4),
+        'sessions-cursor': ('get', '/api/sessions/?pagination=cursor', 3),
+        'session-detail': ('get', '/api/sessions/{session_id}/', 3),
+        'notes': ('get', '/api/notes/', 2),
+        'notes-cursor': ('get', '/api/notes/?pagination=cursor', 1),
+        'session-notes': ('get', '/api/sessions/{session_id}/notes/', 2),
+        'jobs': ('get', '/api/jobs/', 2),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('kai')
+        cls.outsider = User.objects.create_user('lou')
+        others = [User.objects.create_user(f'peer{i}') for i in range(3)]
+        cls.member_ids = set()
+        for i in range(30):
+            creator = cls.user if i < 10 else others[i % 3]
+            session = make_session(creator, title=f'Session {i}')
+            session.participants.add(*others)
+            if i < 25:
+                session.participants.add(cls.user)  # creator and participant for the first 10
+                cls.member_ids.add(session.id)
+            ConversationNote.objects.bulk_create([ConversationNote(session=session, content=f'n{n}') for n in range(2)])
+        cls.session_id = min(cls.member_ids)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_endpoints_stay_within_budget(self):
+        self.assertQueryBudgets()
+
+    def test_each_member_session_is_listed_once(self):
+        ids, url = [], '/api/sessions/?pagination=cursor'
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                page = self.client.get(url).data
+            self.assertFalse(any('DISTINCT' in q['sql'] for q in queries.captured_queries))
+            ids += [session['id'] for session in page['results']]
+            url = page['next']
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(set(ids), self.member_ids)
+
+        first = self.client.get('/api/sessions/?expand=post').data['results'][0]
+        self.assertEqual(first['post']['active_sessions_count'], 1)
+        self.assertEqual(len(first['participants']), 4)
+
+    def test_notes_are_limited_to_member_sessions(self):
+        response = self.client.get('/api/notes/')
+        self.assertEqual(response.data['count'], 50)
+        note = response.data['results'][0]
+        self.assertIn(note['session_info']['id'], self.member_ids)
+        self.assertTrue(note['session_info']['topic'])
+
+        self.client.force_authenticate(self.outsider)
+        self.assertEqual(self.client.get('/api/notes/').data['count'], 0)
+        self.assertEqual(self.client.get('/api/sessions/').data['count'], 0)
+
+
+class SparseFieldsetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('mona', email='mona@example.com')
+        cls.session = make_session(cls.user, title='Vectors')
+        cls.session.participants.add(User.objects.create_user('ned', email='ned@example.com'))
+        ConversationNote.objects.create(session=cls.session, content='Dot products', key_concepts=['dot'])
+
+    def setUp(self):
+        caches['feed'].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), ' '.join(q['sql'] for q in queries.captured_queries)
+
+    def test_lists_are_compact_unless_expanded(self):
+        data, sql = self.get('/api/sessions/')
+        session = data['results'][0]
+        self.assertEqual(session['post'], {'id': self.session.post_id, 'title': 'Vectors',
+                                           'topic': 'Limits', 'subject': 'Maths'})
+        self.assertEqual(session['creator'], {'id': self.user.id, 'username': 'mona'})
+        self.assertEqual({p['username'] for p in session['participants']}, {'mona', 'ned'})
+        self.assertNotIn('email', sql)  # participants: id and username only
+        self.assertNotIn('active_sessions_total', sql)
+
+        data, _ = self.get('/api/sessions/?expand=post.user,creator')
+        session = data['results'][0]
+        self.assertEqual(session['post']['user']['email'], 'mona@example.com')
+        self.assertEqual(session['post']['active_sessions_count'], 1)
+        self.assertEqual(session['creator']['email'], 'mona@example.com')
+        self.assertNotIn('email', session['participants'][0])
+
+        # Detail views stay full
+        data, _ = self.get(f'/api/sessions/{self.session.id}/')
+        self.assertEqual(data['post']['user']['email'], 'mona@example.com')
+
+    def test_fields_limit_the_response_and_the_queries(self):
+        data, sql = self.get('/api/sessions/?fields=id,is_active,post.title')
+        self.assertEqual(data['results'], [{'id': self.session.id, 'is_active': True,
+                                            'post': {'title': 'Vectors'}}])
+        self.assertNotIn('auth_user', sql)
+
+        data, sql = self.get('/api/study-posts/?fields=id,title')
+        self.assertEqual(data['results'], [{'id': self.session.post_id, 'title': 'Vectors'}])
+        self.assertNotIn('auth_user', sql)
+        self.assertNotIn('active_sessions_total', sql)
+
+        data, sql = self.get('/api/notes/?fields=id,key_concepts')
+        self.assertEqual(data['results'][0], {'id': self.session.ai_notes.get().id, 'key_concepts': ['dot']})
+        self.assertNotIn('topic', sql)
+
+        data, sql = self.get('/api/userprofile/?fields=bio')
+        self.assertNotIn('api_usermedia', sql)
+
+    def test_writes_ignore_fields(self):
+        response = self.client.post('/api/study-posts/?fields=id', {
+            'title': 'Matrices', 'topic': 'Linear algebra', 'description': 'Eigenvalues', 'subject': 'Maths',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['title'], 'Matrices')
+        self.assertEqual(response.data['user']['username'], 'mona')
+
+
+class KeysetPaginationTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('bob')
+        posts = StudyPost.objects.bulk_create([
+            StudyPost(user=cls.user, title=f'Post {i}', topic='t', description='d', subject='s')
+            for i in range(45)
+        ])
+        # Force timestamp ties so the id tie-breaker is exercised
+        StudyPost.objects.filter(id__in=[p.id for p in posts[10:30]]).update(created_at=posts[10].created_at)
+
+    def setUp(self):
+        caches['feed'].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_walks_every_post_once_in_feed_order(self):
+        expected = list(StudyPost.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        seen, url = [], '/api/study-posts/?pagination=cursor'
+        while url:
+            # No COUNT(*): a single query per page
+            response = self.assertWithinQueryBudget(1, 'get', url)
+            self.assertNotIn('count', response.data)
+            seen += [post['id'] for post in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(seen, expected)
+
+    def test_page_numbers_remain_the_default(self):
+        response = self.client.get('/api/study-posts/')
+        self.assertEqual(response.data['count'], 45)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/study-posts/?cursor=garbage').status_code, 404)
+
+
+class FullTextSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', password='pw-12345678')
+        cls.in_title = StudyPost.objects.create(
+            user=cls.user, title='Thermodynamics crash course', topic='Heat',
+            description='Entropy and engines', subject='Physics')
+        cls.in_description = StudyPost.objects.create(
+            user=cls.user, title='Weekend revision', topic='Mixed',
+            description='We will touch on thermodynamics briefly', subject='Physics')
+        cls.unrelated = StudyPost.objects.create(
+            user=cls.user, title='Organic chemistry', topic='Alkenes',
+            description='Reaction mechanisms', subject='Chemistry')
+
+    def setUp(self):
+        caches['feed'].clear()
+
+    def search(self, query):
+        return list(fulltext_search(StudyPost.objects.filter(is_active=True), query))
+
+    def test_ranks_title_matches_first(self):
+        self.assertEqual(self.search('thermodynamics'), [self.in_title, self.in_description])
+
+    def test_prefix_matching(self):
+        self.assertEqual(self.search('thermo')[0], self.in_title)
+        self.assertEqual(self.search('alk'), [self.unrelated])
+
+    def test_operators_in_input_are_ignored(self):
+        self.assertEqual(self.search('"chem* ('), [self.unrelated])
+        self.assertEqual(self.search('  '), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.unrelated.title = 'Quantum tunnelling'
+        self.unrelated.save()
+        self.assertEqual(self.search('tunnel'), [self.unrelated])
+        self.assertEqual(self.search('organic'), [])
+        self.unrelated.delete()
+        self.assertEqual(self.search('tunnel'), [])
+
+    def test_other_databases_fall_back_to_substring_search(self):
+        with mock.patch('api.search.connection', SimpleNamespace(vendor='mysql')):
+            self.assertEqual(self.search('thermodynamics'), [self.in_description, self.in_title])
+            self.assertEqual(self.search('thermodynamics crash'), [self.in_title])
+
+    def test_fulltext_search_mode_on_feed(self):
+        response = APIClient().get('/api/study-posts/', {'search': 'thermo', 'search_mode': 'fulltext'})
+        self.assertEqual(response.status_code, 200)
+        ids = [post['id'] for post in response.data['results']]
+        self.assertEqual(ids, [self.in_title.id, self.in_description.id])
+
+
+@override_settings(SIMILAR_POSTS_SYNC_INTERVAL=0)
+class SimilarPostsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('olga')
+        cls.reader = User.objects.create_user('pete')
+        UserProfile.objects.create(user=cls.reader, study_interests=['organic chemistry', 'enzymes'])
+
+        def post(title, topic, description, subject, user=cls.author):
+            return StudyPost.objects.create(user=user, title=title, topic=topic,
+                                            description=description, subject=subject)
+        cls.thermo = post('Thermodynamics crash course', 'Entropy', 'Heat engines and entropy', 'Physics')
+        cls.entropy = post('Entropy and the second law', 'Thermodynamics', 'Heat, engines, entropy', 'Physics')
+        cls.organic = post('Organic chemistry', 'Alkenes', 'Reaction mechanisms of alkenes', 'Chemistry')
+        cls.enzymes = post('Enzymes', 'Biochemistry', 'How enzymes catalyse reactions', 'Biology')
+        cls.own = post('My organic chemistry notes', 'Alkenes', 'Organic chemistry', 'Chemistry', user=cls.reader)
+
+    def setUp(self):
+        similarity.index.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def similar(self, post):
+        return self.client.get(f'/api/study-posts/{post.id}/similar/').data['results']
+
+    def test_similar_posts_rank_by_shared_words(self):
+        results = self.similar(self.thermo)
+        self.assertEqual(results[0]['id'], self.entropy.id)
+        self.assertNotIn(self.thermo.id, [r['id'] for r in results])
+        self.assertGreater(results[0]['score'], 0.5)
+        self.assertEqual(results[0]['user'], {'id': self.author.id, 'username': 'olga'})  # compact, like lists
+
+    def test_recommended_follows_interests_and_skips_own_posts(self):
+        results = self.client.get('/api/study-posts/recommended/').data['results']
+        ids = [r['id'] for r in results]
+        self.assertEqual(set(ids[:2]), {self.organic.id, self.enzymes.id})
+        self.assertNotIn(self.own.id, ids)
+        self.assertNotIn(self.thermo.id, ids)
+
+        anonymous = APIClient().get('/api/study-posts/recommended/')
+        self.assertEqual(anonymous.status_code, 401)
+
+    def test_index_follows_edits_and_deactivation(self):
+        self.assertEqual(len(self.similar(self.thermo)), 1)
+        self.entropy.is_active = False
+        self.entropy.save()
+        self.assertEqual(self.similar(self.thermo), [])
+
+        self.organic.title, self.organic.topic = 'Entropy in chemistry', 'Thermodynamics'
+        self.organic.save()
+        self.assertEqual([r['id'] for r in self.similar(self.thermo)], [self.organic.id])
+        self.assertEqual(len(similarity.index), 4)
+
+    def test_other_processes_see_deletes(self):
+        other = similarity.PostIndex()  # another process's index
+        other.sync(force=True)
+        self.assertIn(self.entropy.id, other.rows)
+
+        entropy_id = self.entropy.id
+        self.entropy.delete()
+        other.sync(force=True)
+        self.assertNotIn(entropy_id, other.rows)
+        self.assertEqual(len(other), 4)
+
+        self.assertEqual(similarity.purge_tombstones(older_than=timedelta(hours=1)), 0)
+        self.assertEqual(similarity.purge_tombstones(older_than=timedelta(0)), 1)
+        self.assertEqual(StudyPostVector.objects.count(), 4)
+
+    def test_index_rows_grow_and_shrink(self):
+        index = similarity.PostIndex(dims=8)
+        vectors = np.eye(8, dtype=np.float32)
+        for post_id in range(1, 2001):
+            index.upsert(post_id, post_id % 3, vectors[post_id % 8])
+        index.remove(1)
+        index.remove(2000)
+        self.assertEqual(len(index), 1998)
+        matches = index.search(vectors[1], limit=3, exclude_owner=0)
+        self.assertEqual(len(matches), 3)
+        self.assertTrue(all(post_id % 8 == 1 and post_id % 3 and post_id != 1 for post_id, _ in matches))
+        self.assertEqual(index.search(np.zeros((0, 8), dtype=np.float32)), [])
+
+    def test_index_posts_command_backfills(self):
+        StudyPostVector.objects.all().delete()
+        out = StringIO()
+        call_command('index_posts', '--missing', stdout=out)
+        self.assertIn('Indexed 5 post(s)', out.getvalue())
+        self.assertEqual(self.similar(self.thermo)[0]['id'], self.entropy.id)
+
+
+class InterestMatchingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        def user(name, interests, **kwargs):
+            u = User.objects.create_user(name, **kwargs)
+            UserProfile.objects.create(user=u, study_interests=interests)
+            return u
+        cls.me = user('quinn', ['Organic  Chemistry', 'calculus', 'Physics'])
+        cls.best = user('rosa', ['organic chemistry', 'Calculus', 'physics', 'art'])
+        cls.some = user('sam', ['physics'])
+        cls.none = user('tara', ['history'])
+        cls.gone = user('uma', ['calculus', 'physics', 'organic chemistry'], is_active=False)
+
+        def post(owner, subject, topic, **kwargs):
+            return StudyPost.objects.create(user=owner, title='t', description='d', subject=subject, topic=topic,
+                                            **kwargs)
+        cls.both = post(cls.none, 'Physics', 'Calculus')
+        cls.one = post(cls.none, 'Chemistry', 'Organic chemistry')
+        cls.mine = post(cls.me, 'Physics', 'Calculus')
+        cls.closed = post(cls.none, 'Physics', 'Calculus', is_active=False)
+
+    def setUp(self):
+        caches[interests.CACHE_ALIAS].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.me)
+
+    def matches(self, **params):
+        return self.client.get('/api/userprofile/matches/', params).data['results']
+
+    def test_users_ranked_by_shared_interests(self):
+        with CaptureQueriesContext(connection) as queries:
+            results = self.matches()
+        self.assertEqual([(r['username'], r['score']) for r in results], [('rosa', 3), ('sam', 1)])
+        self.assertEqual(results[0]['shared'], ['calculus', 'organic chemistry', 'physics'])
+        self.assertFalse(any('api_userprofile' in q['sql'] for q in queries.captured_queries))
+
+        with self.assertNumQueries(0):  # cached
+            self.assertEqual(self.matches(limit=1), results[:1])
+
+    def test_posts_ranked_by_shared_interests(self):
+        results = self.matches(type='posts')
+        self.assertEqual([(r['id'], r['score']) for r in results], [(self.both.id, 2), (self.one.id, 1)])
+        self.assertEqual(results[1]['shared'], ['organic chemistry'])
+        self.assertEqual(results[0]['user'], {'id': self.none.id, 'username': 'tara'})
+
+    def test_index_follows_profile_and_post_edits(self):
+        self.matches()
+        response = self.client.post('/api/userprofile/me/', {'study_interests': ['History', 'art']}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({r['username']: r['score'] for r in self.matches()}, {'tara': 1, 'rosa': 1})
+        self.assertEqual(set(UserInterest.objects.filter(user=self.me).values_list('tag__name', flat=True)),
+                         {'history', 'art'})
+
+        self.both.topic = 'Art'
+        self.both.save()
+        caches[interests.CACHE_ALIAS].clear()
+        self.assertEqual([(r['id'], r['shared']) for r in self.matches(type='posts')], [(self.both.id, ['art'])])
+
+    def test_index_interests_command_rebuilds(self):
+        UserInterest.objects.all().delete()
+        StudyPostTag.objects.all().delete()
+        out = StringIO()
+        call_command('index_interests', stdout=out)
+        self.assertIn('Indexed 5 profile(s) and 4 post(s)', out.getvalue())
+        self.assertEqual([r['username'] for r in self.matches()], ['rosa', 'sam'])
+
+
+class FeedCacheTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('fran')
+        cls.post = StudyPost.objects.create(user=cls.user, title='Optics', topic='t', description='d', subject='s')
+
+    def setUp(self):
+        caches['feed'].clear()
+        feed_cache.hits = feed_cache.misses = feed_cache.not_modified = 0
+        self.client = APIClient()
+
+    def get(self, url='/api/study-posts/', **headers):
+        response = self.client.get(url, headers=headers)
+        self.assertIn(response.status_code, (200, 304))
+        return response
+
+    def titles(self):
+        return [post['title'] for post in self.get().json()['results']]
+
+    def test_repeat_requests_are_served_from_the_cache(self):
+        first = self.get()
+        self.assertEqual(first['X-Cache'], 'MISS')
+        second = self.assertWithinQueryBudget(0, 'get', '/api/study-posts/')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual((second.content, second['ETag']), (first.content, first['ETag']))
+        self.assertEqual(self.get(f'/api/study-posts/{self.post.id}/')['X-Cache'], 'MISS')
+
+    def test_if_none_match_revalidates_without_a_body(self):
+        etag = self.get()['ETag']
+        response = self.assertWithinQueryBudget(0, 'get', '/api/study-posts/', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual((response.content, response['ETag']), (b'', etag))
+        self.assertEqual(self.get(**{'If-None-Match': '"stale"'}).status_code, 200)
+
+    def test_changes_are_never_served_stale(self):
+        detail = f'/api/study-posts/{self.post.id}/'
+        self.assertEqual(self.titles(), ['Optics'])
+        self.assertEqual(self.get(detail).json()['active_sessions_count'], 0)
+
+        self.post.title = 'Wave optics'
+        self.post.save()
+        self.assertEqual(self.titles(), ['Wave optics'])
+
+        session = StudySession.objects.create(post=self.post, creator=self.user, firestore_chat_id='c')
+        self.assertEqual(self.get(detail).json()['active_sessions_count'], 1)
+        session.delete()
+        self.assertEqual(self.get(detail).json()['active_sessions_count'], 0)
+
+        self.user.username = 'frances'
+        self.user.save()
+        self.assertEqual(self.get(detail).json()['user']['username'], 'frances')
+
+        self.post.delete()
+        self.assertEqual(self.titles(), [])
+
+    def test_version_is_bumped_again_on_commit(self):
+        before = feed_cache.version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.save()
+        self.assertEqual(feed_cache.version(), before + 2)
+
+    def test_logins_do_not_invalidate_the_feed(self):
+        version = feed_cache.version()
+        self.user.save(update_fields=['last_login'])
+        self.assertEqual(feed_cache.version(), version)
+
+    def test_hit_rate_stats(self):
+        etag = self.get()['ETag']
+        self.get()
+        self.get(**{'If-None-Match': etag})
+        admin = User.objects.create_superuser('root', password='pw-12345678')
+        self.client.force_authenticate(admin)
+        stats = self.client.get('/api/study-posts/cache-stats/').data
+        self.assertEqual((stats['hits'], stats['misses'], stats['not_modified']), (1, 1, 1))
+        self.assertEqual(stats['hit_rate'], 0.6667)
+
+
+class QueryPlanTests(TestCase):
+    """
+    The hot endpoints' queries, replayed through EXPLAIN: they must seek on
+    our indexes rather than scan the (seeded) tables.
+    """
+    hot_tables = ['api_studypost', 'api_studysession', 'api_conversationnote', 'api_usermedia']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('quinn')
+        users = User.objects.bulk_create([User(username=f'seed{i}') for i in range(40)])
+        posts = StudyPost.objects.bulk_create([
+            StudyPost(user=users[i % 40], title=f'Post {i}', topic='t', description='d', subject='s',
+                      is_active=i % 4 != 0)
+            for i in range(400)
+        ])
+        sessions = StudySession.objects.bulk_create([
+            StudySession(post=post, creator=post.user, is_active=i % 3 == 0, firestore_chat_id=f'plan-{i}')
+            for i, post in enumerate(posts)
+        ])
+        cls.session = sessions[0]
+        cls.session.participants.add(cls.user)
+        ConversationNote.objects.bulk_create([
+            ConversationNote(session=sessions[i % 50], content='n') for i in range(400)
+        ])
+        UserProfile.objects.bulk_create([UserProfile(user=user) for user in users + [cls.user]])
+        UserMedia.objects.bulk_create([
+            UserMedia(user=users[i % 40], file_url='https://x.test/m', category='note', is_public=i % 2 == 0)
+            for i in range(400)
+        ])
+
+    def setUp(self):
+        caches['feed'].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                return '\n'.join(row[-1] for row in cursor.fetchall())
+            # Seeded tables are tiny; make the planner show the plan it would use at scale
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN {sql}')
+            return '\n'.join(row[0] for row in cursor.fetchall())
+
+    def table_scans(self, plan):
+        if connection.vendor == 'sqlite':
+            pattern = r'^\W*SCAN (\w+)$'
+        else:
+            pattern = r'Seq Scan on (\w+)'
+        return [t for t in re.findall(pattern, plan, re.M) if t in self.hot_tables]
+
+    def assertUsesIndexes(self, url, *indexes):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        plans = [(q['sql'], self.explain(q['sql'])) for q in queries.captured_queries
+                 if q['sql'].startswith('SELECT')]
+        for sql, plan in plans:
+            self.assertEqual(self.table_scans(plan), [], f'{url}: full scan in\n{sql}\n{plan}')
+        used = '\n'.join(plan for _, plan in plans)
+        for index in indexes:
+            self.assertIn(index, used, f'{url} does not use {index}:\n{used}')
+
+    def test_feed(self):
+        self.assertUsesIndexes('/api/study-posts/', 'studypost_active_feed_idx', 'session_one_active_per_post')
+        self.assertUsesIndexes('/api/study-posts/?pagination=cursor', 'studypost_active_feed_idx')
+
+    def test_session_notes(self):
+        self.assertUsesIndexes(f'/api/sessions/{self.session.id}/notes/', 'note_session_created_idx')
+
+    def test_profiles(self):
+        self.assertUsesIndexes('/api/userprofile/', 'media_user_public_created_idx')
+
+
+class RendererTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('rita', first_name='Rita\u2028')
+        cls.session = make_session(cls.user, title='Limits \u2014 «past papers»')
+        ConversationNote.objects.create(session=cls.session, content='Summary',
+                                        key_concepts=['limit'], definitions=[{'term': 'limit', 'definition': '...'}])
+
+    def setUp(self):
+        caches['feed'].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_orjson_renders_what_drf_did(self):
+        for url in (f'/api/sessions/{self.session.id}/', f'/api/sessions/{self.session.id}/notes/'):
+            response = self.client.get(url)
+            self.assertEqual(response.content, JSONRenderer().render(response.data))
+        self.assertEqual(renderers.ORJSONRenderer().render({'n': Decimal('1.5'), 'd': timedelta(seconds=3)}),
+                         b'{"n":1.5,"d":"3.0"}')
+
+    def test_msgpack_is_negotiated(self):
+        url = f'/api/sessions/{self.session.id}/'
+        response = self.client.get(url, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertIn('Accept', response['Vary'])
+        self.assertEqual(msgpack.unpackb(response.content), json.loads(self.client.get(url).content))
+        self.assertEqual(self.client.get(url, {'format': 'msgpack'})['Content-Type'], 'application/msgpack')
+
+        # Cached feed pages are kept per format
+        feed = self.client.get('/api/study-posts/', HTTP_ACCEPT='application/msgpack')
+        again = self.client.get('/api/study-posts/', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual((again['X-Cache'], again.content), ('HIT', feed.content))
+        self.assertEqual(self.client.get('/api/study-posts/')['X-Cache'], 'MISS')
+
+    def test_request_bodies(self):
+        url = f'/api/sessions/{self.session.id}/messages/'
+        body = msgpack.packb({'messages': [{'userName': 'rita', 'text': 'hi'}]})
+        response = self.client.post(url, body, content_type='application/msgpack')
+        self.assertEqual(response.status_code, 201)
+
+        self.assertEqual(self.client.post(url, b'{"messages": [', content_type='application/json').status_code, 400)
+        self.assertEqual(self.client.post(url, b'\xc1', content_type='application/msgpack').status_code, 400)
+
+
+class CachedAuthenticationTests(TestCase):
+    """JWT users come from the auth cache; Basic auth only where a view opts in."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('mia', password='pw-123456')
+        cls.admin = User.objects.create_user('ned', password='pw-123456', is_staff=True)
+
+    def setUp(self):
+        caches['auth'].clear()
+        self.auth = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    def user_queries(self, **headers):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/jobs/', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        return [q['sql'] for q in queries.captured_queries if 'FROM "auth_user"' in q['sql']]
+
+    def test_users_are_resolved_from_the_cache(self):
+        self.assertEqual(len(self.user_queries(**self.auth)), 1)
+        self.assertEqual(self.user_queries(**self.auth), [])
+
+    def test_password_hashes_stay_out_of_the_cache(self):
+        self.user_queries(**self.auth)
+        cached = caches['auth'].get(authentication.user_cache_key(self.user.id))
+        self.assertNotIn(self.user.password.split('$')[-1].encode(), pickle.dumps(cached))
+
+        user = authentication.CachedJWTAuthentication().get_user(AccessToken.for_user(self.user))
+        self.assertEqual((user.pk, user.username, user.is_staff), (self.user.pk, 'mia', False))
+        self.assertEqual(user.get_deferred_fields(), {'password', 'last_login', 'first_name', 'last_name',
+                                                      'email', 'date_joined'})
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, self.user.email)  # loaded on access
+
+    def test_changes_to_the_user_drop_the_cached_copy(self):
+        self.user_queries(**self.auth)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/jobs/', headers=self.auth).status_code, 401)
+
+        # Logins don't
+        self.user.is_active = True
+        self.user.save()
+        self.user_queries(**self.auth)
+        self.client.post('/api/auth/login/', {'username': 'mia', 'password': 'pw-123456'}, content_type='application/json')
+        self.assertEqual(self.user_queries(**self.auth), [])
+
+    def test_blacklisting_a_token_drops_the_cached_user(self):
+        self.user_queries(**self.auth)
+        refresh = RefreshToken.for_user(self.user)
+        refresh.blacklist()
+        self.assertIsNone(caches['auth'].get(authentication.user_cache_key(self.user.id)))
+
+    def test_basic_auth_only_where_opted_in(self):
+        basic = {'Authorization': 'Basic ' + base64.b64encode(b'ned:pw-123456').decode()}
+        response = self.client.get('/api/jobs/', headers=basic)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer realm="api"')
+        self.assertEqual(self.client.get('/api/metrics/', headers=basic).status_code, 200)
+
+
+class RequestMetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('jude')
+        cls.admin = User.objects.create_user('kim', is_staff=True)
+        for i in range(3):
+            make_session(cls.user, title=f'Post {i}')
+
+    def setUp(self):
+        admission.get_buckets().clear()
+        caches['feed'].clear()
+        caches['llm'].clear()
+        metrics.registry.reset()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def server_timing(self, response):
+        return {
+            name: (float(duration), desc)
+            for name, duration, desc in re.findall(r'(\w+);dur=([\d.]+)(?:;desc="([^"]*)")?', response['Server-Timing'])
+        }
+
+    def test_server_timing_splits_db_and_serialization(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/study-posts/')
+        timing = self.server_timing(response)
+        self.assertEqual(set(timing), {'db', 'llm', 'ser', 'total'})
+        self.assertEqual(timing['db'][1], f'{len(queries)} queries')
+        self.assertGreater(timing['ser'][0], 0)
+        self.assertEqual(timing['llm'], (0.0, '0 calls'))
+        self.assertLessEqual(timing['db'][0] + timing['ser'][0], timing['total'][0] + 0.2)
+
+    def test_llm_calls_are_timed_in_async_views(self):
+        patch_async_groq(self, content='x = 2', delay=0.05)
+        response = self.client.post('/api/exam-prep/solve/', {'question': 'Solve 2x = 4'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        duration, desc = self.server_timing(response)['llm']
+        self.assertEqual(desc, '1 calls')
+        self.assertGreaterEqual(duration, 50)
+
+    def test_prometheus_endpoint(self):
+        self.client.get('/api/study-posts/')
+        self.client.get('/api/study-posts/')
+        self.client.get('/api/sessions/')
+
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        body = response.content.decode()
+        self.assertIn('http_requests_total{route="studypost-list",method="GET",status="200"} 2', body)
+        self.assertIn('http_request_duration_seconds_count{route="studypost-list",method="GET"} 2', body)
+        self.assertIn('http_request_duration_seconds_bucket{route="session-list",method="GET",le="+Inf"} 1', body)
+        self.assertIn('# TYPE http_request_db_seconds histogram', body)
+
+        with override_settings(METRICS_TOKEN='scrape-me'):
+            scraper = APIClient()
+            self.assertEqual(scraper.get('/api/metrics/', headers={'Authorization': 'Bearer scrape-me'}).status_code, 200)
+            self.assertEqual(scraper.get('/api/metrics/', headers={'Authorization': 'Bearer nope'}).status_code, 403)
+
+
+class BenchCommandTests(TestCase):
+    def test_every_route_is_benchmarked_and_compared(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        out, path = StringIO(), os.path.join(tmp.name, 'bench.json')
+        volumes = ['--users', '5', '--posts', '20', '--sessions', '5', '--notes', '10', '--media', '10']
+        call_command('bench', *volumes, '--iterations', '2', '--warmup', '0',
+                     '--format', 'json', '--output', path, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['meta']['uncovered_routes'], [])
+        for name, result in report['endpoints'].items():
+            with self.subTest(endpoint=name):
+                self.assertTrue(all(int(code) < 400 for code in result['status']), result['status'])
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        self.assertFalse(StudyPost.objects.exists())  # seeded data is rolled back
+
+        report['endpoints']['feed']['queries'] = 0
+        with open(path, 'w') as f:
+            json.dump(report, f)
+        with self.assertRaisesMessage(CommandError, 'regression'):
+            call_command('bench', *volumes, '--iterations', '1', '--warmup', '0', '--endpoint', 'feed',
+                         '--baseline', path, stdout=StringIO(), stderr=StringIO())
+
+
+NOTES_ANALYSIS = {
+    'summary': 'Limits describe behaviour near a point.',
+    'key_concepts': ['limit'], 'definitions': [], 'study_tips': [], 'resources': [],
+}
+
+
+@override_settings(AI_JOB_IN_PROCESS=False, AI_JOB_MAX_PENDING=10, AI_JOB_RETRY_BACKOFF=10)
+class AIJobQueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('carol')
+        cls.session = make_session(cls.user)
+
+    def setUp(self):
+        admission.get_buckets().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def generate(self, session=None, messages=None):
+        session = session or self.session
+        messages = messages or [{'userName': 'carol', 'text': 'what is a limit?'}]
+        return self.client.post(f'/api/sessions/{session.id}/generate_notes/', {'messages': messages}, format='json')
+
+    def test_generate_notes_queues_a_pollable_job(self):
+        response = self.generate()
+        self.assertEqual(response.status_code, 202)
+        job = AIJob.objects.get(id=response.data['job_id'])
+        self.assertEqual(job.status, AIJob.QUEUED)
+
+        patch_async_groq(self, content=NOTES_ANALYSIS)
+        self.assertEqual(jobs.run_pending(), 1)
+
+        status = self.client.get(response.data['status_url']).data
+        self.assertEqual(status['status'], AIJob.DONE)
+        note = ConversationNote.objects.get(id=status['result']['note_id'])
+        self.assertEqual(note.content, NOTES_ANALYSIS['summary'])
+        self.assertEqual(note.message_count_analyzed, 1)
+
+    def test_requests_for_a_queued_session_are_deduplicated(self):
+        first = self.generate().data['job_id']
+        second = self.generate(messages=[{'text': 'a'}, {'text': 'b'}]).data['job_id']
+        self.assertEqual(first, second)
+        # The transcript goes to the session's log, not the job
+        self.assertEqual(AIJob.objects.get(id=first).payload, {})
+        self.assertEqual(message_log.count(self.session.id), 2)
+
+    @override_settings(AI_JOB_MAX_PENDING=1)
+    def test_full_queue_rejects_with_retry_after(self):
+        self.generate()
+        other = make_session(self.user, title='Other')
+        response = self.generate(session=other)
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+
+    def test_failures_retry_with_backoff_then_fail(self):
+        job_id = self.generate().data['job_id']
+        patch_async_groq(self, error=RuntimeError('upstream 500'))
+        jobs.run_pending()
+        job = AIJob.objects.get(id=job_id)
+        self.assertEqual((job.status, job.attempts), (AIJob.QUEUED, 1))
+        self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=5))
+        self.assertEqual(jobs.run_pending(), 0)  # not due yet
+
+        for _ in range(2):
+            AIJob.objects.filter(id=job_id).update(run_after=timezone.now())
+            jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (AIJob.FAILED, 3))
+        self.assertIn('upstream 500', job.last_error)
+
+    def test_a_failed_job_hands_over_to_a_newer_queued_one(self):
+        first = self.generate().data['job_id']
+        job = jobs.claim_next()
+        second = self.generate().data['job_id']  # queued while the first runs
+        self.assertNotEqual(first, second)
+
+        patch_async_groq(self, error=RuntimeError('upstream 500'))
+        jobs.run_job(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result), (AIJob.SUPERSEDED, {'superseded_by': second}))
+        self.assertEqual(AIJob.objects.get(id=second).status, AIJob.QUEUED)
+
+    @override_settings(AI_JOB_IN_PROCESS=True)
+    def test_the_in_process_pool_starts_with_the_first_request(self):
+        # Jobs queued before a restart mustn't wait for the next enqueue
+        self.assertIsNone(jobs._pool)  # the test run itself never starts one
+        with mock.patch.object(jobs, '_pool', None), mock.patch.object(jobs, 'WorkerPool') as pool:
+            self.client.get('/api/jobs/')
+            self.client.get('/api/jobs/')
+        pool.return_value.start.assert_called_once_with()
+
+    def test_jobs_abandoned_by_a_dead_worker_are_reclaimed(self):
+        job = jobs.enqueue('notes', {'messages': [{'text': 'x'}]}, session=self.session)
+        AIJob.objects.filter(id=job.id).update(
+            status=AIJob.RUNNING, attempts=1, locked_at=timezone.now() - timedelta(hours=1))
+        claimed = jobs.claim_next()
+        self.assertEqual((claimed.id, claimed.attempts), (job.id, 2))
+        self.assertIsNone(jobs.claim_next())
+
+    def test_jobs_are_private_to_session_members(self):
+        job_id = self.generate().data['job_id']
+        stranger = APIClient()
+        stranger.force_authenticate(User.objects.create_user('mallory'))
+        self.assertEqual(stranger.get(f'/api/jobs/{job_id}/').status_code, 404)
+
+
+class LLMCacheTests(TestCase):
+    exam = {'subject': 'Physics', 'topic': 'Optics', 'gradeLevel': 'Grade 11', 'difficulty': 'Hard'}
+
+    def setUp(self):
+        admission.get_buckets().clear()
+        caches['llm'].clear()
+        llm.response_cache.hits = llm.response_cache.misses = llm.response_cache.coalesced = 0
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('dave'))
+        self.groq = patch_async_groq(self, content={'keyConcepts': ['lens'], 'questions': []})
+
+    def test_identical_exam_requests_hit_the_cache(self):
+        first = self.client.post('/api/exam-prep/', self.exam, format='json')
+        second = self.client.post('/api/exam-prep/', dict(self.exam, topic='  Optics '), format='json')
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(self.groq.calls, 1)
+
+        self.client.post('/api/exam-prep/', dict(self.exam, difficulty='Easy'), format='json')
+        self.assertEqual(self.groq.calls, 2)
+        self.assertEqual(llm.response_cache.stats()['hits'], 1)
+
+    def test_cache_keys_ignore_whitespace_but_not_case(self):
+        key = lambda text: llm.cache_key('m', [{'role': 'user', 'content': text}])
+        self.assertEqual(key('What is  CO?\n'), key('What is CO?'))
+        self.assertNotEqual(key('What is CO?'), key('What is Co?'))
+
+    def test_solver_answers_are_cached(self):
+        self.groq.content = 'x = 2'
+        for _ in range(3):
+            response = self.client.post('/api/exam-prep/solve/', {'question': 'Solve 2x = 4'}, format='json')
+            self.assertEqual(response.json(), {'answer': 'x = 2'})
+        self.assertEqual(self.groq.calls, 1)
+
+    def test_failures_are_not_cached(self):
+        self.groq.content = 'not json'
+        self.assertEqual(self.client.post('/api/exam-prep/', self.exam, format='json').status_code, 500)
+        self.groq.content = {'keyConcepts': [], 'questions': []}
+        self.assertEqual(self.client.post('/api/exam-prep/', self.exam, format='json').status_code, 200)
+
+    def test_concurrent_identical_async_requests_share_one_upstream_call(self):
+        self.groq.content, self.groq.delay = 'shared answer', 0.2
+        messages = [{'role': 'user', 'content': 'Explain diffraction'}]
+
+        async def burst():
+            return await asyncio.gather(*(llm.acached_completion('m', messages) for _ in range(8)))
+
+        self.assertEqual(async_to_sync(burst)(), ['shared answer'] * 8)
+        self.assertEqual(self.groq.calls, 1)
+        self.assertEqual(llm.response_cache.stats()['coalesced'], 7)
+
+    def test_concurrent_identical_requests_share_one_upstream_call(self):
+        def slow_completion(**kwargs):
+            time.sleep(0.2)
+            return fake_completion('shared answer')
+        sync_groq = mock.patch('api.llm.client').start()
+        self.addCleanup(mock.patch.stopall)
+        sync_groq.chat.completions.create.side_effect = slow_completion
+
+        messages = [{'role': 'user', 'content': 'Explain refraction'}]
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(llm.cached_completion('m', messages)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ['shared answer'] * 8)
+        self.assertEqual(sync_groq.chat.completions.create.call_count, 1)
+        self.assertEqual(llm.response_cache.stats()['misses'], 1)
+
+    def test_cached_answers_expire_after_the_ttl(self):
+        messages = [{'role': 'user', 'content': 'Explain polarization'}]
+        sync_groq = mock.patch('api.llm.client').start()
+        self.addCleanup(mock.patch.stopall)
+        sync_groq.chat.completions.create.return_value = fake_completion('sync answer')
+        llm.cached_completion('m', messages)
+        async_to_sync(llm.acached_completion)('m2', messages)
+
+        ttls = llm_cache_ttls()
+        self.assertEqual(len(ttls), 2)
+        for ttl in ttls:
+            self.assertIsNotNone(ttl)
+            self.assertAlmostEqual(ttl, caches['llm'].default_timeout, delta=5)
+
+    def test_stats_are_admin_only(self):
+        self.assertEqual(self.client.get('/api/exam-prep/cache-stats/').status_code, 403)
+        admin = APIClient()
+        admin.force_authenticate(User.objects.create_user('root', is_staff=True))
+        self.assertEqual(set(admin.get('/api/exam-prep/cache-stats/').data), {'hits', 'misses', 'coalesced', 'hit_rate'})
+
+
+class SolverStreamingTests(TestCase):
+    def setUp(self):
+        admission.get_buckets().clear()
+        caches['llm'].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('erin'))
+        self.groq = patch_async_groq(self, tokens=['x ', '= ', '2'])
+
+    def solve(self, stream):
+        return self.client.post('/api/exam-prep/solve/', {'question': 'Solve 2x = 4', 'stream': stream}, format='json')
+
+    def test_server_sent_events(self):
+        response = self.solve('sse')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = read_stream(response)
+        self.assertEqual(body.count('event: token'), 3)
+        self.assertIn('data: {"token": "= "}', body)
+        self.assertTrue(body.endswith('event: done\ndata: {"length": 5}\n\n'))
+
+    def test_ndjson_and_cache_reuse(self):
+        lines = [json.loads(line) for line in read_stream(self.solve('ndjson')).splitlines()]
+        self.assertEqual(''.join(line.get('token', '') for line in lines), 'x = 2')
+        self.assertEqual(lines[-1]['event'], 'done')
+
+        # The streamed answer is now cached for both streaming and plain requests
+        lines = read_stream(self.solve('ndjson')).splitlines()
+        self.assertEqual(json.loads(lines[0]), {'event': 'token', 'token': 'x = 2'})
+        self.assertEqual(self.solve(False).json(), {'answer': 'x = 2'})
+        self.assertEqual(self.groq.calls, 1)
+
+    def test_upstream_errors_end_the_stream_with_an_error_event(self):
+        self.groq.error = RuntimeError('rate limited')
+        body = read_stream(self.solve('sse'))
+        self.assertIn('event: error', body)
+        self.assertIn('rate limited', body)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class SessionEventsTests(TransactionTestCase):
+    # Consumers close the DB connection around each query (database_sync_to_async),
+    # which would end TestCase's wrapping transaction
+    def setUp(self):
+        self.owner = User.objects.create_user('gina')
+        self.guest = User.objects.create_user('hugo')
+        self.session = make_session(self.owner)
+
+    def connect(self, user=None, session_id=None):
+        url = f'/ws/sessions/{session_id or self.session.id}/'
+        if user:
+            url += f'?token={AccessToken.for_user(user)}'
+        return WebsocketCommunicator(application, url, headers=[(b'origin', b'http://localhost:5173')])
+
+    async def assertRejected(self, communicator, code):
+        await communicator.connect()
+        self.assertEqual(await communicator.receive_output(), {'type': 'websocket.close', 'code': code})
+
+    def post(self, user, url):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.post(url)
+
+    async def test_only_members_can_subscribe(self):
+        await self.assertRejected(self.connect(), consumers.UNAUTHORIZED)
+        await self.assertRejected(self.connect(self.guest), consumers.FORBIDDEN)
+        communicator = self.connect(self.owner)
+        self.assertEqual(await communicator.connect(), (True, None))
+        await communicator.send_json_to({'type': 'ping'})
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'pong'})
+        await communicator.disconnect()
+
+    async def test_join_leave_and_end_are_pushed(self):
+        communicator = self.connect(self.owner)
+        await communicator.connect()
+
+        await sync_to_async(self.post)(self.guest, f'/api/study-posts/{self.session.post_id}/join/')
+        self.assertEqual(await communicator.receive_json_from(), {
+            'type': 'join', 'session': self.session.id, 'user': {'id': self.guest.id, 'username': 'hugo'}})
+
+        guest = self.connect(self.guest)
+        self.assertEqual(await guest.connect(), (True, None))
+        await sync_to_async(self.post)(self.guest, f'/api/sessions/{self.session.id}/leave/')
+        self.assertEqual((await communicator.receive_json_from())['type'], 'leave')
+        # The guest hears that they left, then stops listening
+        self.assertEqual((await guest.receive_json_from())['type'], 'leave')
+        self.assertEqual(await guest.receive_output(), {'type': 'websocket.close', 'code': consumers.FORBIDDEN})
+        self.assertTrue(await communicator.receive_nothing())
+
+        await sync_to_async(self.post)(self.owner, f'/api/sessions/{self.session.id}/end_session/')
+        event = await communicator.receive_json_from()
+        self.assertEqual(event['type'], 'end_session')
+        self.assertIn('ended_at', event)
+        self.assertEqual(await communicator.receive_output(),
+                         {'type': 'websocket.close', 'code': consumers.SESSION_ENDED})
+        await communicator.disconnect()
+        await guest.disconnect()
+        self.assertEqual(consumers.connection_slots.total, 0)
+
+    def test_pushes_are_best_effort(self):
+        class BrokenLayer:
+            async def group_send(self, group, message):
+                raise ConnectionError('redis is down')
+        with mock.patch('api.consumers.get_channel_layer', return_value=BrokenLayer()), \
+                self.assertLogs('api.consumers', 'WARNING'):
+            response = self.post(self.guest, f'/api/study-posts/{self.session.post_id}/join/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(self.session.participants.filter(id=self.guest.id).exists())
+
+    async def test_finished_notes_are_pushed(self):
+        patch_async_groq(self, content=NOTES_ANALYSIS)
+        communicator = self.connect(self.owner)
+        await communicator.connect()
+
+        job = await AIJob.objects.acreate(
+            kind='notes', session=self.session, payload={'messages': [{'userName': 'gina', 'text': 'hi'}]})
+        result = await sync_to_async(notes.generate_notes_job)(job)
+        event = await communicator.receive_json_from()
+        self.assertEqual((event['type'], event['job']), ('note_ready', job.id))
+        self.assertEqual(event['note']['id'], result['note_id'])
+        self.assertEqual(event['note']['content'], NOTES_ANALYSIS['summary'])
+        await communicator.disconnect()
+
+    @override_settings(SESSION_WS_MAX_CONNECTIONS=2)
+    async def test_connections_per_session_are_capped(self):
+        first, second = self.connect(self.owner), self.connect(self.owner)
+        await first.connect()
+        await second.connect()
+        await self.assertRejected(self.connect(self.owner), consumers.TOO_MANY_CONNECTIONS)
+
+        await first.disconnect()
+        third = self.connect(self.owner)
+        self.assertEqual(await third.connect(), (True, None))
+        await second.disconnect()
+        await third.disconnect()
+        self.assertEqual(consumers.connection_slots.total, 0)
+
+
+class IncrementalNotesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.session = make_session(User.objects.create_user('frank'))
+
+    def setUp(self):
+        self.groq = patch_async_groq(self)
+
+    def transcript(self, count, text='message'):
+        return [{'userName': 'frank', 'text': f'{text} {i}'} for i in range(count)]
+
+    def prompts(self):
+        return [request['messages'][1]['content'] for request in self.groq.requests]
+
+    def test_only_new_messages_are_sent_with_the_rolling_summary(self):
+        self.groq.content = dict(NOTES_ANALYSIS, summary='first summary', key_concepts=['limit'])
+        notes.analyze_conversation(self.session.id, self.transcript(3))
+
+        self.groq.content = dict(NOTES_ANALYSIS, summary='second summary', key_concepts=['Limit', 'continuity'])
+        messages = self.transcript(5)
+        note = notes.analyze_conversation(self.session.id, messages)
+
+        prompt = self.prompts()[-1]
+        self.assertIn('first summary', prompt)
+        self.assertIn('message 3', prompt)
+        self.assertNotIn('message 2', prompt)
+        self.assertEqual(note.content, 'second summary')
+        self.assertEqual(note.key_concepts, ['limit', 'continuity'])
+        self.assertEqual(note.message_count_analyzed, 5)
+
+        # Nothing new: no upstream call, latest note returned
+        self.assertEqual(notes.analyze_conversation(self.session.id, messages), note)
+        self.assertEqual(self.groq.calls, 2)
+
+    @override_settings(NOTES_CHUNK_CHARS=200)
+    def test_long_backlogs_are_chunked_and_merged(self):
+        self.groq.content = dict(NOTES_ANALYSIS, summary='merged')
+        note = notes.analyze_conversation(self.session.id, self.transcript(30, text='x' * 40))
+
+        chunk_prompts = [p for p in self.prompts() if 'New messages' in p]
+        self.assertGreater(len(chunk_prompts), 1)
+        self.assertTrue(all(len(p) < 1000 for p in chunk_prompts))
+        self.assertEqual(len(self.prompts()), len(chunk_prompts) + 1)  # + one merge call
+        self.assertEqual(note.message_count_analyzed, 30)
+
+    def test_split_transcript_cuts_oversized_messages(self):
+        chunks = notes.split_transcript([{'userName': 'a', 'text': 'y' * 250}], max_chars=100)
+        self.assertEqual([len(c) for c in chunks], [100, 100, 53])
+
+
+@override_settings(MESSAGE_LOG_CHUNK_MESSAGES=4)
+class MessageLogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('ivan')
+        cls.session = make_session(cls.user)
+
+    def setUp(self):
+        admission.get_buckets().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/sessions/{self.session.id}/messages/'
+
+    def batch(self, first, count):
+        return [{'userName': 'ivan', 'text': f'message {i}'} for i in range(first, first + count)]
+
+    def append(self, messages, **extra):
+        return self.client.post(self.url, {'messages': messages, **extra}, format='json')
+
+    def test_appends_fill_compressed_chunks(self):
+        self.assertEqual(self.append(self.batch(0, 3)).data, {'count': 3})
+        self.assertEqual(self.append(self.batch(3, 6)).data, {'count': 9})
+
+        chunks = list(SessionMessageChunk.objects.filter(session=self.session))
+        self.assertEqual([(c.first_index, c.message_count) for c in chunks], [(0, 4), (4, 4), (8, 1)])
+        self.assertLess(len(chunks[0].data), chunks[0].raw_size)
+
+        response = self.client.get(self.url, {'start': 3, 'limit': 3})
+        self.assertEqual(response.data['count'], 9)
+        self.assertEqual([m['text'] for m in response.data['messages']], ['message 3', 'message 4', 'message 5'])
+        self.assertEqual(message_log.read(self.session.id), self.batch(0, 9))
+
+    def test_retries_with_start_are_idempotent(self):
+        self.append(self.batch(0, 3), start=0)
+        # The response to this one was lost, so the client sends it again with more
+        self.append(self.batch(3, 2), start=3)
+        self.assertEqual(self.append(self.batch(3, 4), start=3).data, {'count': 7})
+        self.assertEqual(message_log.read(self.session.id), self.batch(0, 7))
+
+        response = self.append(self.batch(10, 1), start=10)
+        self.assertEqual((response.status_code, response.data['count']), (409, 7))
+
+    def test_notes_read_the_log(self):
+        self.append(self.batch(0, 5))
+        response = self.client.post(f'/api/sessions/{self.session.id}/generate_notes/', {}, format='json')
+        self.assertEqual(response.status_code, 202)
+
+        groq = patch_async_groq(self, content=NOTES_ANALYSIS)
+        jobs.run_pending()
+        self.assertIn('message 4', groq.requests[0]['messages'][1]['content'])
+        self.assertEqual(self.session.ai_notes.get().message_count_analyzed, 5)
+
+    def test_generate_notes_needs_messages(self):
+        response = self.client.post(f'/api/sessions/{self.session.id}/generate_notes/', {}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_legacy_transcripts_may_have_messages_without_text(self):
+        messages = [{'userName': 'a', 'imageUrl': 'x'}, {'userName': 'b', 'text': 'hi'}]
+        response = self.client.post(f'/api/sessions/{self.session.id}/generate_notes/', {'messages': messages},
+                                    format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual([m['text'] for m in message_log.read(self.session.id)], ['', 'hi'])
+
+    def test_export_is_a_text_transcript(self):
+        self.append(self.batch(0, 2))
+        response = self.client.get(f'/api/sessions/{self.session.id}/export/')
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertEqual(response.content.decode(), 'ivan: message 0\nivan: message 1\n')
+
+    def test_log_is_private_and_closes_with_the_session(self):
+        stranger = APIClient()
+        stranger.force_authenticate(User.objects.create_user('judy'))
+        self.assertEqual(stranger.get(self.url).status_code, 404)
+        self.assertEqual(stranger.post(self.url, {'messages': self.batch(0, 1)}, format='json').status_code, 404)
+
+        self.session.end_session()
+        self.assertEqual(self.append(self.batch(0, 1)).status_code, 400)
+
+
+@override_settings(AI_ADMISSION=False)  # 25 concurrent solves from one user
+class AsyncLLMViewTests(TestCase):
+    """LLM-bound endpoints await upstream on the event loop instead of holding a worker."""
+    llm_delay = 0.5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('grace')
+        cls.auth = {'Authorization': f'Bearer {RefreshToken.for_user(cls.user).access_token}'}
+
+    def setUp(self):
+        admission.get_buckets().clear()
+        caches['llm'].clear()
+        self.groq = patch_async_groq(self, content='42', delay=self.llm_delay)
+
+    async def solve(self, question):
+        return await self.async_client.post(
+            '/api/exam-prep/solve/', {'question': question},
+            content_type='application/json', headers=self.auth)
+
+    async def test_cheap_endpoints_stay_fast_while_llm_calls_are_in_flight(self):
+        started = time.perf_counter()
+        llm_calls = [asyncio.ensure_future(self.solve(f'Question {i}')) for i in range(25)]
+        await asyncio.sleep(0.05)  # let them all reach the upstream await
+
+        ping_started = time.perf_counter()
+        ping = await self.async_client.get('/api/ping/')
+        ping_latency = time.perf_counter() - ping_started
+        self.assertEqual(ping.status_code, 200)
+        self.assertFalse(any(call.done() for call in llm_calls))
+        self.assertLess(ping_latency, self.llm_delay / 2)
+
+        responses = await asyncio.gather(*llm_calls)
+        self.assertTrue(all(r.status_code == 200 for r in responses))
+        # 25 x 0.5s upstream calls overlapped rather than queueing behind each other
+        self.assertLess(time.perf_counter() - started, self.llm_delay * 4)
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.post('/api/exam-prep/solve/', {'question': 'q'}, content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.get('/api/exam-prep/', headers=self.auth)
+        self.assertEqual(response.status_code, 405)
+
+    async def test_handled_like_any_drf_view(self):
+        self.groq.delay = 0
+        # Content negotiation: MessagePack in and out
+        response = await self.async_client.post(
+            '/api/exam-prep/solve/', msgpack.packb({'question': '6 x 7?'}),
+            content_type='application/msgpack', headers=dict(self.auth, Accept='application/msgpack'))
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content), {'answer': '42'})
+
+        # Errors go through DRF's exception handler
+        response = await self.async_client.post(
+            '/api/exam-prep/solve/', b'{"question": ', content_type='application/json', headers=self.auth)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('detail', response.json())
+        with mock.patch.object(admission, 'reserve', side_effect=admission.Rejected(wait=2.5)):
+            response = await self.async_client.post(
+                '/api/userprofile/upload_media/', {'fileUrl': 'https://cdn.example.com/a.png', 'category': 'note'},
+                content_type='application/json', headers=self.auth)
+        self.assertEqual((response.status_code, response['Retry-After']), (429, '3'))
+
+    @override_settings(AI_JOB_IN_PROCESS=False)
+    async def test_certificate_upload_returns_before_the_analysis(self):
+        self.groq.delay = 0
+        self.groq.content = {'certificates': [{'index': 0, 'title': 'AWS Cloud Practitioner', 'issuer': 'AWS', 'skills': ['cloud']}]}
+        response = await self.async_client.post(
+            '/api/userprofile/upload_media/',
+            {'fileUrl': 'https://cdn.example.com/cert.png', 'category': 'certificate', 'aiAnalysisText': 'AWS cert'},
+            content_type='application/json', headers=self.auth)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['analysis_status'], 'pending')
+        self.assertEqual(self.groq.calls, 0)
+
+        await sync_to_async(jobs.run_pending)()
+        media = await UserMedia.objects.aget(id=response.json()['id'])
+        self.assertEqual((media.title, media.issuer, media.skills), ('AWS Cloud Practitioner', 'AWS', ['cloud']))
+        self.assertEqual(media.analysis_status, 'done')
+
+
+@override_settings(AI_JOB_IN_PROCESS=False)
+class ModelRoutingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('hana')
+        cls.auth = {'Authorization': f'Bearer {RefreshToken.for_user(cls.user).access_token}'}
+
+    def setUp(self):
+        admission.get_buckets().clear()
+        caches['llm'].clear()
+        metrics.registry.reset()
+        self.groq = patch_async_groq(self, content='42')
+
+    def solve(self, question):
+        return self.client.post('/api/exam-prep/solve/', {'question': question},
+                                content_type='application/json', headers=self.auth)
+
+    def models_called(self):
+        return [request['model'] for request in self.groq.requests]
+
+    def test_short_questions_go_to_the_small_model_and_long_ones_to_the_large(self):
+        self.assertEqual(self.solve('What is 6 x 7?').json(), {'answer': '42'})
+        self.solve('Prove that the sequence converges. ' * 40)
+        self.assertEqual(self.models_called(), ['llama-3.1-8b-instant', 'llama-3.3-70b-versatile'])
+
+    def test_study_guides_always_use_the_large_model(self):
+        self.groq.content = {'keyConcepts': ['limits'], 'questions': []}
+        response = self.client.post('/api/exam-prep/', {'subject': 'Maths', 'topic': 'Limits', 'gradeLevel': '11'},
+                                    content_type='application/json', headers=self.auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.models_called(), ['llama-3.3-70b-versatile'])
+
+    def test_invalid_json_from_the_small_model_falls_back_to_the_large(self):
+        good = {'certificates': [{'index': 0, 'title': 'AWS', 'issuer': 'AWS', 'skills': []}]}
+        self.groq.content = lambda request: good if request['model'] == 'llama-3.3-70b-versatile' else '{"certif'
+        (certificate,), _ = media.create_media(self.user, [
+            {'file_url': 'https://x/c.png', 'category': 'certificate', 'analysis_text': 'AWS cert'}])
+        jobs.run_pending()
+        certificate.refresh_from_db()
+        self.assertEqual((certificate.title, certificate.analysis_status), ('AWS', 'done'))
+        self.assertEqual(self.models_called(), ['llama-3.1-8b-instant', 'llama-3.3-70b-versatile'])
+
+        exposition = metrics.registry.exposition()
+        self.assertIn('llm_requests_total{task="certificates",tier="small",outcome="invalid"} 1', exposition)
+        self.assertIn('llm_requests_total{task="certificates",tier="large",outcome="ok"} 1', exposition)
+        self.assertIn('llm_tokens_total{task="certificates",tier="small",kind="prompt"} 100', exposition)
+
+    def test_missing_keys_count_as_invalid(self):
+        parse = model_router.json_object('summary')
+        self.assertEqual(parse('{"summary": "s"}'), {'summary': 's'})
+        for content in ('[]', '{"other": 1}', 'not json'):
+            with self.assertRaises(model_router.InvalidOutput):
+                parse(content)
+
+    @override_settings(LLM_ROUTING=False)
+    def test_routing_can_be_switched_off(self):
+        self.solve('What is 6 x 7?')
+        self.assertEqual(self.models_called(), ['llama-3.3-70b-versatile'])
+
+    def test_routed_answers_expire_after_the_ttl(self):
+        self.solve('What is 6 x 7?')
+        (ttl,) = llm_cache_ttls()
+        self.assertIsNotNone(ttl)
+        self.assertAlmostEqual(ttl, caches['llm'].default_timeout, delta=5)
+
+    def test_streamed_answers_are_recorded_per_tier(self):
+        self.groq.tokens = ['4', '2']
+        response = self.client.post('/api/exam-prep/solve/', {'question': '6 x 7?', 'stream': 'ndjson'},
+                                    content_type='application/json', headers=self.auth)
+        read_stream(response)
+        self.assertEqual(self.models_called(), ['llama-3.1-8b-instant'])
+        self.assertIn('llm_requests_total{task="solve",tier="small",outcome="ok"} 1', metrics.registry.exposition())
+
+
+@override_settings(AI_JOB_IN_PROCESS=False, AI_USER_RATE=600, AI_USER_BURST=2,
+                   AI_GLOBAL_RATE=6000, AI_GLOBAL_BURST=100, AI_ADMISSION_MAX_WAIT=0.5)
+class AdmissionControlTests(TestCase):
+    """Token buckets in front of the AI endpoints: short bursts queue, floods get 429."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('ivy')
+        cls.other = User.objects.create_user('jon')
+        cls.session = make_session(cls.user)
+
+    def setUp(self):
+        caches['llm'].clear()
+        admission.get_buckets().clear()
+        metrics.registry.reset()
+        self.groq = patch_async_groq(self, content='42')
+
+    def solve(self, user, question='6 x 7?'):
+        return self.client.post('/api/exam-prep/solve/', {'question': question}, content_type='application/json',
+                                headers={'Authorization': f'Bearer {AccessToken.for_user(user)}'})
+
+    def test_bursts_queue_briefly_instead_of_failing(self):
+        started = time.perf_counter()
+        responses = [self.solve(self.user, f'q{i}') for i in range(4)]
+        self.assertEqual([r.status_code for r in responses], [200] * 4)
+        # 2 from the burst, then one token every 0.1s
+        self.assertGreater(time.perf_counter() - started, 0.15)
+        exposition = metrics.registry.exposition()
+        self.assertIn('ai_admission_total{outcome="admitted"} 2', exposition)
+        self.assertIn('ai_admission_total{outcome="queued"} 2', exposition)
+
+    @override_settings(AI_USER_RATE=6)
+    def test_floods_are_rejected_with_retry_after(self):
+        self.assertEqual([self.solve(self.user, f'q{i}').status_code for i in range(2)], [200, 200])
+        response = self.solve(self.user)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '10')  # one token per 10s
+        self.assertEqual(self.groq.calls, 2)
+
+        # Other users have their own bucket
+        self.assertEqual(self.solve(self.other).status_code, 200)
+
+        # DRF endpoints answer the same way
+        api = APIClient()
+        api.force_authenticate(self.user)
+        response = api.post(f'/api/sessions/{self.session.id}/generate_notes/',
+                            {'messages': [{'userName': 'ivy', 'text': 'hi'}]}, format='json')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '10')
+        self.assertFalse(AIJob.objects.exists())
+
+    def test_sync_views_reject_instead_of_waiting(self):
+        # They share one thread under ASGI; a sleep there would stall every other sync request
+        api = APIClient()
+        api.force_authenticate(self.user)
+
+        def generate():
+            return api.post(f'/api/sessions/{self.session.id}/generate_notes/',
+                            {'messages': [{'userName': 'ivy', 'text': 'hi'}]}, format='json')
+        self.assertEqual([generate().status_code for _ in range(2)], [202, 202])
+        response = generate()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')  # the next token is 0.1s away
+        self.assertIn('ai_admission_total{outcome="rejected"} 1', metrics.registry.exposition())
+
+    @override_settings(AI_USER_RATE=6)
+    def test_cached_answers_are_served_while_the_bucket_is_empty(self):
+        self.assertEqual([self.solve(self.user, f'q{i}').status_code for i in range(2)], [200, 200])
+        self.assertEqual(self.solve(self.user, 'q2').status_code, 429)
+
+        # Classmates asking the same questions aren't limited, whether streamed or not
+        for user in (self.user, self.other):
+            self.assertEqual(self.solve(user, 'q0').json(), {'answer': '42'})
+        streamed = self.client.post('/api/exam-prep/solve/', {'question': 'q1', 'stream': 'ndjson'},
+                                    content_type='application/json',
+                                    headers={'Authorization': f'Bearer {AccessToken.for_user(self.user)}'})
+        self.assertEqual(streamed.status_code, 200)
+        self.assertIn('"token": "42"', read_stream(streamed))
+        self.assertEqual(self.groq.calls, 2)
+        self.assertIn('ai_admission_total{outcome="rejected"} 1', metrics.registry.exposition())
+
+    @override_settings(AI_USER_BURST=10, AI_GLOBAL_RATE=6, AI_GLOBAL_BURST=3)
+    def test_the_global_bucket_is_shared_by_all_users(self):
+        statuses = [self.solve(user, f'q{i}').status_code for i, user in enumerate([self.user, self.other] * 2)]
+        self.assertEqual(statuses, [200, 200, 200, 429])
+
+    def test_uploads_without_ai_work_are_free(self):
+        api = APIClient()
+        api.force_authenticate(self.user)
+        items = [{'fileUrl': f'https://cdn.example.com/{i}.png', 'category': 'note'} for i in range(3)]
+        for _ in range(5):
+            self.assertEqual(api.post('/api/userprofile/upload_media/bulk/', items, format='json').status_code, 201)
+        certificates = [{'fileUrl': f'https://cdn.example.com/{i}.png', 'category': 'certificate', 'aiAnalysisText': 'cert'}
+                        for i in range(20)]
+        with override_settings(CERTIFICATE_BATCH_SIZE=8, AI_USER_RATE=6, AI_USER_BURST=3):
+            # 3 batches: fits the burst
+            self.assertEqual(api.post('/api/userprofile/upload_media/bulk/', certificates, format='json').status_code, 202)
+            self.assertEqual(api.post('/api/userprofile/upload_media/bulk/', certificates, format='json').status_code, 429)
+
+    def test_reservations_are_served_in_order(self):
+        buckets, spec = admission.MemoryBuckets(), [('k', 1.0, 2)]
+        self.assertEqual(buckets.reserve(spec, 1, 5, now=100.0), (True, 0.0))
+        self.assertEqual(buckets.reserve(spec, 1, 5, now=100.0), (True, 0.0))
+        self.assertEqual(buckets.reserve(spec, 1, 5, now=100.0), (True, 1.0))
+        self.assertEqual(buckets.reserve(spec, 1, 5, now=100.0), (True, 2.0))
+        self.assertEqual(buckets.reserve(spec, 1, 1, now=100.0), (False, 3.0))
+        self.assertEqual(buckets.reserve(spec, 1, 5, now=104.0), (True, 0.0))
+        # A cost larger than the burst only ever takes the whole burst
+        self.assertEqual(buckets.reserve(spec, 10, 5, now=200.0), (True, 0.0))
+
+    @unittest.skipUnless(os.getenv('TEST_REDIS_URL'), 'set TEST_REDIS_URL to test the Redis buckets')
+    def test_redis_buckets_match_the_in_memory_ones(self):
+        buckets, spec = admission.RedisBuckets(os.environ['TEST_REDIS_URL']), [('ai-admission:test', 1.0, 2)]
+        buckets.clear()
+        results = [buckets.reserve(spec, 1, 1, now=100.0) for _ in range(4)]
+        self.assertEqual(results, [(True, 0.0), (True, 0.0), (True, 1.0), (False, 2.0)])
+
+    def test_unreachable_redis_admits(self):
+        with mock.patch.object(admission, '_buckets', admission.RedisBuckets('redis://127.0.0.1:1/0')), \
+                self.assertLogs('api.admission', 'WARNING'):
+            self.assertEqual(self.solve(self.user).status_code, 200)
+
+
+@override_settings(AI_JOB_IN_PROCESS=False, CERTIFICATE_BATCH_SIZE=2, MEDIA_BULK_MAX_ITEMS=5)
+class BulkMediaUploadTests(TestCase):
+    url = '/api/userprofile/upload_media/bulk/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('iris')
+
+    def setUp(self):
+        admission.get_buckets().clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.groq = patch_async_groq(self, content={'certificates': [
+            {'index': 0, 'title': 'Cert A', 'issuer': 'Org', 'skills': ['a']},
+            {'index': 1, 'title': 'Cert B', 'issuer': 'Org', 'skills': ['b']},
+        ]})
+
+    def certificate(self, text):
+        return {'fileUrl': f'https://cdn.example.com/{len(text)}.png', 'category': 'certificate', 'aiAnalysisText': text}
+
+    def upload(self, items):
+        return self.client.post(self.url, {'items': items}, format='json')
+
+    def statuses(self):
+        return list(UserMedia.objects.order_by('id').values_list('title', 'analysis_status'))
+
+    def test_items_are_inserted_at_once_and_certificates_analyzed_in_batches(self):
+        items = [self.certificate('one'), self.certificate('three'), self.certificate('fivee'),
+                 {'file_url': 'https://cdn.example.com/c.png', 'category': 'certificate'},
+                 {'file_url': 'https://cdn.example.com/n.pdf', 'category': 'note', 'is_public': False}]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.upload(items)
+        self.assertEqual(response.status_code, 202)
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "api_usermedia"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(len(response.data['job_ids']), 2)  # 3 certificates in batches of 2
+        self.assertEqual([item['analysis_status'] for item in response.data['results']],
+                         ['pending', 'pending', 'pending', 'none', 'none'])
+        self.assertEqual(self.groq.calls, 0)
+
+        self.assertEqual(jobs.run_pending(), 2)
+        self.assertEqual(self.groq.calls, 2)
+        self.assertIn('[1] three', self.groq.requests[0]['messages'][1]['content'])
+        self.assertEqual(self.statuses(), [('Cert A', 'done'), ('Cert B', 'done'), ('Cert A', 'done'),
+                                           ('New Note', 'none'), ('New Note', 'none')])
+
+        me = self.client.get('/api/userprofile/me/').data
+        self.assertEqual({m['analysis_status'] for m in me['portfolio_media']}, {'done', 'none'})
+
+    def test_certificates_missing_from_the_answer_are_marked_failed(self):
+        self.groq.content = {'certificates': [{'index': 1, 'title': 'Cert B'}]}
+        self.upload([self.certificate('one'), self.certificate('two')])
+        jobs.run_pending()
+        self.assertEqual(self.statuses(), [('Certificate (AI Error)', 'failed'), ('Cert B', 'done')])
+
+    @override_settings(AI_JOB_RETRY_BACKOFF=0)
+    def test_upstream_failures_are_retried_then_marked_failed(self):
+        self.groq.error = RuntimeError('upstream 500')
+        job_id = self.upload([self.certificate('one')]).data['job_ids'][0]
+        with self.assertLogs('api.jobs', 'WARNING'):
+            jobs.run_pending()
+        self.assertEqual(self.groq.calls, 3)
+        self.assertEqual(AIJob.objects.get(id=job_id).status, AIJob.FAILED)
+        self.assertEqual(self.statuses(), [('Certificate (AI Error)', 'failed')])
+
+    def test_invalid_requests_create_nothing(self):
+        self.assertEqual(self.upload([self.certificate('x')] * 6).status_code, 400)
+        response = self.upload([self.certificate('x'), {'file_url': 'not a url', 'category': 'note'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('file_url', response.data[1])
+        self.assertEqual(self.upload([]).status_code, 400)
+        self.assertFalse(UserMedia.objects.exists())
+        self.assertFalse(AIJob.objects.exists())
+
+
+class UserProfileMediaTests(QueryBudgetMixin, TestCase):
+    # COUNT + profiles with users + visible media, however many profiles
+    query_budgets = {
+        'list': ('get', '/api/userprofile/', 3),
+        'detail': ('get', '/api/userprofile/owner5/', 2),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(12):
+            user = User.objects.create_user(f'owner{i}')
+            UserProfile.objects.create(user=user)
+            UserMedia.objects.create(user=user, file_url='https://x.test/a', category='note', title='public')
+            UserMedia.objects.create(user=user, file_url='https://x.test/b', category='note', title='private',
+                                     is_public=False)
+        cls.viewer = User.objects.get(username='owner0')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def test_endpoints_stay_within_budget(self):
+        self.assertQueryBudgets()
+
+    def test_private_media_is_only_visible_to_its_owner(self):
+        profiles = {p['user']['username']: p for p in self.client.get('/api/userprofile/').data['results']}
+        self.assertEqual({m['title'] for m in profiles['owner0']['portfolio_media']}, {'public', 'private'})
+        self.assertEqual([m['title'] for m in profiles['owner1']['portfolio_media']], ['public'])
+        response = self.client.get('/api/userprofile/owner3/')
+        self.assertEqual([m['title'] for m in response.data['portfolio_media']], ['public'])
+
+
+class StudyPostJoinTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('henry')
+        cls.post = StudyPost.objects.create(user=cls.owner, title='Stats', topic='t', description='d', subject='s')
+        cls.users = [User.objects.create_user(f'joiner{i}') for i in range(6)]
+
+    # post, lock session, conditional insert, participants (+ savepoints in tests);
+    # the first join also creates the session
+    def join(self, user, budget=6):
+        client = APIClient()
+        client.force_authenticate(user)
+        return self.assertWithinQueryBudget(budget, 'post', f'/api/study-posts/{self.post.id}/join/', client=client)
+
+    def test_first_join_opens_the_session_with_owner_and_joiner(self):
+        response = self.join(self.users[0], budget=10)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({p['username'] for p in response.data['participants']}, {'henry', 'joiner0'})
+
+    def test_joining_twice_is_idempotent_and_the_cap_holds(self):
+        self.join(self.users[0], budget=10)
+        for user in self.users[1:4]:
+            self.assertEqual(self.join(user).status_code, 200)
+        self.assertEqual(self.join(self.users[0], budget=7).status_code, 200)  # already in, not "Full"
+        self.assertEqual(self.join(self.users[4]).data, {'error': 'Full'})
+        session = StudySession.objects.get(post=self.post, is_active=True)
+        self.assertEqual(session.participants.count(), StudySession.MAX_PARTICIPANTS)
+
+    def test_only_one_active_session_per_post(self):
+        self.join(self.users[0], budget=10)
+        with self.assertRaises(IntegrityError):
+            StudySession.objects.create(post=self.post, creator=self.owner, firestore_chat_id='dup')
+
+
+class StudyPostJoinStressTests(TransactionTestCase):
+    """Concurrent joins from many threads (each on its own DB connection)."""
+    threads = 16
+
+    def setUp(self):
+        self.owner = User.objects.create_user('ivy')
+        self.users = [User.objects.create_user(f'racer{i}') for i in range(self.threads * 2)]
+
+    def run_joins(self, post_ids):
+        barrier = threading.Barrier(self.threads)
+        results, errors = [], []
+
+        def worker(index):
+            client = APIClient()
+            client.force_authenticate(self.users[index])
+            barrier.wait()
+            try:
+                for post_id in post_ids:
+                    results.append(client.post(f'/api/study-posts/{post_id}/join/').status_code)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                close_old_connections()
+
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return results, errors
+
+    def test_cap_and_single_session_hold_under_a_burst(self):
+        posts = [
+            StudyPost.objects.create(user=self.owner, title=f'Race {i}', topic='t', description='d', subject='s')
+            for i in range(10)
+        ]
+        results, errors = self.run_joins([p.id for p in posts])
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(results), self.threads * len(posts))
+        for post in posts:
+            sessions = StudySession.objects.filter(post=post, is_active=True)
+            self.assertEqual(sessions.count(), 1)
+            self.assertEqual(sessions.get().participants.count(), StudySession.MAX_PARTICIPANTS)
+        # owner + 4 joiners per post got in, everyone else was turned away
+        self.assertEqual(results.count(200), 4 * len(posts))
+
+    def test_bench_join_measures_throughput_and_cleans_up(self):
+        out = StringIO()
+        call_command('bench_join', '--threads', '4', '--posts', '2', stdout=out)
+        self.assertRegex(out.getvalue(), r'8 joins over 4 threads in .* joins/s \(8 x 200\)')
+        self.assertFalse(User.objects.filter(username__startswith='bench_join_').exists())
+        self.assertFalse(StudyPostVector.objects.exists())
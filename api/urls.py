@@ -6,13 +6,18 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 
+from . import metrics
 from .views import (
     RegisterView,
     StudyPostViewSet,
     StudySessionViewSet,
     ConversationNoteViewSet,
     UserProfileViewSet,
+    AIJobViewSet,
     ExamPrepView,
+    UploadMediaView,
+    LLMCacheStatsView,
+    FeedCacheStatsView,
 )
 
 router = DefaultRouter()
@@ -20,13 +25,19 @@ router.register(r'study-posts', StudyPostViewSet, basename='studypost')
 router.register(r'sessions', StudySessionViewSet, basename='session')
 router.register(r'notes', ConversationNoteViewSet, basename='note')
 router.register(r'userprofile', UserProfileViewSet, basename='userprofile')
+router.register(r'jobs', AIJobViewSet, basename='aijob')
 
 urlpatterns = [
     path('ping/', lambda r: HttpResponse("OK"), name='check'), #to keep render server awake
+    path('metrics/', metrics.metrics_view, name='metrics'),
     path('auth/register/', RegisterView.as_view(), name='register'),
     path('auth/login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('auth/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    # LLM-bound endpoints are async so slow completions don't pin a worker
     path('exam-prep/', ExamPrepView.as_view(), name='exam-prep-base'),
     path('exam-prep/solve/', ExamPrepView.as_view(http_method_names=['post']), name='exam-solve'),
+    path('userprofile/upload_media/', UploadMediaView.as_view(), name='userprofile-upload-media'),
+    path('exam-prep/cache-stats/', LLMCacheStatsView.as_view(), name='exam-cache-stats'),
+    path('study-posts/cache-stats/', FeedCacheStatsView.as_view(), name='feed-cache-stats'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
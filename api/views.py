@@ -1,84 +1,36 @@
-import json
-import uuid
-import threading
-from groq import Groq
 from django.conf import settings
-from django.db import models as django_models
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.db import models as django_models, transaction
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
+from rest_framework.reverse import reverse
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, IsAuthenticatedOrReadOnly
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from .models import StudyPost, StudySession, ConversationNote, UserProfile, UserMedia
+from . import admission, interests, jobs, media, message_log, similarity
+# The LLM-bound views are async (api/async_views.py)
+from .async_views import ExamPrepView, UploadMediaView  # noqa: F401
+from .consumers import broadcast_session_event, revoke_session_access
+from .feed_cache import FeedCacheMixin, feed_cache
+from .fieldsets import FULL, SelectableFieldsViewMixin
+from .llm import response_cache
+from .notes import format_message
+from .pagination import CreatedAtKeysetPagination, StartedAtKeysetPagination
+from .search import fulltext_search, substring_search
+from .models import StudyPost, StudySession, ConversationNote, UserProfile, UserMedia, AIJob
 from .serializers import (
     StudyPostSerializer, StudySessionSerializer,
     ConversationNoteSerializer, UserProfileSerializer, 
-    RegisterSerializer, UserSerializer, UserMediaSerializer
+    RegisterSerializer, UserSerializer, UserMediaSerializer, MediaUploadSerializer, AIJobSerializer,
+    SessionMessageSerializer, MessageAppendSerializer, UserSummarySerializer, StudyPostSummarySerializer,
 )
 
-client = Groq(api_key=settings.GROQ_API_KEY)
-
-# --- THE BACKGROUND WORKER FUNCTION (REPLACES TASKS.PY) ---
-def analyze_conversation_thread(session_id, messages):
-    try:
-        session = StudySession.objects.get(id=session_id)
-        
-        # Format conversation exactly like tasks.py
-        conversation_text = "\n".join([
-            f"{msg.get('userName', 'User')}: {msg.get('text', '')}"
-            for msg in messages
-        ])
-
-        prompt = f"""Analyze this study conversation and extract key learning points.
-        
-        Conversation:
-        {conversation_text}
-
-        Return exactly a JSON object with:
-        1. key_concepts (list)
-        2. definitions (list of {{'term': '...', 'definition': '...'}})
-        3. study_tips (list)
-        4. resources (list)
-        5. summary (string)
-        """
-
-        completion = client.chat.completions.create(
-            model="llama-3.3-70b-versatile", 
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that outputs only valid JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            response_format={"type": "json_object"},
-            temperature=0.5,
-            max_tokens=2048,
-        )
-        
-        analysis = json.loads(completion.choices[0].message.content)
-
-        # Create the note using all fields from the original tasks.py
-        ConversationNote.objects.create(
-            session=session,
-            content=analysis.get('summary', 'No summary provided'),
-            key_concepts=analysis.get('key_concepts', []),
-            definitions=analysis.get('definitions', []),
-            study_tips=analysis.get('study_tips', []),
-            resources_mentioned=analysis.get('resources', []), # Assumed field name
-            message_count_analyzed=len(messages)
-        )
-        
-        # Update session metadata
-        session.last_ai_analysis = timezone.now()
-        session.save()
-        print(f"✅ Success: Note generated for Session {session_id}")
-        
-    except Exception as e:
-        print(f"❌ Threading AI Error: {str(e)}")
-
-
 # --- VIEWS ---
 
 class RegisterView(APIView):
@@ -96,7 +48,7 @@ class RegisterView(APIView):
             }, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class UserProfileViewSet(viewsets.ModelViewSet):
+class UserProfileViewSet(SelectableFieldsViewMixin, viewsets.ModelViewSet):
     queryset = UserProfile.objects.all()
     serializer_class = UserProfileSerializer
     # 1. Allow looking up by username (matches your profileAPI.getProfile(username))
@@ -104,10 +56,23 @@ class UserProfileViewSet(viewsets.ModelViewSet):
     
     # 2. Allow any logged in user to VIEW profiles, but keep restrictions on editing
     permission_classes = [IsAuthenticated]
+    compact_actions = ('list', 'matches')
 
     def get_queryset(self):
-        # Allow viewing ALL profiles so you can see others
-        return UserProfile.objects.all()
+        # Allow viewing ALL profiles so you can see others.
+        # Users and portfolio media come back in 2 queries for the whole page;
+        # the privacy rule (others only see public items) is applied in SQL.
+        selection = self.get_selection()
+        queryset = UserProfile.objects.all()
+        if selection.includes('user') or selection.includes('portfolio_media'):
+            queryset = queryset.select_related('user')
+        if selection.includes('portfolio_media'):
+            visible_media = UserMedia.objects.filter(
+                django_models.Q(is_public=True) | django_models.Q(user=self.request.user))
+            queryset = queryset.prefetch_related(
+                django_models.Prefetch('user__portfolio_media', queryset=visible_media, to_attr='visible_media')
+            )
+        return queryset
 
     @action(detail=False, methods=['get', 'post'])
     def me(self, request):
@@ -120,85 +85,187 @@ class UserProfileViewSet(viewsets.ModelViewSet):
                 return Response(serializer.data)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         return Response(self.get_serializer(profile).data)
-    @action(detail=False, methods=['post'])
-    def upload_media(self, request):
-        file_url = request.data.get('fileUrl') or request.data.get('file_url')
-        category = request.data.get('category')
-        raw_text = request.data.get('aiAnalysisText', '').strip()
-        is_public = request.data.get('is_public', True)
-        if not file_url: return Response({"error": "No URL provided"}, status=400)
-
-        media_obj = UserMedia.objects.create(
-            user=request.user, file_url=file_url, category=category, is_public=is_public,
-            title="Processing..." if category == 'certificate' else "New Note"
-        )
-
-        if category == 'certificate' and raw_text:
-            try:
-                completion = client.chat.completions.create(
-                    model="llama-3.3-70b-versatile",
-                    messages=[
-                        {"role": "system", "content": "You are a helpful assistant that outputs only JSON."},
-                        {"role": "user", "content": f"Analyze: '{raw_text}'. Return JSON with 'title', 'issuer', 'skills' (list)."}
-                    ],
-                    response_format={"type": "json_object"}
-                )
-                ai_data = json.loads(completion.choices[0].message.content)
-                media_obj.title = ai_data.get('title') or "Verified Certificate"
-                media_obj.issuer = ai_data.get('issuer') or "Verified Issuer"
-                media_obj.skills = ai_data.get('skills') or []
-                media_obj.save()
-            except:
-                media_obj.title = "Certificate (AI Error)"; media_obj.save()
-        
-        return Response(UserMediaSerializer(media_obj).data, status=201)
+    # upload_media is async: UploadMediaView in async_views.py (POST /api/userprofile/upload_media/)
+
+    @action(detail=False, methods=['get'])
+    def matches(self, request):
+        """Study partners (?type=users, the default) or active posts (?type=posts) sharing the most interests"""
+        limit = _limit_param(request)
+        if request.query_params.get('type') == 'posts':
+            ranking = {post_id: {'score': score, 'shared': shared}
+                       for post_id, score, shared in interests.matching_posts(request.user, limit)}
+            return Response({'results': ranked_posts(ranking, self.get_serializer_context())})
+        return Response({'results': interests.matching_users(request.user, limit)})
+
+    @action(detail=False, methods=['post'], url_path='upload_media/bulk')
+    def upload_media_bulk(self, request):
+        """Add many portfolio items at once; certificates are read by the AI in the background"""
+        items = request.data.get('items') if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'Provide a non-empty list of items'}, status=400)
+        limit = getattr(settings, 'MEDIA_BULK_MAX_ITEMS', 50)
+        if len(items) > limit:
+            return Response({'error': f'At most {limit} items per request'}, status=400)
+
+        serializer = MediaUploadSerializer(data=items, many=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+        admission.admit(request.user, cost=media.analysis_calls(serializer.validated_data))
+        try:
+            created, queued = media.create_media(request.user, serializer.validated_data)
+        except jobs.QueueFull as e:
+            return Response(
+                {'error': 'AI queue is busy, try again shortly'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': str(e.retry_after)},
+            )
+        return Response({
+            'results': UserMediaSerializer(created, many=True).data,
+            'job_ids': [job.id for job in queued],
+        }, status=status.HTTP_202_ACCEPTED if queued else status.HTTP_201_CREATED)
+
+def with_active_sessions_total(posts, selection=FULL):
+    """
+    Posts with their author and active session count (those ``selection``
+    includes), in the same query. A correlated subquery (not a JOIN + GROUP
+    BY) so it's only evaluated for the rows actually fetched.
+    """
+    if selection.includes('user'):
+        posts = posts.select_related('user')
+    if not selection.includes('active_sessions_count'):
+        return posts
+    active_sessions = (
+        StudySession.objects.filter(post=django_models.OuterRef('pk'), is_active=True)
+        .order_by().values('post').annotate(total=django_models.Count('id')).values('total')
+    )
+    return posts.annotate(active_sessions_total=Coalesce(django_models.Subquery(active_sessions), 0))
+
+def with_session_topic(notes, selection=FULL):
+    """Notes with their session's topic (for ``session_info``) without loading the session."""
+    if not selection.includes('session_info'):
+        return notes
+    return notes.annotate(session_topic=django_models.F('session__post__topic'))
+
+def select_related_for(queryset, relation, selection, compact_serializer):
+    """Join ``relation``; when it's rendered compact, load only the columns its compact serializer shows."""
+    queryset = queryset.select_related(relation)
+    if selection.expanded(relation):
+        return queryset
+    keep = set(compact_serializer.Meta.fields)
+    model = compact_serializer.Meta.model
+    return queryset.defer(*(f'{relation}__{field.name}' for field in model._meta.concrete_fields
+                            if field.name not in keep and not field.primary_key))
+
+def ranked_posts(ranking, context):
+    """
+    The active posts of ``ranking`` (``{post id: extra fields}``, best first)
+    serialized in that order, each with its extra fields.
+    """
+    order = {post_id: n for n, post_id in enumerate(ranking)}
+    posts = with_active_sessions_total(StudyPost.objects.filter(pk__in=ranking, is_active=True),
+                                       context.get('selection', FULL))
+    posts = sorted(posts, key=lambda post: order[post.pk])
+    results = StudyPostSerializer(posts, many=True, context=context).data
+    for item, post in zip(results, posts):
+        item.update(ranking[post.pk])
+    return results
+
+def _int_param(request, name, default):
+    try:
+        return max(0, int(request.query_params.get(name, default)))
+    except ValueError:
+        return default
+
+def _limit_param(request, default=10, maximum=50):
+    return max(1, min(_int_param(request, 'limit', default), maximum))
 
-class StudyPostViewSet(viewsets.ModelViewSet):
+def _event_user(user):
+    return {'id': user.id, 'username': user.username}
+
+class StudyPostViewSet(FeedCacheMixin, SelectableFieldsViewMixin, viewsets.ModelViewSet):
     queryset = StudyPost.objects.filter(is_active=True)
     serializer_class = StudyPostSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = CreatedAtKeysetPagination
+    compact_actions = ('list', 'similar', 'recommended')
 
     def get_queryset(self):
-        queryset = StudyPost.objects.filter(is_active=True)
+        queryset = with_active_sessions_total(StudyPost.objects.filter(is_active=True), self.get_selection())
         subject = self.request.query_params.get('subject')
         if subject: queryset = queryset.filter(subject__icontains=subject)
         search = self.request.query_params.get('search')
+        if search and self.request.query_params.get('search_mode') == 'fulltext':
+            # Ranked, prefix-matching search backed by the GIN / FTS5 index
+            return fulltext_search(queryset, search)
         if search:
-            queryset = queryset.filter(
-                django_models.Q(title__icontains=search) |
-                django_models.Q(topic__icontains=search) |
-                django_models.Q(description__icontains=search)
-            )
+            queryset = substring_search(queryset, search)
         return queryset.order_by('-created_at')
 
     def perform_create(self, serializer): serializer.save(user=self.request.user)
 
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """Active posts most like this one (api/similarity.py)"""
+        post = self.get_object()
+        return self._ranked(similarity.similar_to(post, _limit_param(request)))
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def recommended(self, request):
+        """Active posts closest to the requester's study interests (not their own)"""
+        interests = UserProfile.objects.filter(user=request.user).values_list('study_interests', flat=True).first()
+        return self._ranked(similarity.recommended_for(request.user, interests, _limit_param(request)))
+
+    def _ranked(self, matches):
+        ranking = {post_id: {'score': round(score, 4)} for post_id, score in matches}
+        return Response({'results': ranked_posts(ranking, self.get_serializer_context())})
+
     @action(detail=True, methods=['post'])
     def join(self, request, pk=None):
         post = self.get_object()
-        session = StudySession.objects.filter(post=post, is_active=True).first()
-        if not session:
-            session = StudySession.objects.create(
-                post=post, creator=post.user, is_active=True,
-                firestore_chat_id=f"session_{uuid.uuid4().hex}", ai_notes_enabled=True
-            )
-            session.participants.add(post.user)
-        
-        if not session.participants.filter(id=request.user.id).exists():
-            if session.participants.count() >= 5: return Response({'error': 'Full'}, status=400)
-            session.participants.add(request.user)
+        # The session row lock serialises joins to the same session (Postgres);
+        # the capacity check and insert are a single statement either way.
+        with transaction.atomic():
+            session = StudySession.lock_active_for_post(post)
+            if session.add_participant(request.user):
+                broadcast_session_event(session.id, 'join', user=_event_user(request.user))
+            elif not session.participants.filter(id=request.user.id).exists():
+                return Response({'error': 'Full'}, status=400)
+
+        # Reuse what's already loaded for the response. The post has exactly
+        # one active session now (enforced by a unique constraint).
+        post.active_sessions_total = 1
+        session.post = post
+        if session.creator_id == post.user_id:
+            session.creator = post.user
         return Response(StudySessionSerializer(session).data)
 
-class StudySessionViewSet(viewsets.ModelViewSet):
+class StudySessionViewSet(SelectableFieldsViewMixin, viewsets.ModelViewSet):
     queryset = StudySession.objects.all()
     serializer_class = StudySessionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = StartedAtKeysetPagination
 
     def get_queryset(self):
-        return self.queryset.filter(
-            django_models.Q(creator=self.request.user) | 
-            django_models.Q(participants=self.request.user)
-        ).distinct().order_by('-started_at')
+        # Membership is an IN (... UNION ...) subquery, so no DISTINCT. When
+        # serializing, the relations the response includes take at most two
+        # more queries however many sessions there are: compact ones (lists)
+        # are joined or prefetched bare, expanded ones with what they nest.
+        queryset = self.queryset.filter(pk__in=StudySession.ids_for_member(self.request.user))
+        if self.action in ('list', 'retrieve'):
+            selection = self.get_selection()
+            if selection.includes('creator'):
+                queryset = select_related_for(queryset, 'creator', selection, UserSummarySerializer)
+            if selection.includes('post') and selection.expanded('post'):
+                posts = with_active_sessions_total(StudyPost.objects.all(), selection.nested('post'))
+                queryset = queryset.prefetch_related(django_models.Prefetch('post', queryset=posts))
+            elif selection.includes('post'):
+                queryset = select_related_for(queryset, 'post', selection, StudyPostSummarySerializer)
+            if selection.includes('participants'):
+                participants = User.objects.all()
+                if not selection.expanded('participants'):
+                    participants = participants.only(*UserSummarySerializer.Meta.fields)
+                queryset = queryset.prefetch_related(django_models.Prefetch('participants', queryset=participants))
+        return queryset.order_by('-started_at')
     
 # Inside StudySessionViewSet
 
@@ -208,6 +275,8 @@ class StudySessionViewSet(viewsets.ModelViewSet):
         session = self.get_object()
         if request.user in session.participants.all():
             session.participants.remove(request.user)
+            broadcast_session_event(session.id, 'leave', user=_event_user(request.user))
+            revoke_session_access(session.id, request.user.id)
             return Response({"status": "You have left the session"}, status=200)
         return Response({"error": "You are not a participant in this session"}, status=400)
 
@@ -225,6 +294,7 @@ class StudySessionViewSet(viewsets.ModelViewSet):
         session.is_active = False
         session.ended_at = timezone.now()
         session.save()
+        broadcast_session_event(session.id, 'end_session', ended_at=session.ended_at.isoformat())
         
         return Response({
             "status": "session ended",
@@ -232,116 +302,117 @@ class StudySessionViewSet(viewsets.ModelViewSet):
         }, status=200)
     @action(detail=True, methods=['post'])
     def generate_notes(self, request, pk=None):
+            """Queue AI notes on the session's message log (see ``messages``)"""
             session = self.get_object()
-            messages = request.data.get('messages', [])
-            
-            if not messages:
+            messages = request.data.get('messages')
+            if messages:
+                # Older clients still send the whole transcript; only its new tail is stored
+                serializer = SessionMessageSerializer(data=messages, many=True)
+                serializer.is_valid(raise_exception=True)
+                message_log.append(session, serializer.validated_data, start=0)
+
+            if not message_log.count(session.id):
                 return Response({'error': 'No messages provided'}, status=400)
-            
-            # 1. Start the thread
-            thread = threading.Thread(
-                target=analyze_conversation_thread, 
-                args=(session.id, messages)
-            )
-            thread.start()
+            admission.admit(request.user)
+
+            # Persisted + picked up by the bounded worker pool (api/jobs.py),
+            # which reads the messages from the log. One queued job per session.
+            try:
+                job = jobs.enqueue('notes', {}, session=session, user=request.user)
+            except jobs.QueueFull as e:
+                return Response(
+                    {'error': 'AI queue is busy, try again shortly'},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    headers={'Retry-After': str(e.retry_after)},
+                )
 
-            # 2. IMMEDIATELY return a response so Django is happy
             return Response({
-                'message': 'Background analysis started',
-                'status': 'processing'
+                'message': 'Background analysis queued',
+                'status': job.status,
+                'job_id': job.id,
+                'status_url': reverse('aijob-detail', args=[job.id], request=request),
             }, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['get', 'post'])
+    def messages(self, request, pk=None):
+        """
+        The session's chat log. POST {messages: [...], start?} appends (start:
+        the log index of the first message; ones already stored are skipped).
+        GET ?start=&limit= reads it back.
+        """
+        session = self.get_object()
+        if request.method == 'GET':
+            start = _int_param(request, 'start', 0)
+            limit = min(_int_param(request, 'limit', 500), 500)
+            return Response({
+                'count': message_log.count(session.id),
+                'start': start,
+                'messages': message_log.read(session.id, start, limit),
+            })
+
+        if not session.is_active:
+            return Response({'error': 'This session has ended'}, status=400)
+        serializer = MessageAppendSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            count = message_log.append(session, serializer.validated_data['messages'],
+                                       start=serializer.validated_data.get('start'))
+        except message_log.Gap as e:
+            return Response({'error': 'Messages are missing before start', 'count': e.count},
+                            status=status.HTTP_409_CONFLICT)
+        return Response({'count': count}, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get'])
+    def export(self, request, pk=None):
+        """The whole chat log as a plain-text transcript download"""
+        session = self.get_object()
+        transcript = "\n".join(format_message(msg) for msg in message_log.read(session.id))
+        response = HttpResponse(transcript + "\n", content_type='text/plain; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="session-{session.id}.txt"'
+        return response
+
     @action(detail=True, methods=['get'])
     def notes(self, request, pk=None):
         """Allows fetching notes via /api/sessions/{id}/notes/"""
         session = self.get_object()
-        notes = ConversationNote.objects.filter(session=session)
+        notes = with_session_topic(ConversationNote.objects.filter(session=session))
         serializer = ConversationNoteSerializer(notes, many=True)
         return Response(serializer.data)
     
         return Response({'message': 'Background analysis started'}, status=status.HTTP_202_ACCEPTED)
 
-class ConversationNoteViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = ConversationNote.objects.all()
-    serializer_class = ConversationNoteSerializer
+class AIJobViewSet(SelectableFieldsViewMixin, viewsets.ReadOnlyModelViewSet):
+    """Poll /api/jobs/{id}/ for the status of a background AI job."""
+    queryset = AIJob.objects.all()
+    serializer_class = AIJobSerializer
     permission_classes = [IsAuthenticated]
+
     def get_queryset(self):
         return self.queryset.filter(
-            django_models.Q(session__creator=self.request.user) | 
-            django_models.Q(session__participants=self.request.user)
-        ).distinct().order_by('-created_at')
-class ExamPrepView(APIView):
-    permission_classes = [IsAuthenticated]
+            django_models.Q(user=self.request.user) |
+            django_models.Q(session_id__in=StudySession.ids_for_member(self.request.user))
+        ).order_by('-created_at')
 
-    def post(self, request):
-        """
-        Routes the POST request based on the URL path.
-        Matches: /api/exam-prep/ AND /api/exam-prep/solve/
-        """
-        path = request.path.rstrip('/') # Clean trailing slashes
-        
-        if path.endswith('solve'):
-            return self._solve_question(request)
-        
-        return self._generate_materials(request)
-
-    def _generate_materials(self, request):
-        """Internal method to generate study materials"""
-        data = request.data
-        subject = data.get('subject')
-        topic = data.get('topic')
-        grade = data.get('gradeLevel')
-        difficulty = data.get('difficulty', 'Intermediate')
-        rem = data.get('remarks')
-        if not all([subject, topic, grade]):
-            return Response({"error": "Missing required fields: subject, topic, and gradeLevel"}, 
-                            status=status.HTTP_400_BAD_REQUEST)
-
-        prompt = f"""
-        Act as an expert tutor. Create a study guide for a {grade} student on {subject}: {topic}.
-        Difficulty level: {difficulty}.
-        Additional remarks: {rem if rem else 'None'}
-
-        Return ONLY a JSON object with:
-        1. keyConcepts: (list of strings)
-        2. questions: (list of objects with 'id' and 'text')
-        """
+class ConversationNoteViewSet(SelectableFieldsViewMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = ConversationNote.objects.all()
+    serializer_class = ConversationNoteSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = CreatedAtKeysetPagination
+    def get_queryset(self):
+        return with_session_topic(self.queryset.filter(
+            session_id__in=StudySession.ids_for_member(self.request.user)
+        ), self.get_selection()).order_by('-created_at')
 
-        try:
-            completion = client.chat.completions.create(
-                model="llama-3.3-70b-versatile",
-                messages=[
-                    {"role": "system", "content": "You are a teacher who only responds in JSON format."},
-                    {"role": "user", "content": prompt}
-                ],
-                response_format={"type": "json_object"},
-                temperature=0.7
-            )
-            
-            analysis = json.loads(completion.choices[0].message.content)
-            return Response(analysis, status=200)
+class LLMCacheStatsView(APIView):
+    """Hit / miss counters of the LLM response cache (this process)."""
+    permission_classes = [IsAdminUser]
 
-        except Exception as e:
-            return Response({"error": f"Groq Generation Error: {str(e)}"}, 
-                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    def get(self, request):
+        return Response(response_cache.stats())
 
-    def _solve_question(self, request):
-        """Internal method to solve a specific question"""
-        question_text = request.data.get('question')
-        
-        if not question_text:
-            return Response({"error": "No question provided"}, 
-                            status=status.HTTP_400_BAD_REQUEST)
+class FeedCacheStatsView(APIView):
+    """Hit / miss / 304 counters of the study-post feed cache (this process)."""
+    permission_classes = [IsAdminUser]
 
-        try:
-            completion = client.chat.completions.create(
-                model="llama-3.3-70b-versatile",
-                messages=[
-                    {"role": "system", "content": "You are an expert tutor. Solve the following exam question clearly, accurately, and step-by-step."},
-                    {"role": "user", "content": f"Please solve this question: {question_text}"}
-                ],
-                temperature=0.3 # Lower temperature for more factual/precise solving
-            )
-            return Response({"answer": completion.choices[0].message.content}, status=200)
-        except Exception as e:
-            return Response({"error": f"Groq Solver Error: {str(e)}"}, 
-                            status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+    def get(self, request):
+        return Response(feed_cache.stats())
@@ -13,4 +13,23 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
-application = get_asgi_application()
+# Set up Django before importing anything that touches models
+django_asgi_app = get_asgi_application()
+
+from channels.auth import AuthMiddlewareStack  # noqa: E402
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from channels.security.websocket import OriginValidator  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+from api.middleware import JWTAuthMiddleware  # noqa: E402
+from api.routing import websocket_urlpatterns  # noqa: E402
+
+application = ProtocolTypeRouter({
+    'http': django_asgi_app,
+    # The frontend is served from another origin, so allow the CORS origins
+    # as well as our own hosts.
+    'websocket': OriginValidator(
+        AuthMiddlewareStack(JWTAuthMiddleware(URLRouter(websocket_urlpatterns))),
+        list(settings.CORS_ALLOWED_ORIGINS) + list(settings.ALLOWED_HOSTS),
+    ),
+})
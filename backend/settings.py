@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 
 from datetime import timedelta
 import os
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 env_path = Path(__file__).resolve().parent.parent / '.env'
@@ -20,6 +21,9 @@ import dj_database_url
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# `manage.py test`
+TESTING = sys.argv[1:2] == ['test']
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/6.0/howto/deployment/checklist/
 
@@ -40,6 +44,7 @@ ALLOWED_HOSTS = [
 # Application definition
 
 INSTALLED_APPS = [
+    'daphne',  # runserver serves the ASGI app (HTTP + WebSockets)
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -55,9 +60,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.RequestMetricsMiddleware',  # Server-Timing + /api/metrics/; keep first
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'api.middleware.AsyncWhiteNoiseMiddleware',  # WhiteNoise, async-capable for ASGI
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -87,7 +93,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'backend.wsgi.application'
-# ASGI_APPLICATION = 'backend.asgi.application'
+ASGI_APPLICATION = 'backend.asgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
@@ -112,6 +118,15 @@ DATABASES = {
     )
 }
 
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    # Local dev / tests: make concurrent writers wait for the lock instead of
+    # failing, and test against a file. The threaded join tests need that:
+    # the default in-memory test DB shares its cache between connections, and
+    # a locked shared cache fails at once (SQLITE_LOCKED) instead of honouring
+    # the timeout. The file is deleted after the run (and git-ignored).
+    DATABASES['default']['OPTIONS'] = {'transaction_mode': 'IMMEDIATE', 'timeout': 20}
+    DATABASES['default']['TEST'] = {'NAME': str(BASE_DIR / 'test_db.sqlite3')}
+
 
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
@@ -160,14 +175,27 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # REST settings
 REST_FRAMEWORK = {
+    # JWT first, users cached (api/authentication.py). Basic auth (a password
+    # hash per request) only on views that opt in.
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'api.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # orjson for JSON, MessagePack on request (api/renderers.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'api.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.ORJSONParser',
+        'api.renderers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
 }
@@ -201,18 +229,148 @@ CELERY_RESULT_BACKEND = CELERY_BROKER_URL
 # CELERY_REDIS_BROKER_HEALTH_CHECK_INTERVAL = 30
 # CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
 
+# Redis (Upstash) for caching; falls back to per-process memory when unset
+REDIS_URL = os.getenv('REDIS_URL', CELERY_BROKER_URL)
+
+# LLM response cache (api/llm.py). On Redis, size is bounded by the server's
+# maxmemory + allkeys-lru policy; locally by MAX_ENTRIES.
+LLM_CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', 60 * 60 * 24))
+
+# Cached study-post feed pages; changes invalidate them immediately, this
+# only bounds how long orphaned pages linger.
+FEED_CACHE_TTL = int(os.getenv('FEED_CACHE_TTL', 60 * 5))
+
+# Users resolved from JWTs (api/authentication.py); changes drop them at once.
+AUTH_USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL', 60))
+
+# Interest matches (api/interests.py); the user's own interest changes drop
+# theirs at once, other users' changes wait for this.
+INTEREST_MATCH_CACHE_TTL = int(os.getenv('INTEREST_MATCH_CACHE_TTL', 60 * 5))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'llm': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+        'TIMEOUT': LLM_CACHE_TTL,
+        'KEY_PREFIX': 'llm',
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'llm',
+        'TIMEOUT': LLM_CACHE_TTL,
+        'OPTIONS': {'MAX_ENTRIES': 2000},
+    },
+    # Study-post feed pages (api/feed_cache.py); must be shared between
+    # processes so a change in one invalidates the pages cached by all.
+    'feed': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+        'TIMEOUT': FEED_CACHE_TTL,
+        'KEY_PREFIX': 'feed',
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'feed',
+        'TIMEOUT': FEED_CACHE_TTL,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    # Interest matches per user (api/interests.py)
+    'matches': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+        'TIMEOUT': INTEREST_MATCH_CACHE_TTL,
+        'KEY_PREFIX': 'matches',
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'matches',
+        'TIMEOUT': INTEREST_MATCH_CACHE_TTL,
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+    # Shared, so a change in one process invalidates the users cached by all
+    'auth': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+        'TIMEOUT': AUTH_USER_CACHE_TTL,
+        'KEY_PREFIX': 'auth',
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'auth',
+        'TIMEOUT': AUTH_USER_CACHE_TTL,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
 # Channels (WebSocket) Configuration
+# Without Redis, events only reach sockets held by the same process
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
         'CONFIG': {
-            'hosts': [(CELERY_BROKER_URL, 0)],
+            'hosts': [REDIS_URL],
         },
+    } if REDIS_URL else {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
     },
 }
 
+# Open WebSockets per process: overall, and per study session
+WS_MAX_CONNECTIONS = int(os.getenv('WS_MAX_CONNECTIONS', 1000))
+SESSION_WS_MAX_CONNECTIONS = int(os.getenv('SESSION_WS_MAX_CONNECTIONS', 10))
+
 # Firebase Admin SDK (for Firestore)
 FIREBASE_CREDENTIALS_PATH = os.getenv('FIREBASE_CREDENTIALS_PATH', '')
 
 # GROQ API Key for AI features
-GROQ_API_KEY = os.getenv('GROQ_API_KEY', '')
\ No newline at end of file
+GROQ_API_KEY = os.getenv('GROQ_API_KEY', '')
+# Connection pool size of the async Groq client (per event loop)
+GROQ_MAX_CONNECTIONS = int(os.getenv('GROQ_MAX_CONNECTIONS', '50'))
+# Model tiers (api/model_router.py): small tasks and inputs go to the small
+# model. LLM_ROUTING=false sends everything to the large one.
+LLM_ROUTING = os.getenv('LLM_ROUTING', 'true').lower() == 'true'
+LLM_MODELS = {
+    'small': os.getenv('LLM_SMALL_MODEL', 'llama-3.1-8b-instant'),
+    'large': os.getenv('LLM_LARGE_MODEL', 'llama-3.3-70b-versatile'),
+}
+
+# Admission control for the AI endpoints (api/admission.py): token buckets
+# per user and overall, in requests per minute. Requests queue for up to
+# AI_ADMISSION_MAX_WAIT seconds before being rejected with 429.
+AI_ADMISSION = os.getenv('AI_ADMISSION', 'true').lower() == 'true'
+AI_USER_RATE = int(os.getenv('AI_USER_RATE', '10'))
+AI_USER_BURST = int(os.getenv('AI_USER_BURST', '5'))
+AI_GLOBAL_RATE = int(os.getenv('AI_GLOBAL_RATE', '120'))
+AI_GLOBAL_BURST = int(os.getenv('AI_GLOBAL_BURST', '30'))
+AI_ADMISSION_MAX_WAIT = float(os.getenv('AI_ADMISSION_MAX_WAIT', '5'))
+
+# Background AI jobs (api/jobs.py). Set AI_JOB_IN_PROCESS=false when running
+# `python manage.py run_ai_worker` as a separate process.
+# Never during tests: a pool started by the first test request would race the
+# tests for their jobs; tests run them with jobs.run_pending() or opt in.
+AI_JOB_IN_PROCESS = os.getenv('AI_JOB_IN_PROCESS', 'true').lower() == 'true' and not TESTING
+AI_JOB_WORKERS = int(os.getenv('AI_JOB_WORKERS', '2'))
+AI_JOB_MAX_PENDING = int(os.getenv('AI_JOB_MAX_PENDING', '200'))
+AI_JOB_MAX_ATTEMPTS = 3
+AI_JOB_RETRY_BACKOFF = 10  # seconds, doubled on every retry
+AI_JOB_LEASE_SECONDS = 300
+
+# Incremental note generation (api/notes.py): transcripts of new messages
+# longer than this are split and analyzed in parallel.
+NOTES_CHUNK_CHARS = 12000
+NOTES_PARALLEL_CHUNKS = 4
+# Similar / recommended posts (api/similarity.py): hashed text vector size
+# (memory is 4 bytes x this per active post, in every process) and how often
+# each process picks up vectors written by the others.
+SIMILAR_POSTS_DIMENSIONS = int(os.getenv('SIMILAR_POSTS_DIMENSIONS', '256'))
+SIMILAR_POSTS_SYNC_INTERVAL = 5  # seconds
+# Session message log (api/message_log.py): messages per compressed chunk row.
+MESSAGE_LOG_CHUNK_MESSAGES = 200
+# Media uploads (api/media.py): items per bulk request, and certificates
+# analyzed together in one prompt.
+MEDIA_BULK_MAX_ITEMS = 50
+CERTIFICATE_BATCH_SIZE = 8
+
+# Request metrics (api/metrics.py). Prometheus scrapes /api/metrics/ with
+# "Authorization: Bearer $METRICS_TOKEN"; staff users can read it too.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_SERVER_TIMING = os.getenv('METRICS_SERVER_TIMING', 'true').lower() == 'true'